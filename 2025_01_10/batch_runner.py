@@ -0,0 +1,157 @@
+import os
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import stage_metrics
+
+
+class WorkUnit:
+    """
+    프로세스 풀에서 실행할 작업 하나 (예: 날짜 x 해상도).
+
+    Parameters:
+    - key: 결과 보고용 이름 (예: ("20250108", "0.5"))
+    - function: 실행할 함수 (하위 프로세스로 보내므로 모듈 최상위 함수여야 함)
+    - args, kwargs: 함수 인자
+    - memory_bytes: 예상 최대 메모리 (바이트, None이면 메모리 제한 계산에서 제외)
+    """
+
+    def __init__(self, key, function, args=(), kwargs=None, memory_bytes=None):
+        self.key = key
+        self.function = function
+        self.args = tuple(args)
+        self.kwargs = dict(kwargs or {})
+        self.memory_bytes = memory_bytes
+
+    def __repr__(self):
+        return f"WorkUnit({self.key!r}, {getattr(self.function, '__name__', self.function)})"
+
+
+def available_memory_bytes():
+    """
+    지금 사용 가능한 메모리 (바이트). /proc/meminfo의 MemAvailable, 없으면 psutil, 둘 다 없으면 None
+    """
+    try:
+        with open("/proc/meminfo", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import psutil  # Windows
+        return psutil.virtual_memory().available
+    except ImportError:
+        return None
+
+
+def estimate_grid_bytes(rows, cols, channels, frames=1, bytes_per_value=4, overhead=2.0):
+    """
+    격자 frames장 x 채널을 동시에 메모리에 둘 때의 예상 크기 (바이트).
+    overhead는 변환 중 복사본(pyarrow -> pandas 등)을 고려한 배수
+    """
+    return int(rows * cols * channels * frames * bytes_per_value * overhead)
+
+
+def _run_unit(key, function, args, kwargs):
+    # 하위 프로세스에서 실행 (작업별 측정 단계 + 소요 시간)
+    start = time.perf_counter()
+    with stage_metrics.stage("batch_unit", unit=str(key)):
+        result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def run_units(units, max_workers=None, memory_limit=None, memory_fraction=0.8, mp_context=None):
+    """
+    작업들을 프로세스 풀에서 병렬 실행하고 작업별 성공/실패를 모아 반환.
+    실행 중인 작업의 memory_bytes 합계가 memory_limit을 넘지 않도록 제출을 미루므로
+    0.5km처럼 큰 작업은 동시에 적게 실행됨 (한 작업이 제한보다 크면 혼자 실행).
+    큰 작업부터 제출하고, 한 작업이 실패해도 나머지 작업은 계속 실행함.
+    작업 프로세스가 비정상 종료되면 (메모리 부족 등) 풀을 새로 만들고, 그때 실행 중이던 작업은
+    어느 작업이 원인인지 알 수 없으므로 한 번씩 혼자 다시 실행함 (다시 실패하면 실패로 기록)
+
+    Parameters:
+    - units: WorkUnit 목록
+    - max_workers: 최대 동시 프로세스 수 (None이면 CPU 수)
+    - memory_limit: 동시 실행 작업의 예상 메모리 합계 상한 (바이트, None이면 사용 가능 메모리 x memory_fraction)
+    - mp_context: multiprocessing 컨텍스트 (None이면 플랫폼 기본값)
+
+    Returns:
+    - units 순서의 결과 목록 [{"key", "ok", "result", "error", "seconds"}, ...]
+    """
+    units = list(units)
+    max_workers = max(1, min(max_workers or os.cpu_count() or 1, len(units) or 1))
+    if memory_limit is None:
+        available = available_memory_bytes()
+        memory_limit = int(available * memory_fraction) if available is not None else None
+
+    results = {}
+    pending = sorted(range(len(units)), key=lambda i: -(units[i].memory_bytes or 0))
+
+    def failure(i, error):
+        results[i] = {"key": units[i].key, "ok": False, "result": None, "error": error, "seconds": None}
+        print(f"{units[i].key}: 실패 - {error}")
+
+    running = {}
+    reserved = 0
+    crashed = set()  # 풀 비정상 종료 때 실행 중이던 작업 (혼자 다시 실행)
+    executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=mp_context)
+    try:
+        while pending or running:
+            # 메모리 여유가 있는 작업을 큰 것부터 제출
+            for i in list(pending):
+                if len(running) >= max_workers:
+                    break
+                unit = units[i]
+                need = unit.memory_bytes or 0
+                if running and (i in crashed or crashed & set(running.values())):
+                    break
+                if memory_limit is not None and running and reserved + need > memory_limit:
+                    continue
+                future = executor.submit(_run_unit, unit.key, unit.function, unit.args, unit.kwargs)
+                running[future] = i
+                reserved += need
+                pending.remove(i)
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            broken = False
+            for future in done:
+                i = running.pop(future)
+                unit = units[i]
+                reserved -= unit.memory_bytes or 0
+                try:
+                    result, seconds = future.result()
+                    results[i] = {"key": unit.key, "ok": True, "result": result, "error": None, "seconds": seconds}
+                    print(f"{unit.key}: 완료 ({seconds:.1f}초)")
+                except BrokenProcessPool:
+                    broken = True
+                    running[future] = i  # 아래에서 실행 중이던 작업과 함께 처리
+                except Exception as e:
+                    failure(i, "".join(traceback.format_exception_only(type(e), e)).strip())
+            if broken:
+                for i in running.values():
+                    if i in crashed:
+                        failure(i, "작업 프로세스가 비정상 종료되었습니다 (메모리 부족 가능)")
+                    else:
+                        crashed.add(i)
+                        pending.insert(0, i)
+                running.clear()
+                reserved = 0
+                executor.shutdown(wait=False, cancel_futures=True)
+                executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=mp_context)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+    return [results[i] for i in range(len(units))]
+
+
+def report_results(results):
+    """
+    작업별 결과 요약을 출력하고 실패한 작업 목록을 반환
+    """
+    failed = [result for result in results if not result["ok"]]
+    print(f"작업 {len(results)}개 중 성공 {len(results) - len(failed)}개, 실패 {len(failed)}개")
+    for result in failed:
+        print(f"  {result['key']}: {result['error']}")
+    return failed
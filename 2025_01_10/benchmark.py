@@ -0,0 +1,300 @@
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from netCDF4 import Dataset
+
+from coord_store import build_coordinate_store
+from grid_spec import get_grid_spec
+from hourly_parquet import hourly_partition_path, write_hourly_parquet
+from matching import replace_coordinates
+from pre_coordinate import generate_precomputed_coordinates_parallel
+from stage_metrics import peak_rss_bytes
+from ver1_sat_24h_to_1day import merge_daily_files
+from ver1_sat_url2csv_1h_mean_2min_update import (HourlyMeanAccumulator, decode_image_pixel_values,
+                                                  process_image_to_csv, process_image_to_parquet)
+
+# 2025_01_13/resolution_merge.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "2025_01_13"))
+from resolution_merge import index_input_directory, merge_resolution
+
+# 해상도별 실제 지역(LA) 배열 크기와 채널
+GRID_SHAPES = {2.0: (277, 306), 1.0: (555, 612), 0.5: (1110, 1225)}
+RESOLUTION_CHANNELS = {
+    2.0: ["NR013", "NR016", "SW038", "WV063", "WV069", "WV073", "IR087", "IR096", "IR105", "IR112", "IR123", "IR133"],
+    1.0: ["VI004", "VI005", "VI008"],
+    0.5: ["VI006"],
+}
+
+STAGES = ("coordinates", "hourly_average", "hourly_csv", "hourly_parquet", "daily_merge", "attach_latlon", "resolution_merge")
+
+BENCH_START = datetime(2025, 1, 8)
+
+
+# ---------------------------------------------------------------- 합성 입력
+
+def synthetic_counts(shape, seed, bits=12):
+    """
+    실제 영상처럼 공간적으로 부드러운 카운트 배열 (uint16, 압축률이 난수보다 현실적)
+    """
+    rng = np.random.default_rng(seed)
+    rows, cols = shape
+    y, x = np.ogrid[:rows, :cols]
+    field = 2000 + 900 * np.sin(x / (cols / 7) + seed) * np.cos(y / (rows / 5)) + rng.normal(0, 25, shape)
+    return np.clip(field, 0, 2 ** bits - 2).astype(np.uint16)
+
+
+def write_granule(path, values):
+    """
+    GK2A LE1B 형식을 흉내 낸 NetCDF4 파일 (image_pixel_values + 보정 계수 속성)
+    """
+    with Dataset(path, "w") as dataset:
+        dataset.createDimension("dim_y", values.shape[0])
+        dataset.createDimension("dim_x", values.shape[1])
+        variable = dataset.createVariable("image_pixel_values", "u2", ("dim_y", "dim_x"), zlib=True, complevel=1)
+        variable[:] = values
+        dataset.setncatts({
+            "DN_to_Radiance_Gain": np.float32(-0.0108914673),
+            "DN_to_Radiance_Offset": np.float32(44.1777038),
+            "number_of_valid_bits_per_pixel": np.int32(12),
+        })
+
+
+def write_granules(raw_dir, resolution, slots):
+    """
+    slots개 수집 시각 x 해상도 채널의 원본 파일 (파일 이름: TYPE_YYYYmmddHHMM.nc)
+
+    Returns:
+    - [(수집 시각, [채널별 경로])]
+    """
+    os.makedirs(raw_dir, exist_ok=True)
+    granules = []
+    for slot in range(slots):
+        slot_time = BENCH_START + timedelta(minutes=2 * slot)
+        paths = []
+        for i, data_type in enumerate(RESOLUTION_CHANNELS[resolution]):
+            path = os.path.join(raw_dir, f"{data_type}_{slot_time.strftime('%Y%m%d%H%M')}.nc")
+            write_granule(path, synthetic_counts(GRID_SHAPES[resolution], seed=slot * 31 + i))
+            paths.append(path)
+        granules.append((slot_time, paths))
+    return granules
+
+
+def write_hourly_inputs(hourly_root, resolution, hours):
+    """
+    hours개 시간의 시간별 parquet 파티션 (일별 병합 입력)
+    """
+    rows, cols = GRID_SHAPES[resolution]
+    for hour in range(hours):
+        channels = {name: synthetic_counts((rows, cols), seed=hour * 17 + i).astype(np.float32)
+                    for i, name in enumerate(RESOLUTION_CHANNELS[resolution])}
+        write_hourly_parquet(hourly_partition_path(hourly_root, BENCH_START + timedelta(hours=hour), f"{rows}x{cols}"), channels)
+
+
+def write_daily_xy_input(path, resolution, hours):
+    """
+    기존 일별 파일 형식 (Datetime, x, y, 채널) - 좌표 결합(matching.py) 입력
+    """
+    rows, cols = GRID_SHAPES[resolution]
+    x, y = np.meshgrid(np.arange(cols), np.arange(rows))
+    frames = []
+    for hour in range(hours):
+        frame = pd.DataFrame({"Datetime": (BENCH_START + timedelta(hours=hour)).strftime("%Y%m%d%H"),
+                              "x": x.ravel(), "y": y.ravel()})
+        for i, name in enumerate(RESOLUTION_CHANNELS[resolution]):
+            frame[name] = synthetic_counts((rows, cols), seed=hour * 17 + i).astype(np.float32).ravel()
+        frames.append(frame)
+    pd.concat(frames, ignore_index=True).to_parquet(path, index=False)
+
+
+# ---------------------------------------------------------------- 측정
+
+def _path_bytes(*paths):
+    total = 0
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+        elif os.path.exists(path):
+            total += os.path.getsize(path)
+    return total
+
+
+def _accumulate(granules, data_types):
+    # 원본 파일 바이트를 메모리에서 해독해 시간 평균 누적 (실제 수집 경로와 같은 함수 사용)
+    accumulator = HourlyMeanAccumulator(data_types)
+    for _, paths in granules:
+        frames = []
+        for path in paths:
+            with open(path, "rb") as f:
+                frames.append(decode_image_pixel_values(f.read()))
+        accumulator.add_slot(frames)
+    return accumulator
+
+
+def _run_stage(stage, resolution, inputs, output):
+    """
+    자식 프로세스에서 한 단계를 실행하고 (초, 처리 픽셀 수, 입력 바이트, 출력 바이트, 최대 메모리) 반환
+    """
+    rows, cols = GRID_SHAPES[resolution]
+    data_types = RESOLUTION_CHANNELS[resolution]
+    start = time.perf_counter()
+
+    if stage == "coordinates":
+        generate_precomputed_coordinates_parallel(resolution, output)
+        pixels = int(np.prod(get_grid_spec(resolution).window_shape))
+        bytes_in = 0
+    elif stage == "hourly_average":
+        granules = inputs["granules"]
+        accumulator = _accumulate(granules, data_types)
+        accumulator.to_cubes(data_types)
+        pixels = len(granules) * len(data_types) * rows * cols
+        bytes_in = _path_bytes(*[path for _, paths in granules for path in paths])
+    elif stage in ("hourly_csv", "hourly_parquet"):
+        accumulator = _accumulate(inputs["granules"], data_types)
+        start = time.perf_counter()  # 해독/누적은 제외하고 평균 계산과 저장만 측정
+        if stage == "hourly_csv":
+            os.makedirs(output, exist_ok=True)
+            process_image_to_csv(accumulator, data_types, os.path.join(output, "hourly"))
+        else:
+            process_image_to_parquet(accumulator, data_types, output, BENCH_START)
+        pixels = len(data_types) * rows * cols
+        bytes_in = 0
+    elif stage == "daily_merge":
+        merge_daily_files(inputs["hourly_root"], output, write_coordinates=False, processes=1)  # 한 프로세스의 메모리만 측정
+        pixels = inputs["hours"] * len(data_types) * rows * cols
+        bytes_in = _path_bytes(inputs["hourly_root"])
+    elif stage == "attach_latlon":
+        replace_coordinates(inputs["daily_file"], inputs["store_dir"], resolution, output)
+        pixels = inputs["hours"] * rows * cols
+        bytes_in = _path_bytes(inputs["daily_file"])
+    elif stage == "resolution_merge":
+        merge_resolution(str(resolution), data_types, index_input_directory(inputs["raw_dir"]), output)
+        pixels = len(inputs["granules"]) * len(data_types) * rows * cols
+        bytes_in = _path_bytes(inputs["raw_dir"])
+    else:
+        raise ValueError(f"알 수 없는 단계입니다: {stage}")
+
+    seconds = time.perf_counter() - start
+    return seconds, pixels, bytes_in, _path_bytes(output), peak_rss_bytes()
+
+
+def run_benchmarks(work_dir, resolutions=(2.0, 1.0, 0.5), stages=STAGES, slots=6, hours=24):
+    """
+    합성 입력을 만들고 단계별로 새 프로세스(spawn)에서 실행해 처리량과 최대 메모리를 측정
+
+    Parameters:
+    - work_dir: 합성 입력과 출력을 둘 디렉토리
+    - resolutions: 측정할 해상도 (실제 지역 배열 크기 사용)
+    - stages: 측정할 단계 (STAGES 참고)
+    - slots: 시간 평균 단계의 수집 시각 수
+    - hours: 일별 병합/좌표 결합 단계의 시간 수
+
+    Returns:
+    - 단계별 결과 dict 목록
+    """
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for resolution in resolutions:
+        rows, cols = GRID_SHAPES[resolution]
+        base = os.path.join(work_dir, f"res_{resolution}")
+        print(f"합성 입력 생성 (해상도: {resolution}, {rows}x{cols})...")
+        inputs = {"hours": hours, "raw_dir": os.path.join(base, "raw")}
+        inputs["granules"] = write_granules(inputs["raw_dir"], resolution, slots)
+        if "daily_merge" in stages:
+            inputs["hourly_root"] = os.path.join(base, "hourly")
+            write_hourly_inputs(inputs["hourly_root"], resolution, hours)
+        if "attach_latlon" in stages:
+            inputs["daily_file"] = os.path.join(base, f"merged_{rows}x{cols}.parquet")
+            inputs["store_dir"] = os.path.join(base, "coordinate_store")
+            write_daily_xy_input(inputs["daily_file"], resolution, hours)
+            build_coordinate_store(resolution, inputs["store_dir"])
+
+        for stage in stages:
+            output = os.path.join(base, "out", stage)
+            if stage in ("coordinates", "attach_latlon", "resolution_merge"):
+                output += ".nc" if stage == "resolution_merge" else ".parquet"
+            os.makedirs(os.path.dirname(output), exist_ok=True)
+
+            # 단계마다 새 프로세스를 사용해야 최대 메모리가 단계별로 분리됨
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                seconds, pixels, bytes_in, bytes_out, peak_rss = executor.submit(
+                    _run_stage, stage, resolution, inputs, output).result()
+
+            result = {
+                "stage": stage,
+                "resolution": resolution,
+                "grid": f"{rows}x{cols}",
+                "seconds": round(seconds, 4),
+                "pixels": pixels,
+                "pixels_per_s": round(pixels / seconds, 1) if seconds > 0 else None,
+                "bytes_in": bytes_in,
+                "bytes_out": bytes_out,
+                "mb_per_s": round((bytes_in + bytes_out) / 1e6 / seconds, 2) if seconds > 0 else None,
+                "peak_rss_mb": round(peak_rss / 2 ** 20, 1) if peak_rss is not None else None,
+            }
+            results.append(result)
+            print(f"  {stage:<17} {seconds:8.3f}s  {result['pixels_per_s'] or 0:>14,.0f} px/s  "
+                  f"{result['mb_per_s'] or 0:8.2f} MB/s  peak {result['peak_rss_mb']} MB")
+    return results
+
+
+def save_results(results, output_file, config=None):
+    """
+    측정 결과와 실행 환경을 json으로 저장 (실행 간 비교용)
+    """
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "config": config or {},
+        "results": results,
+    }
+    with open(output_file, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"벤치마크 결과가 저장되었습니다: {output_file}")
+    return report
+
+
+def compare_results(baseline_file, current_file):
+    """
+    두 결과 json의 같은 (단계, 해상도) 소요 시간 비교. 비율 < 1이면 빨라진 것
+
+    Returns:
+    - (단계, 해상도, 기준 초, 현재 초, 비율) 목록
+    """
+    with open(baseline_file, encoding="utf-8") as f:
+        baseline = {(r["stage"], r["resolution"]): r for r in json.load(f)["results"]}
+    with open(current_file, encoding="utf-8") as f:
+        current = json.load(f)["results"]
+
+    rows = []
+    for result in current:
+        key = (result["stage"], result["resolution"])
+        if key in baseline and baseline[key]["seconds"]:
+            ratio = result["seconds"] / baseline[key]["seconds"]
+            rows.append((*key, baseline[key]["seconds"], result["seconds"], round(ratio, 3)))
+            print(f"{key[0]:<17} {key[1]:>4}  {baseline[key]['seconds']:8.3f}s -> {result['seconds']:8.3f}s  x{ratio:.2f}")
+    return rows
+
+
+if __name__ == '__main__':
+    # 설정
+    resolutions = [2.0, 1.0, 0.5]
+    slots = 6   # 시간 평균 단계의 수집 시각 수
+    hours = 24  # 일별 병합/좌표 결합 단계의 시간 수
+    output_file = f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+
+    with tempfile.TemporaryDirectory(prefix="inkle_bench_") as work_dir:
+        results = run_benchmarks(work_dir, resolutions, slots=slots, hours=hours)
+    save_results(results, output_file, config={"resolutions": resolutions, "slots": slots, "hours": hours})
@@ -0,0 +1,180 @@
+from functools import lru_cache
+import numpy as np
+
+# 이전 형식(평균 x divisor를 uint16으로 저장) 카운트 파일의 결측 픽셀 값
+COUNT_FILL_VALUE = 65535
+
+# 합계로 저장한 카운트 파일: 채널 열은 uint32 합계, "{채널}__frames" 열은 uint8 유효 프레임 수
+FRAMES_SUFFIX = "__frames"
+MAX_FRAMES = np.iinfo(np.uint8).max
+MAX_COUNT_SUM = np.iinfo(np.uint32).max
+
+# 원본 파일 전역 속성 -> 보정 계수 이름
+CALIBRATION_ATTRIBUTES = {
+    "DN_to_Radiance_Gain": "gain",
+    "DN_to_Radiance_Offset": "offset",
+    "Radiance_to_Albedo_c": "albedo_c",
+    "channel_center_wavelength": "wavelength_um",
+    "light_speed": "light_speed",
+    "Boltzmann_constant_k": "boltzmann_k",
+    "Plank_constant_h": "planck_h",
+    "Teff_to_Tbb_c0": "tbb_c0",
+    "Teff_to_Tbb_c1": "tbb_c1",
+    "Teff_to_Tbb_c2": "tbb_c2",
+    "number_of_valid_bits_per_pixel": "valid_bits",
+}
+
+# 읽기 시 보정 단계
+CALIBRATION_LEVELS = ("counts", "radiance", "physical")
+
+
+def read_calibration(h5_file):
+    """
+    열린 GK2A 파일(h5py.File)의 전역 속성에서 카운트 -> 복사휘도/반사도/밝기온도 보정 계수를 읽음
+
+    Returns:
+    - {"gain": ..., "offset": ..., ...} (파일에 있는 항목만)
+    """
+    coefficients = {}
+    for attribute, name in CALIBRATION_ATTRIBUTES.items():
+        if attribute in h5_file.attrs:
+            value = np.asarray(h5_file.attrs[attribute]).ravel()
+            if value.size and np.issubdtype(value.dtype, np.number):
+                coefficients[name] = value[0].item()
+    return coefficients
+
+
+def frames_column(channel):
+    """
+    합계로 저장한 카운트 파일에서 채널의 픽셀별 유효 프레임 수 열 이름
+    """
+    return f"{channel}{FRAMES_SUFFIX}"
+
+
+def encode_counts(sums, frames):
+    """
+    시간 합계 카운트와 픽셀별 유효 프레임 수를 저장 형식(uint32 합계, uint8 프레임 수)으로 변환.
+    평균(합계 / 프레임 수)은 읽을 때 계산하므로 반올림 없이 원래 평균을 그대로 복원함 (프레임 수 0인 픽셀은 결측)
+
+    Parameters:
+    - sums: 픽셀별 카운트 합계 2D 배열
+    - frames: 픽셀별 유효 프레임 수 2D 배열
+
+    Returns:
+    - (uint32 합계 배열, uint8 프레임 수 배열)
+    """
+    sums = np.asarray(sums)
+    frames = np.asarray(frames)
+    if frames.size and (frames.min() < 0 or frames.max() > MAX_FRAMES):
+        raise ValueError(f"픽셀별 프레임 수가 uint8 범위(0~{MAX_FRAMES})를 벗어났습니다: 최대 {frames.max()}")
+    if sums.size and (sums.min() < 0 or sums.max() > MAX_COUNT_SUM):
+        raise ValueError(f"카운트 합계가 uint32 범위를 벗어났습니다: 최대 {sums.max()}")
+    if np.issubdtype(sums.dtype, np.floating) and not np.array_equal(sums, np.rint(sums)):
+        raise ValueError("정수 카운트가 아닌 값은 카운트로 저장할 수 없습니다 (value_mode='float' 사용)")
+    encoded = np.where(frames > 0, sums, 0).astype(np.uint32)
+    return encoded, frames.astype(np.uint8)
+
+
+def stored_columns(grid, channels):
+    """
+    channels의 보정에 필요한 저장 열 목록 (합계로 저장한 카운트 파일은 프레임 수 열 포함, channels가 None이면 None)
+    """
+    if channels is None or grid.get("count_encoding") != "sum":
+        return channels
+    return [name for channel in channels for name in (channel, frames_column(channel))]
+
+
+def _physical(radiance, coefficients):
+    # 가시/근적외 채널은 반사도, 적외 채널은 밝기온도(K), 계수가 없으면 복사휘도 그대로
+    if "albedo_c" in coefficients:
+        return radiance * coefficients["albedo_c"]
+    required = ("wavelength_um", "light_speed", "boltzmann_k", "planck_h")
+    if not all(name in coefficients for name in required):
+        return radiance
+    c = coefficients["light_speed"]
+    h = coefficients["planck_h"]
+    k = coefficients["boltzmann_k"]
+    wavenumber = 1e6 / coefficients["wavelength_um"]  # m-1
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # 복사휘도 단위 mW/(m2 sr cm-1) -> W/(m2 sr m-1)
+        t_eff = (h * c * wavenumber / k) / np.log(2 * h * c ** 2 * wavenumber ** 3 / (radiance * 1e-5) + 1)
+    t_eff = np.where(radiance > 0, t_eff, np.nan)
+    return coefficients.get("tbb_c0", 0.0) + coefficients.get("tbb_c1", 1.0) * t_eff + coefficients.get("tbb_c2", 0.0) * t_eff ** 2
+
+
+@lru_cache(maxsize=64)
+def _lookup_table(coefficient_items, level):
+    coefficients = dict(coefficient_items)
+    stored = np.arange(COUNT_FILL_VALUE + 1, dtype=np.float64)
+    counts = stored / coefficients.get("divisor", 1)
+    if level == "counts":
+        values = counts
+    else:
+        values = coefficients.get("gain", 1.0) * counts + coefficients.get("offset", 0.0)
+        if level == "physical":
+            values = _physical(values, coefficients)
+
+    invalid = stored == COUNT_FILL_VALUE
+    if "valid_bits" in coefficients:
+        invalid |= counts > 2 ** int(coefficients["valid_bits"]) - 1
+    values[invalid] = np.nan
+    values = values.astype(np.float32)
+    values.flags.writeable = False
+    return values
+
+
+def lookup_table(coefficients, level="physical"):
+    """
+    이전 형식 카운트 파일의 저장 값(uint16) 전체 범위에 대한 보정 값 표 (65536개 float32, 결측/무효 값은 NaN).
+    같은 계수의 표는 한 번만 만듦
+
+    Parameters:
+    - coefficients: read_calibration 결과 + divisor
+    - level: "counts"(평균 카운트), "radiance"(복사휘도), "physical"(반사도 또는 밝기온도)
+    """
+    if level not in CALIBRATION_LEVELS:
+        raise ValueError(f"지원하지 않는 보정 단계입니다: {level}")
+    return _lookup_table(tuple(sorted(coefficients.items())), level)
+
+
+def calibrate(stored, coefficients, level="physical"):
+    """
+    uint16 저장 값 배열을 보정 값(float32)으로 변환 (표 조회 한 번)
+    """
+    return lookup_table(coefficients, level)[np.asarray(stored, dtype=np.uint16)]
+
+
+def calibrate_sums(sums, frames, coefficients, level="physical"):
+    """
+    uint32 합계와 uint8 프레임 수를 평균 카운트로 나눈 뒤 보정 값(float32)으로 변환 (프레임 수 0이면 NaN)
+    """
+    if level not in CALIBRATION_LEVELS:
+        raise ValueError(f"지원하지 않는 보정 단계입니다: {level}")
+    frames = np.asarray(frames)
+    counts = np.full(frames.shape, np.nan)
+    np.divide(np.asarray(sums, dtype=np.float64), frames, out=counts, where=frames > 0)
+    if level == "counts":
+        values = counts
+    else:
+        values = coefficients.get("gain", 1.0) * counts + coefficients.get("offset", 0.0)
+        if level == "physical":
+            values = _physical(values, coefficients)
+    if "valid_bits" in coefficients:
+        values = np.where(counts > 2 ** int(coefficients["valid_bits"]) - 1, np.nan, values)
+    return values.astype(np.float32)
+
+
+def calibrate_columns(columns, grid, level="physical"):
+    """
+    격자 메타데이터(value_mode="counts")의 채널별 계수로 {채널: 저장 값 배열}을 보정.
+    합계로 저장한 파일은 프레임 수 열이 함께 있어야 하며(stored_columns) 결과에는 채널 열만 남김.
+    실수 형식으로 저장된 파일이면 그대로 반환
+    """
+    if grid.get("value_mode") != "counts":
+        return columns
+    calibration = grid.get("calibration", {})
+    if grid.get("count_encoding") == "sum":
+        return {name: calibrate_sums(values, columns[frames_column(name)], calibration.get(name, {}), level)
+                for name, values in columns.items() if not name.endswith(FRAMES_SUFFIX)}
+    return {name: calibrate(values, calibration.get(name, {}), level) for name, values in columns.items()}
+
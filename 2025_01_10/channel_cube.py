@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+
+class ChannelCube:
+    """
+    같은 격자의 여러 채널을 (채널, 행, 열) 3D 배열 하나로 묶은 자료 구조.
+    채널 결합은 배열 쌓기로 끝나고, 데이터프레임/Arrow 테이블 변환은 저장 시점에 복사 없이 수행
+
+    Parameters:
+    - data: (채널 수, rows, cols) 배열
+    - channel_names: 채널 이름 목록 (data의 첫 번째 축 순서)
+    - metadata: 격자 관련 부가 정보 dict (해상도, 시각 등)
+    """
+
+    def __init__(self, data, channel_names, metadata=None):
+        data = np.asarray(data)
+        if data.ndim != 3:
+            raise ValueError(f"(채널, 행, 열) 3D 배열이 필요합니다: {data.shape}")
+        if len(channel_names) != data.shape[0]:
+            raise ValueError(f"채널 이름 {len(channel_names)}개와 배열 채널 수 {data.shape[0]}가 다릅니다")
+        self.data = data
+        self.channel_names = list(channel_names)
+        self.metadata = dict(metadata or {})
+
+    @classmethod
+    def empty(cls, channel_names, rows, cols, dtype=np.float32, metadata=None):
+        return cls(np.empty((len(channel_names), rows, cols), dtype=dtype), channel_names, metadata)
+
+    @classmethod
+    def from_channels(cls, channels, dtype=None, metadata=None):
+        """
+        {채널명: 2D 배열} (모두 같은 크기)을 쌓아서 생성
+        """
+        shapes = {array.shape for array in channels.values()}
+        if len(shapes) != 1:
+            raise ValueError(f"채널 배열 크기가 서로 다릅니다: {shapes}")
+        return cls(np.stack([np.asarray(array, dtype=dtype) for array in channels.values()]), list(channels), metadata)
+
+    @property
+    def rows(self):
+        return self.data.shape[1]
+
+    @property
+    def cols(self):
+        return self.data.shape[2]
+
+    @property
+    def size_key(self):
+        return f"{self.rows}x{self.cols}"
+
+    def channel(self, name):
+        return self.data[self.channel_names.index(name)]
+
+    def flat_columns(self):
+        """
+        채널별 1D 뷰 (행 우선 순서, 복사 없음)
+        """
+        flat = np.ascontiguousarray(self.data).reshape(len(self.channel_names), -1)
+        return {name: flat[i] for i, name in enumerate(self.channel_names)}
+
+    def to_dataframe(self, with_xy=False):
+        """
+        행 우선(y, x) 순서의 넓은 데이터프레임. with_xy=True면 x, y 열을 앞에 추가
+        """
+        flat = np.ascontiguousarray(self.data).reshape(len(self.channel_names), -1)
+        data = pd.DataFrame(flat.T, columns=self.channel_names, copy=False)
+        if with_xy:
+            x, y = np.meshgrid(np.arange(self.cols), np.arange(self.rows))
+            data.insert(0, "y", y.ravel())
+            data.insert(0, "x", x.ravel())
+        return data
+
+    def to_arrow_table(self):
+        """
+        채널별 열을 가진 Arrow 테이블 (수치형 배열은 복사 없이 Arrow 버퍼로 감쌈)
+        """
+        return pa.table({name: pa.array(column) for name, column in self.flat_columns().items()})
@@ -1,105 +1,76 @@
-import pandas as pd
-from pyproj import Proj, Transformer
-from multiprocessing import Pool, cpu_count
-from tqdm import tqdm
+import numpy as np
 
-# Lambert Conformal Conic (LCC) 투영 설정
-lcc_params = {
-    "lat_1": 30.0,   # 표준 평행선 1
-    "lat_2": 60.0,   # 표준 평행선 2
-    "lat_0": 38.0,   # 원점 위도
-    "lon_0": 126.0   # 중심 자오선
-}
+from grid_spec import LCC_PARAMS, get_grid_spec, get_inverse_transformer
 
-def get_lcc_params_by_resolution(resolution):
-    if resolution == 0.5:
-        return {
-            "x_start": 1430, "x_end": 2665,
-            "y_start": 1545, "y_end": 2283,
-            "image_width": 3600,
-            "image_height": 3600,
-            "x_min": -899750,
-            "x_max": 899750,
-            "y_min": -899750,
-            "y_max": 899750,
-        }
-    elif resolution == 1.0:
-        return {
-            "x_start": 715, "x_end": 1327,
-            "y_start": 772, "y_end": 1441,
-            "image_width": 1800,
-            "image_height": 1800,
-            "x_min": -899500,
-            "x_max": 899500,
-            "y_min": -899500,
-            "y_max": 899500,
-        }
-    elif resolution == 2.0:
-        return {
-            "x_start": 357, "x_end": 443,
-            "y_start": 410, "y_end": 720,
-            "image_width": 900,
-            "image_height": 900,
-            "x_min": -899000,
-            "x_max": 899000,
-            "y_min": -899000,
-            "y_max": 899000,
-        }
+# Lambert Conformal Conic (LCC) 투영 설정 (grid_spec.LCC_PARAMS)
+lcc_params = LCC_PARAMS
 
-def pixel_to_latlon(args):
-    pixel_x, pixel_y, params, lcc_params = args
-    lcc_proj = Proj(
-        proj="lcc",
-        lat_1=lcc_params["lat_1"],  # 표준 평행선 1
-        lat_2=lcc_params["lat_2"],  # 표준 평행선 2
-        lat_0=lcc_params["lat_0"],  # 원점 위도
-        lon_0=lcc_params["lon_0"],  # 중심 자오선
-        x_0=0,
-        y_0=0,
-        ellps="WGS84"  # 타원체
-    )
-    wgs_proj = Proj(proj="latlong", datum="WGS84")
-    transformer = Transformer.from_proj(lcc_proj, wgs_proj)
-    x = params["x_min"] + (pixel_x / (params["image_width"] - 1)) * (params["x_max"] - params["x_min"])
-    y = params["y_max"] - (pixel_y / (params["image_height"] - 1)) * (params["y_max"] - params["y_min"])
-    lon, lat = transformer.transform(x, y)
-    return pixel_x, pixel_y, lat, lon
+def lcc_to_pixel(x_m, y_m, resolution, mode="floor"):
+    """
+    Lambert 좌표(m) 배열을 해상도별 픽셀 좌표로 변환
 
-def latlon_to_pixel(lat, lon, resolution):
+    Returns:
+    - x, y: mode가 "floor"/"round"면 int64 배열(창 밖은 -1), "fractional"이면 float64 배열(창 밖은 NaN)
+    - inside: x_start..x_end, y_start..y_end 창 안에 있는지 여부
     """
-    주어진 위도와 경도에서 픽셀 좌표 (x, y)를 계산합니다.
+    spec = get_grid_spec(resolution)
+    x, y = spec.lcc_to_pixel(x_m, y_m)
+
+    # 창 판정은 실제로 반환할 정수 픽셀 기준 (fractional은 그 픽셀을 포함하는 내림 값 기준)
+    if mode in ("floor", "fractional"):
+        rounding = np.floor
+    elif mode == "round":
+        rounding = np.rint
+    else:
+        raise ValueError(f"지원하지 않는 mode입니다: {mode}")
+    with np.errstate(invalid="ignore"):
+        x_pixel = rounding(x)
+        y_pixel = rounding(y)
+        inside = spec.contains(x_pixel, y_pixel)
+
+    if mode == "fractional":
+        return np.where(inside, x, np.nan), np.where(inside, y, np.nan), inside
+    x, y = x_pixel, y_pixel
+    x = np.where(inside, x, -1).astype(np.int64)
+    y = np.where(inside, y, -1).astype(np.int64)
+    return x, y, inside
+
+def latlon_to_pixels(lat, lon, resolutions=(0.5, 1.0, 2.0), mode="floor"):
+    """
+    위경도 배열을 여러 해상도의 픽셀 좌표로 한 번에 변환 (투영 변환은 한 번만 수행)
 
     Parameters:
-    - lat: 위도 (Latitude)
-    - lon: 경도 (Longitude)
-    - resolution: 해상도 (0.5, 1.0, 2.0 중 하나)
+    - lat, lon: 위도, 경도 (스칼라 또는 배열)
+    - resolutions: 해상도 목록
+    - mode: "floor"(내림), "round"(반올림), "fractional"(소수 픽셀 좌표)
 
     Returns:
-    - x: 픽셀 x 좌표
-    - y: 픽셀 y 좌표
+    - {해상도: (x, y, inside)} (lcc_to_pixel 참고)
     """
-    params = get_lcc_params_by_resolution(resolution)
-    lcc_proj = Proj(
-        proj="lcc",
-        lat_1=lcc_params["lat_1"],  # 표준 평행선 1
-        lat_2=lcc_params["lat_2"],  # 표준 평행선 2
-        lat_0=lcc_params["lat_0"],  # 원점 위도
-        lon_0=lcc_params["lon_0"],  # 중심 자오선
-        x_0=0,
-        y_0=0,
-        ellps="WGS84"  # 타원체
-    )
-    wgs_proj = Proj(proj="latlong", datum="WGS84")
-    transformer = Transformer.from_proj(wgs_proj, lcc_proj)
+    transformer = get_inverse_transformer(**lcc_params)
+    x_m, y_m = transformer.transform(np.asarray(lon, dtype=np.float64), np.asarray(lat, dtype=np.float64))
+    return {resolution: lcc_to_pixel(x_m, y_m, resolution, mode) for resolution in resolutions}
 
-    # 위도/경도를 Lambert 좌표로 변환
-    x_m, y_m = transformer.transform(lon, lat)
+def latlon_to_pixel(lat, lon, resolution, mode="floor", return_inside=False):
+    """
+    주어진 위도와 경도에서 픽셀 좌표 (x, y)를 계산합니다.
 
-    # Lambert 좌표를 픽셀 좌표로 변환
-    x = int((x_m - params["x_min"]) / (params["x_max"] - params["x_min"]) * (params["image_width"] - 1))
-    y = int((params["y_max"] - y_m) / (params["y_max"] - params["y_min"]) * (params["image_height"] - 1))
+    Parameters:
+    - lat: 위도 (Latitude), 스칼라 또는 배열
+    - lon: 경도 (Longitude), 스칼라 또는 배열
+    - resolution: 해상도 (0.5, 1.0, 2.0 중 하나)
+    - mode: "floor"(내림), "round"(반올림), "fractional"(소수 픽셀 좌표)
+    - return_inside: True면 창 안 여부 마스크도 반환 (기본값은 기존과 같은 (x, y))
 
-    return x, y
+    Returns:
+    - x: 픽셀 x 좌표 (창 밖이면 -1 또는 NaN)
+    - y: 픽셀 y 좌표 (창 밖이면 -1 또는 NaN)
+    - inside: return_inside=True일 때만, 격자 창 안에 있는지 여부
+    """
+    x, y, inside = latlon_to_pixels(lat, lon, (resolution,), mode)[resolution]
+    if np.ndim(lat) == 0 and np.ndim(lon) == 0:
+        x, y, inside = x.item(), y.item(), bool(inside)
+    return (x, y, inside) if return_inside else (x, y)
 
 if __name__ == '__main__':
     # 테스트 좌표
@@ -112,9 +83,12 @@ if __name__ == '__main__':
 
     resolutions = [0.5, 1.0, 2.0]
 
-    # 모든 좌표에 대해 모든 해상도 계산
-    for location in locations:
+    # 모든 좌표에 대해 모든 해상도를 한 번에 계산
+    lats = np.array([location["lat"] for location in locations])
+    lons = np.array([location["lon"] for location in locations])
+    pixels = latlon_to_pixels(lats, lons, resolutions)
+    for i, location in enumerate(locations):
         print(f"\n{location['name']}:")
         for resolution in resolutions:
-            x, y = latlon_to_pixel(location["lat"], location["lon"], resolution)
-            print(f"  Resolution {resolution}: x = {x}, y = {y}")
+            x, y, inside = pixels[resolution]
+            print(f"  Resolution {resolution}: x = {x[i]}, y = {y[i]}" + ("" if inside[i] else " (창 밖)"))
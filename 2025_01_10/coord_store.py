@@ -0,0 +1,300 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from grid_spec import get_grid_spec
+
+# 위경도 2D 배열 저장 형식
+STORE_DTYPE = np.float32
+
+
+def store_paths(store_dir, resolution):
+    """
+    해상도별 좌표 저장소 파일 경로 (헤더 json, 위도 npy, 경도 npy)
+    """
+    base = os.path.join(store_dir, f"coordinates_res_{resolution}")
+    return f"{base}.json", f"{base}_lat.npy", f"{base}_lon.npy"
+
+
+def _save_npy_atomic(path, array):
+    tmp_path = f"{path}.tmp.npy"
+    np.save(tmp_path, array)
+    os.replace(tmp_path, path)
+
+
+def write_coordinate_store(store_dir, resolution, params, latitude, longitude):
+    """
+    (행=y, 열=x) 2D 위경도 배열과 격자 창 정보를 헤더와 함께 저장
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    header_path, lat_path, lon_path = store_paths(store_dir, resolution)
+    _save_npy_atomic(lat_path, np.ascontiguousarray(latitude, dtype=STORE_DTYPE))
+    _save_npy_atomic(lon_path, np.ascontiguousarray(longitude, dtype=STORE_DTYPE))
+
+    header = {
+        "resolution": resolution,
+        "x_start": params["x_start"], "x_end": params["x_end"],
+        "y_start": params["y_start"], "y_end": params["y_end"],
+        "shape": list(latitude.shape),
+        "dtype": np.dtype(STORE_DTYPE).name,
+        "lat_file": os.path.basename(lat_path),
+        "lon_file": os.path.basename(lon_path),
+    }
+    # 헤더는 배열 저장이 끝난 뒤 마지막에 기록 (헤더가 있으면 배열도 완성된 상태)
+    tmp_header = f"{header_path}.tmp"
+    with open(tmp_header, "w", encoding="utf-8") as f:
+        json.dump(header, f, indent=2)
+    os.replace(tmp_header, header_path)
+    print(f"좌표 저장소가 저장되었습니다: {header_path}")
+    return header_path
+
+
+def build_coordinate_store(resolution, store_dir):
+    """
+    격자 창 전체를 한 번에 변환해 좌표 저장소 생성
+    """
+    spec = get_grid_spec(resolution)
+    latitude, longitude = spec.window_latlon
+    return write_coordinate_store(store_dir, resolution, spec.params, latitude, longitude)
+
+
+def convert_parquet_to_store(precomputed_parquet_path, resolution, store_dir):
+    """
+    기존 precomputed_coordinates_res_{resolution}.parquet(x, y, Latitude, Longitude)를 좌표 저장소로 변환.
+    parquet에 없는 픽셀은 NaN
+    """
+    spec = get_grid_spec(resolution)
+    data = pd.read_parquet(precomputed_parquet_path, columns=["x", "y", "Latitude", "Longitude"])
+
+    height, width = spec.window_shape
+    latitude = np.full((height, width), np.nan, dtype=STORE_DTYPE)
+    longitude = np.full((height, width), np.nan, dtype=STORE_DTYPE)
+
+    ix = data["x"].to_numpy() - spec.x_start
+    iy = data["y"].to_numpy() - spec.y_start
+    inside = (ix >= 0) & (ix < width) & (iy >= 0) & (iy < height)
+    latitude[iy[inside], ix[inside]] = data["Latitude"].to_numpy()[inside]
+    longitude[iy[inside], ix[inside]] = data["Longitude"].to_numpy()[inside]
+    return write_coordinate_store(store_dir, resolution, spec.params, latitude, longitude)
+
+
+class CoordinateStore:
+    """
+    메모리 맵으로 연 해상도별 위경도 2D 배열.
+    여러 프로세스가 같은 파일을 열면 OS 페이지 캐시를 공유함
+    """
+
+    def __init__(self, store_dir, resolution):
+        header_path, _, _ = store_paths(store_dir, resolution)
+        with open(header_path, encoding="utf-8") as f:
+            self.header = json.load(f)
+        self.resolution = resolution
+        self.x_start = self.header["x_start"]
+        self.y_start = self.header["y_start"]
+        self.latitude = np.load(os.path.join(store_dir, self.header["lat_file"]), mmap_mode="r")
+        self.longitude = np.load(os.path.join(store_dir, self.header["lon_file"]), mmap_mode="r")
+        self.shape = self.latitude.shape
+
+    def contains(self, x, y):
+        """
+        픽셀 좌표 (x, y)가 격자 창 안에 있는지 여부 (배열)
+        """
+        ix = np.asarray(x) - self.x_start
+        iy = np.asarray(y) - self.y_start
+        return (ix >= 0) & (ix < self.shape[1]) & (iy >= 0) & (iy < self.shape[0])
+
+    def lookup(self, x, y):
+        """
+        픽셀 좌표 배열 (x, y)의 위도, 경도를 배열 인덱싱으로 조회.
+        창 밖의 픽셀은 NaN
+
+        Returns:
+        - latitude, longitude: 입력과 같은 길이의 float32 배열
+        """
+        ix = np.asarray(x, dtype=np.int64) - self.x_start
+        iy = np.asarray(y, dtype=np.int64) - self.y_start
+        inside = self.contains(x, y)
+
+        latitude = np.full(ix.shape, np.nan, dtype=self.latitude.dtype)
+        longitude = np.full(ix.shape, np.nan, dtype=self.longitude.dtype)
+        latitude[inside] = self.latitude[iy[inside], ix[inside]]
+        longitude[inside] = self.longitude[iy[inside], ix[inside]]
+        return latitude, longitude
+
+
+def grid_latlon(resolution, rows, cols, store=None):
+    """
+    지역 배열 (rows, cols) 전체 픽셀의 위도, 경도 (행 우선 1D float32 배열, 좌표 파일 저장용)
+
+    Parameters:
+    - resolution: 해상도 (0.5, 1.0, 2.0 중 하나)
+    - rows, cols: 지역 배열 크기
+    - store: CoordinateStore 또는 좌표 저장소 디렉토리. None이면 투영 변환으로 직접 계산
+    """
+    if store is None:
+        latitude, longitude = get_grid_spec(resolution).regional_latlon(rows, cols)
+        return latitude.astype(STORE_DTYPE).ravel(), longitude.astype(STORE_DTYPE).ravel()
+    x, y = np.meshgrid(np.arange(cols), np.arange(rows))
+    data = attach_latlon(pd.DataFrame({"x": x.ravel(), "y": y.ravel()}), resolution, store=store)
+    return data["Latitude"].to_numpy(STORE_DTYPE), data["Longitude"].to_numpy(STORE_DTYPE)
+
+
+def find_block_length(x, y):
+    """
+    (x, y) 열이 같은 격자 블록의 반복(예: 24시간 일자료)이면 블록 길이를, 아니면 전체 길이를 반환.
+    마지막 블록은 잘려 있어도 됨
+    """
+    n = len(x)
+    if n == 0:
+        return 0
+    starts = np.flatnonzero((x == x[0]) & (y == y[0]))
+    if len(starts) < 2:
+        return n
+    block_length = int(starts[1])
+    if np.array_equal(x[block_length:], x[:n - block_length]) and np.array_equal(y[block_length:], y[:n - block_length]):
+        return block_length
+    return n
+
+
+def attach_latlon(data, resolution, store=None, offset=True, drop_xy=True):
+    """
+    픽셀 x, y 열을 가진 데이터프레임에 Latitude, Longitude 열을 벡터 연산으로 추가.
+    반복되는 격자 블록은 자동으로 찾아 블록당 한 번만 조회함
+
+    Parameters:
+    - data: x, y 열을 가진 데이터프레임
+    - resolution: 해상도 (0.5, 1.0, 2.0 중 하나)
+    - store: CoordinateStore 또는 좌표 저장소 디렉토리. None이면 투영 변환으로 직접 계산
+    - offset: True면 x, y에 x_offset, y_offset을 더해 전체 영상 픽셀 좌표로 변환 (지역 자료 배열용)
+    - drop_xy: True면 x, y 열 삭제
+
+    Returns:
+    - Latitude, Longitude 열이 추가된 데이터프레임 (저장소 창 밖의 좌표는 NaN)
+    """
+    latitude, longitude = lookup_latlon(data["x"].to_numpy(), data["y"].to_numpy(), resolution, store=store, offset=offset)
+    data = data.drop(columns=["x", "y"]) if drop_xy else data.copy()
+    data["Latitude"] = latitude
+    data["Longitude"] = longitude
+    return data
+
+
+def window_latlon_lookup(spec, x, y):
+    """
+    전체 영상 픽셀 좌표 배열의 위도, 경도를 spec.window_latlon(프로세스당 한 번 계산) 인덱싱으로 조회.
+    창 밖 픽셀만 투영 변환하므로 pixel_to_latlon과 같은 값
+    """
+    window_latitude, window_longitude = spec.window_latlon
+    inside = spec.contains(x, y)
+    latitude = np.empty(len(x), dtype=window_latitude.dtype)
+    longitude = np.empty(len(x), dtype=window_longitude.dtype)
+    iy = y[inside] - spec.y_start
+    ix = x[inside] - spec.x_start
+    latitude[inside] = window_latitude[iy, ix]
+    longitude[inside] = window_longitude[iy, ix]
+    if not inside.all():
+        latitude[~inside], longitude[~inside] = spec.pixel_to_latlon(x[~inside], y[~inside])
+    return latitude, longitude
+
+
+def lookup_latlon(x, y, resolution, store=None, offset=True, window=False):
+    """
+    픽셀 x, y 배열의 위도, 경도 (반복되는 격자 블록은 자동으로 찾아 블록당 한 번만 조회)
+
+    Parameters:
+    - x, y: 픽셀 좌표 배열
+    - resolution: 해상도 (0.5, 1.0, 2.0 중 하나)
+    - store: CoordinateStore 또는 좌표 저장소 디렉토리. None이면 투영 변환으로 직접 계산
+    - offset: True면 x, y에 x_offset, y_offset을 더해 전체 영상 픽셀 좌표로 변환 (지역 자료 배열용)
+    - window: store가 None일 때 True면 window_latlon_lookup 사용 (같은 격자를 배치로 여러 번 조회할 때)
+
+    Returns:
+    - latitude, longitude: 입력과 같은 길이의 배열 (저장소 창 밖의 좌표는 NaN)
+    """
+    spec = get_grid_spec(resolution)
+
+    # 반복 블록은 첫 블록만 조회
+    block_length = find_block_length(x, y)
+    block_x = x[:block_length].astype(np.int64)
+    block_y = y[:block_length].astype(np.int64)
+    if offset:
+        block_x = block_x + spec.x_offset
+        block_y = block_y + spec.y_offset
+
+    if store is not None:
+        if not isinstance(store, CoordinateStore):
+            store = CoordinateStore(store, resolution)
+        latitude, longitude = store.lookup(block_x, block_y)
+    elif window:
+        latitude, longitude = window_latlon_lookup(spec, block_x, block_y)
+    else:
+        latitude, longitude = spec.pixel_to_latlon(block_x, block_y)
+
+    if block_length < len(x):
+        latitude = np.resize(latitude, len(x))
+        longitude = np.resize(longitude, len(x))
+    return latitude, longitude
+
+
+def attach_latlon_parquet(input_path, output_path, resolution, store=None, offset=True,
+                          batch_size=1 << 20, compression="zstd"):
+    """
+    x, y 열을 가진 parquet 파일을 배치 단위로 읽어 x, y를 Latitude, Longitude로 바꿔 스트리밍 저장.
+    한 번에 batch_size행만 메모리에 올리므로 최대 메모리는 파일 크기가 아니라 배치 크기로 정해짐
+
+    Parameters:
+    - input_path, output_path: 입력/출력 parquet 경로 (출력은 임시 파일에 쓴 뒤 교체)
+    - resolution: 해상도 (0.5, 1.0, 2.0 중 하나)
+    - store: CoordinateStore 또는 좌표 저장소 디렉토리 (None이면 투영 변환으로 계산)
+    - offset: True면 x, y에 x_offset, y_offset을 더함 (지역 자료 배열용)
+    - batch_size: 배치당 행 수 (출력 행 그룹 크기)
+
+    Returns:
+    - 기록한 행 수
+    """
+    if store is not None and not isinstance(store, CoordinateStore):
+        store = CoordinateStore(store, resolution)  # 배치마다 다시 열지 않음
+
+    parquet_file = pq.ParquetFile(input_path)
+    tmp_path = f"{output_path}.tmp"
+    writer = None
+    num_rows = 0
+    try:
+        try:
+            for batch in parquet_file.iter_batches(batch_size=batch_size):
+                latitude, longitude = lookup_latlon(batch.column("x").to_numpy(), batch.column("y").to_numpy(),
+                                                    resolution, store=store, offset=offset, window=True)
+                table = pa.Table.from_batches([batch]).drop(["x", "y"])
+                table = table.append_column("Latitude", pa.array(latitude)).append_column("Longitude", pa.array(longitude))
+                if writer is None:
+                    writer = pq.ParquetWriter(tmp_path, table.schema.remove_metadata(), compression=compression)
+                writer.write_table(table.replace_schema_metadata(None))
+                num_rows += table.num_rows
+        finally:
+            if writer is not None:
+                writer.close()
+        if writer is None:
+            # 빈 파일은 스키마만 변환해 저장
+            schema = parquet_file.schema_arrow.remove_metadata()
+            schema = schema.remove(schema.get_field_index("x"))
+            schema = schema.remove(schema.get_field_index("y"))
+            dtype = pa.from_numpy_dtype(STORE_DTYPE if store is not None else np.float64)
+            schema = schema.append(pa.field("Latitude", dtype)).append(pa.field("Longitude", dtype))
+            pq.write_table(schema.empty_table(), tmp_path, compression=compression)
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)  # 실패하면 쓰다 만 임시 파일을 남기지 않음
+        raise
+    return num_rows
+
+
+if __name__ == '__main__':
+    # 해상도별 좌표 저장소 생성
+    resolutions = [2.0, 1.0, 0.5]
+    store_dir = r"F:\INKLE\2024_01_10\coordinate_store"
+
+    for resolution in resolutions:
+        build_coordinate_store(resolution, store_dir)
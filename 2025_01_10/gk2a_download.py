@@ -0,0 +1,168 @@
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import stage_metrics
+
+# 기상청 API 허브 GK2A LE1B 자료 (typ05)
+API_BASE_URL = "https://apihub.kma.go.kr/api/typ05/api/GK2A/LE1B"
+
+# 재시도할 HTTP 상태 코드 (그 외 4xx는 재시도해도 같은 결과)
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# 정상 응답 본문(NetCDF4)은 HDF5 서명으로 시작함 (오류 안내 등 다른 본문은 캐시하지 않음)
+HDF5_SIGNATURE = b"\x89HDF\r\n\x1a\n"
+
+
+def is_granule_payload(payload):
+    """
+    응답 본문이 HDF5(NetCDF4) 파일 형식인지 여부 (잘린 파일까지는 확인하지 않으므로 해독 실패 시 GranuleCache.invalidate 사용)
+    """
+    return payload[:len(HDF5_SIGNATURE)] == HDF5_SIGNATURE
+
+
+class TokenBucket:
+    """
+    초당 rate개의 토큰을 채우는 토큰 버킷 (스레드 안전).
+    capacity만큼은 연속 요청을 허용하고, rate가 None이면 제한 없음
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate or 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class GK2ADownloader:
+    """
+    keep-alive 세션 하나를 공유하는 스레드 풀로 GK2A 채널 자료를 동시에 다운로드.
+
+    Parameters:
+    - auth_key: API 허브 인증키
+    - region: 지역 코드 (예: "LA")
+    - base_url: API 주소 (테스트 시 로컬 스텁 서버 주소로 교체)
+    - max_workers: 동시 요청 수 (= 연결 풀 크기)
+    - rate_limit: 초당 최대 요청 수 (None이면 제한 없음)
+    - burst: 토큰 버킷 용량 (연속 허용 요청 수)
+    - max_retries: 요청당 최대 재시도 횟수
+    - backoff_base, backoff_max: 지수 백오프 기본/최대 대기 시간(초), 지터 적용
+    - timeout: 요청 타임아웃(초)
+    - cache: GranuleCache (있으면 캐시된 자료는 네트워크 요청 없이 반환하고 새로 받은 자료는 저장)
+    """
+
+    def __init__(self, auth_key, region="LA", base_url=API_BASE_URL, max_workers=8, rate_limit=8.0,
+                 burst=None, max_retries=4, backoff_base=1.0, backoff_max=30.0, timeout=10, cache=None):
+        self.auth_key = auth_key
+        self.region = region
+        self.base_url = base_url.rstrip("/")
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.cache = cache
+        self.bucket = TokenBucket(rate_limit, burst)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        self.session.close()
+
+    def build_url(self, data_type, searching_time):
+        # url은 분 단위까지만 인정
+        return (f"{self.base_url}/{data_type}/{self.region}/data"
+                f"?date={searching_time.strftime('%Y%m%d%H%M')}&authKey={self.auth_key}")
+
+    def backoff_delay(self, attempt):
+        # 지수 백오프 + full jitter
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def fetch(self, data_type, searching_time):
+        """
+        한 채널, 한 시각의 응답 본문(bytes)을 반환. 재시도 후에도 실패하면 마지막 예외를 발생
+        """
+        with stage_metrics.stage("download", data_type=data_type, time=searching_time.strftime('%Y%m%d%H%M')) as stage:
+            if self.cache is not None:
+                payload = self.cache.get(data_type, self.region, searching_time)
+                if payload is not None:
+                    stage.add(bytes_in=len(payload), cache_hits=1)
+                    return payload
+
+            url = self.build_url(data_type, searching_time)
+            for attempt in range(self.max_retries + 1):
+                self.bucket.acquire()
+                try:
+                    response = self.session.get(url, timeout=self.timeout)
+                    response.raise_for_status()
+                    if self.cache is not None and is_granule_payload(response.content):
+                        self.cache.put(data_type, self.region, searching_time, response.content)
+                    stage.add(bytes_in=len(response.content), retries=attempt)
+                    return response.content
+                except requests.exceptions.HTTPError as e:
+                    if e.response is None or e.response.status_code not in RETRY_STATUS_CODES or attempt == self.max_retries:
+                        raise
+                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                    if attempt == self.max_retries:
+                        raise
+                time.sleep(self.backoff_delay(attempt))
+
+    def _fetch_or_error(self, data_type, searching_time):
+        try:
+            return self.fetch(data_type, searching_time)
+        except requests.exceptions.RequestException as e:
+            return e
+
+    def submit_slot(self, data_types, searching_time):
+        """
+        한 시각의 모든 채널 요청을 스레드 풀에 제출하고 future 목록을 반환
+        """
+        return [self.executor.submit(self._fetch_or_error, data_type, searching_time) for data_type in data_types]
+
+    def iter_slots(self, data_types, slot_times, prefetch=2):
+        """
+        slot_times 순서대로 (시각, 채널별 결과 목록)을 반환.
+        결과는 응답 본문(bytes) 또는 실패 시 requests 예외이며, prefetch개 시각을 미리 요청해 둠
+        """
+        pending = deque()
+        slot_times = iter(slot_times)
+        for searching_time in slot_times:
+            pending.append((searching_time, self.submit_slot(data_types, searching_time)))
+            if len(pending) > prefetch:
+                break
+        while pending:
+            searching_time, futures = pending.popleft()
+            next_time = next(slot_times, None)
+            if next_time is not None:
+                pending.append((next_time, self.submit_slot(data_types, next_time)))
+            yield searching_time, [future.result() for future in futures]
@@ -0,0 +1,194 @@
+import io
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import h5py
+import numpy as np
+import requests
+
+from gk2a_download import GK2ADownloader, is_granule_payload
+from granule_cache import GranuleCache
+
+# 기상청 API 허브 typ05 GK2A LE1B 경로 (/api/typ05/api/GK2A/LE1B/{채널}/{지역}/data?date=...&authKey=...)
+STUB_PREFIX = "/api/typ05/api/GK2A/LE1B"
+
+
+def granule_bytes(data_type, date, shape=(4, 5)):
+    """
+    GK2A LE1B 형식을 흉내 낸 작은 HDF5 응답 본문 (image_pixel_values + 채널/시각 속성)
+    """
+    buffer = io.BytesIO()
+    with h5py.File(buffer, "w") as file:
+        file["image_pixel_values"] = np.full(shape, int(date[-4:]), dtype=np.uint16)
+        file.attrs["channel"] = data_type
+        file.attrs["date"] = date
+        file.attrs["DN_to_Radiance_Gain"] = np.float32(-0.0108914673)
+        file.attrs["DN_to_Radiance_Offset"] = np.float32(44.1777038)
+    return buffer.getvalue()
+
+
+def read_stub_granule(payload):
+    """
+    granule_bytes 본문의 (채널, 시각). HDF5가 아니거나 잘린 본문이면 OSError
+    """
+    with h5py.File(io.BytesIO(payload), "r") as file:
+        return str(file.attrs["channel"]), str(file.attrs["date"])
+
+
+class StubGK2AServer:
+    """
+    apihub.kma.go.kr typ05 GK2A 엔드포인트를 흉내 내는 로컬 HTTP 서버 (스레드에서 실행).
+
+    Parameters:
+    - failures: {(채널, 시각): n} 처음 n번은 503을 반환
+    - bad_bodies: {(채널, 시각): "html" 또는 "truncated"} 200 상태로 HDF5가 아닌 본문 또는 잘린 본문을 반환
+    - delays: {(채널, 시각): 초} 응답 전 대기 시간 (완료 순서를 요청 순서와 다르게 만들 때 사용)
+    - channels: 응답할 채널 목록 (그 외 채널은 404, None이면 전체)
+    """
+
+    def __init__(self, failures=None, bad_bodies=None, delays=None, channels=None):
+        self.failures = dict(failures or {})
+        self.bad_bodies = dict(bad_bodies or {})
+        self.delays = dict(delays or {})
+        self.channels = channels
+        self.requests = []  # (시각, 채널, 요청 시각 time.monotonic())
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive
+
+            def do_GET(self):
+                stub._handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}{STUB_PREFIX}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def request_count(self, data_type=None, date=None):
+        with self.lock:
+            return sum(1 for d, c, _ in self.requests if (data_type is None or c == data_type) and (date is None or d == date))
+
+    def _handle(self, handler):
+        url = urlparse(handler.path)
+        parts = url.path[len(STUB_PREFIX):].strip("/").split("/")
+        date = parse_qs(url.query).get("date", [""])[0]
+        data_type = parts[0] if parts else ""
+        key = (data_type, date)
+        with self.lock:
+            self.requests.append((date, data_type, time.monotonic()))
+            failing = self.failures.get(key, 0) > 0
+            if failing:
+                self.failures[key] -= 1
+        time.sleep(self.delays.get(key, 0.0))
+
+        if len(parts) != 3 or parts[2] != "data" or (self.channels is not None and data_type not in self.channels):
+            status, body = 404, b"not found"
+        elif failing:
+            status, body = 503, b"service unavailable"
+        elif self.bad_bodies.get(key) == "html":
+            status, body = 200, b"<html><body>authKey error</body></html>"
+        elif self.bad_bodies.get(key) == "truncated":
+            status, body = 200, granule_bytes(data_type, date)[:200]
+        else:
+            status, body = 200, granule_bytes(data_type, date)
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/octet-stream")
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+
+def run_checks():
+    """
+    로컬 스텁 서버로 GK2ADownloader를 확인 (5xx 재시도, 재시도하지 않는 4xx, HDF5가 아닌/잘린 본문,
+    토큰 버킷 속도 제한, 미리 요청한 시각의 반환 순서). 실패하면 AssertionError
+    """
+    start = datetime(2025, 1, 8)
+    key = start.strftime("%Y%m%d%H%M")
+    fast = dict(backoff_base=0.01, backoff_max=0.05, rate_limit=None)
+
+    # 5xx는 지수 백오프로 재시도해 성공, 재시도 횟수를 넘으면 마지막 오류 발생
+    with StubGK2AServer(failures={("IR105", key): 2, ("IR112", key): 10}) as server:
+        with GK2ADownloader("stub", base_url=server.base_url, max_retries=3, **fast) as downloader:
+            assert read_stub_granule(downloader.fetch("IR105", start)) == ("IR105", key)
+            assert server.request_count("IR105") == 3
+            try:
+                downloader.fetch("IR112", start)
+                raise AssertionError("재시도 횟수를 넘은 503이 예외를 발생시키지 않았습니다")
+            except requests.exceptions.HTTPError as e:
+                assert e.response.status_code == 503
+            assert server.request_count("IR112") == 4
+    print("5xx 재시도: 통과")
+
+    # 404는 재시도하지 않음
+    with StubGK2AServer(channels=["IR105"]) as server:
+        with GK2ADownloader("stub", base_url=server.base_url, max_retries=3, **fast) as downloader:
+            result = downloader._fetch_or_error("XX000", start)
+            assert isinstance(result, requests.exceptions.HTTPError) and result.response.status_code == 404
+            assert server.request_count("XX000") == 1
+    print("4xx 재시도 안 함: 통과")
+
+    # HDF5가 아닌 본문은 캐시하지 않고, 잘린 본문은 해독 실패 후 invalidate로 캐시에서 삭제
+    bad = {("IR105", key): "html", ("IR112", key): "truncated"}
+    with tempfile.TemporaryDirectory() as cache_dir, StubGK2AServer(bad_bodies=bad) as server:
+        cache = GranuleCache(cache_dir)
+        with GK2ADownloader("stub", base_url=server.base_url, cache=cache, **fast) as downloader:
+            html = downloader.fetch("IR105", start)
+            assert not is_granule_payload(html) and cache.get("IR105", "LA", start) is None
+            truncated = downloader.fetch("IR112", start)
+            try:
+                read_stub_granule(truncated)
+                raise AssertionError("잘린 본문이 해독되었습니다")
+            except OSError:
+                assert cache.invalidate("IR112", "LA", start)
+            assert cache.get("IR112", "LA", start) is None and cache.total_bytes == 0
+            valid = downloader.fetch("IR123", start)
+            assert cache.get("IR123", "LA", start) == valid
+    print("HDF5 서명 확인 / 손상 자료 삭제: 통과")
+
+    # 토큰 버킷: 초당 20회, 연속 1회면 요청 11개에 최소 0.5초
+    with StubGK2AServer() as server:
+        with GK2ADownloader("stub", base_url=server.base_url, rate_limit=20.0, burst=1, max_workers=4) as downloader:
+            began = time.monotonic()
+            list(downloader.iter_slots(["IR105"], [start + timedelta(minutes=2 * i) for i in range(11)]))
+            elapsed = time.monotonic() - began
+            assert elapsed >= 0.45, f"속도 제한이 적용되지 않았습니다 ({elapsed:.2f}초)"
+    print(f"토큰 버킷 속도 제한: 통과 ({elapsed:.2f}초)")
+
+    # 먼저 요청한 시각이 늦게 끝나도 시각 순서, 채널 순서대로 반환
+    slot_times = [start + timedelta(minutes=2 * i) for i in range(6)]
+    data_types = ["IR105", "IR112", "WV063"]
+    delays = {(data_type, slot_times[0].strftime("%Y%m%d%H%M")): 0.3 for data_type in data_types}
+    with StubGK2AServer(delays=delays) as server:
+        with GK2ADownloader("stub", base_url=server.base_url, max_workers=8, **fast) as downloader:
+            returned = []
+            for searching_time, payloads in downloader.iter_slots(data_types, slot_times, prefetch=2):
+                returned.append(searching_time)
+                assert [read_stub_granule(payload) for payload in payloads] == \
+                    [(data_type, searching_time.strftime("%Y%m%d%H%M")) for data_type in data_types]
+            assert returned == slot_times
+    print("미리 요청한 시각의 반환 순서: 통과")
+
+
+if __name__ == '__main__':
+    run_checks()
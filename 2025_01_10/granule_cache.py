@@ -0,0 +1,214 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+
+class GranuleCache:
+    """
+    원본 GK2A 자료(.nc 바이트)의 내용 주소 기반 로컬 캐시.
+
+    objects/<sha256 앞 2자리>/<sha256> 에 내용을 한 번만 저장하고,
+    refs/<지역>/<채널>/<YYYYmmddHHMM> 파일에 해당 내용의 sha256을 기록함.
+    모든 쓰기는 임시 파일 + os.replace로 원자적으로 수행하므로 중단되어도 불완전한 파일이 남지 않음.
+    용량(max_bytes)을 넘으면 가장 오래 사용하지 않은 객체부터 삭제 (메모리 LRU 색인, 사용 시 mtime도 갱신)
+
+    Parameters:
+    - cache_dir: 캐시 디렉토리
+    - max_bytes: 최대 용량 (바이트)
+    - max_age: 이 시간(초)보다 오래 사용하지 않은 객체는 용량과 관계없이 삭제 (None이면 사용 안 함)
+    """
+
+    def __init__(self, cache_dir, max_bytes=20 * 1024 ** 3, max_age=None):
+        self.cache_dir = cache_dir
+        self.objects_dir = os.path.join(cache_dir, "objects")
+        self.refs_dir = os.path.join(cache_dir, "refs")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.refs_dir, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # LRU 색인 {sha256: (크기, 마지막 사용 시각)}, 오래 사용하지 않은 순서. 시작할 때 한 번만 디렉토리를 읽고
+        # 이후에는 색인만 갱신하므로 용량 초과 시에도 objects/ 전체를 다시 읽지 않음
+        self.index = OrderedDict(
+            (os.path.basename(path), (size, last_used))
+            for path, last_used, size in sorted(self._scan_objects(), key=lambda item: item[1])
+        )
+        self.total_bytes = sum(size for size, _ in self.index.values())
+        if max_age is not None:
+            self.expire()
+
+    def _ref_path(self, channel, region, timestamp):
+        return os.path.join(self.refs_dir, region, channel, timestamp.strftime("%Y%m%d%H%M"))
+
+    def _object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def _scan_objects(self):
+        # (경로, 마지막 사용 시각, 크기)
+        for prefix in os.listdir(self.objects_dir):
+            prefix_dir = os.path.join(self.objects_dir, prefix)
+            for entry in os.scandir(prefix_dir):
+                if entry.is_file() and ".tmp" not in entry.name:
+                    stat = entry.stat()
+                    yield entry.path, stat.st_mtime, stat.st_size
+
+    @staticmethod
+    def _write_atomic(path, payload):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _read_ref(self, ref_path):
+        try:
+            with open(ref_path, encoding="ascii") as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return None
+
+    def get(self, channel, region, timestamp):
+        """
+        캐시된 응답 본문(bytes) 또는 None.
+        파일 읽기는 잠금 밖에서 하므로 여러 다운로드 스레드가 동시에 읽을 수 있음 (잠금은 색인/통계 갱신에만 사용)
+        """
+        ref_path = self._ref_path(channel, region, timestamp)
+        digest = self._read_ref(ref_path)
+        payload = None
+        if digest is not None:
+            object_path = self._object_path(digest)
+            try:
+                with open(object_path, "rb") as f:
+                    payload = f.read()
+            except FileNotFoundError:
+                self._remove(ref_path)  # 삭제된 객체를 가리키는 ref 정리
+        with self.lock:
+            if payload is None:
+                self.misses += 1
+                return None
+            if digest in self.index:
+                self.index[digest] = (self.index[digest][0], time.time())
+                self.index.move_to_end(digest)
+            self.hits += 1
+        try:
+            os.utime(object_path)  # 다음 시작 때 색인 순서를 위해 사용 시각 기록
+        except FileNotFoundError:
+            pass
+        return payload
+
+    def put(self, channel, region, timestamp, payload):
+        """
+        응답 본문을 저장하고 sha256을 반환. 같은 내용은 한 번만 저장됨.
+        색인에 먼저 등록한 뒤 fsync하는 쓰기는 잠금 밖에서 수행.
+        본문이 max_bytes보다 크거나 쓰는 동안 다른 스레드의 저장으로 밀려나면 ref를 남기지 않고 None을 반환
+        """
+        size = len(payload)
+        if size > self.max_bytes:
+            return None
+        digest = hashlib.sha256(payload).hexdigest()
+        object_path = self._object_path(digest)
+        with self.lock:
+            exists = digest in self.index
+            if not exists:
+                self.total_bytes += size
+            else:
+                self.index.move_to_end(digest)
+            self.index[digest] = (size, time.time())
+            evicted = self._pop_evicted(keep=digest)
+        self._unlink_evicted(evicted)
+        if exists:
+            try:
+                os.utime(object_path)
+            except FileNotFoundError:  # 같은 내용을 다른 스레드가 아직 쓰는 중
+                exists = False
+        if not exists:
+            self._write_atomic(object_path, payload)
+            with self.lock:
+                if digest not in self.index:
+                    self._remove(object_path)
+                    return None
+        self._write_atomic(self._ref_path(channel, region, timestamp), digest.encode("ascii"))
+        return digest
+
+    def invalidate(self, channel, region, timestamp):
+        """
+        ref와 그 ref가 가리키는 객체를 삭제 (해독에 실패한 자료를 다음 재시도 때 다시 받도록).
+        객체는 내용 주소 기반이므로 같은 내용을 가리키는 다른 ref도 다음 get에서 miss로 정리됨
+
+        Returns:
+        - 삭제했으면 True
+        """
+        ref_path = self._ref_path(channel, region, timestamp)
+        digest = self._read_ref(ref_path)
+        if digest is None:
+            return False
+        self._remove(ref_path)
+        with self.lock:
+            if digest in self.index:
+                self.total_bytes -= self.index.pop(digest)[0]
+            self._remove(self._object_path(digest))
+        return True
+
+    def _pop_evicted(self, expire_before=None, keep=None):
+        # 잠금 안에서 호출. 오래 사용하지 않은 객체부터 색인에서 빼고 sha256 목록을 반환 (keep은 빼지 않음).
+        # 이 객체를 가리키던 refs는 다음 get에서 miss로 정리됨
+        evicted = []
+        while self.index:
+            digest, (size, last_used) = next(iter(self.index.items()))
+            expired = expire_before is not None and last_used < expire_before
+            if digest == keep or (not expired and self.total_bytes <= self.max_bytes):
+                break
+            self.index.popitem(last=False)
+            self.total_bytes -= size
+            self.evictions += 1
+            evicted.append(digest)
+        return evicted
+
+    def _unlink_evicted(self, digests):
+        # 삭제 직전에 잠금 안에서 색인을 다시 확인 (그 사이 다른 스레드가 같은 내용을 다시 저장했으면 남김).
+        # 파일 삭제는 fsync가 없는 짧은 작업이라 잠금 안에서 수행
+        if not digests:
+            return
+        with self.lock:
+            for digest in digests:
+                if digest not in self.index:
+                    self._remove(self._object_path(digest))
+
+    def expire(self):
+        """
+        max_age보다 오래 사용하지 않은 객체 삭제 (생성 시 한 번 실행, 장시간 실행 중에는 필요할 때 호출)
+        """
+        if self.max_age is None:
+            return
+        with self.lock:
+            evicted = self._pop_evicted(expire_before=time.time() - self.max_age)
+        self._unlink_evicted(evicted)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "total_bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+        }
@@ -0,0 +1,231 @@
+import json
+import os
+from glob import glob
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from coord_store import grid_latlon
+from hourly_parquet import GRID_METADATA_KEY, read_grid_metadata
+
+# 격자별 좌표 파일 이름 (값 파티션과 같은 디렉토리에 하나만 저장)
+SIDECAR_NAME = "_coordinates.parquet"
+
+
+def sidecar_path(output_dir):
+    return os.path.join(output_dir, SIDECAR_NAME)
+
+
+def write_coordinate_sidecar(path, resolution, rows, cols, store=None, compression="zstd"):
+    """
+    지역 배열 (rows, cols)의 Latitude, Longitude(float32, 행 우선)를 격자당 한 번만 저장.
+    같은 격자 크기의 좌표 파일이 이미 있으면 다시 만들지 않음
+
+    Parameters:
+    - path: 좌표 파일 경로 (시간별 파티션 디렉토리면 sidecar_path(output_dir))
+    - resolution: 해상도 (0.5, 1.0, 2.0 중 하나)
+    - rows, cols: 지역 배열 크기
+    - store: CoordinateStore 또는 좌표 저장소 디렉토리 (None이면 투영 변환으로 계산)
+
+    Returns:
+    - 좌표 파일 경로
+    """
+    if os.path.exists(path):
+        grid = read_grid_metadata(path)
+        if (grid["rows"], grid["cols"]) == (rows, cols):
+            return path
+        raise ValueError(f"기존 좌표 파일의 격자 크기가 다릅니다: {grid['rows']}x{grid['cols']} != {rows}x{cols}")
+
+    latitude, longitude = grid_latlon(resolution, rows, cols, store=store)
+    grid = {"rows": rows, "cols": cols, "order": "row-major", "resolution": resolution}
+    table = pa.table({"Latitude": latitude, "Longitude": longitude})
+    table = table.replace_schema_metadata({GRID_METADATA_KEY: json.dumps(grid).encode("utf-8")})
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    pq.write_table(table, tmp_path, compression=compression, use_dictionary=False, use_byte_stream_split=True)
+    os.replace(tmp_path, path)
+    print(f"좌표 파일이 저장되었습니다: {path}")
+    return path
+
+
+def grid_shape_from_xy(data):
+    """
+    x, y 열에서 격자 크기 (rows, cols)를 구하고, 행이 격자 한 장의 행 우선 순서인지 확인
+    """
+    x = data["x"].to_numpy()
+    y = data["y"].to_numpy()
+    rows, cols = int(y.max()) + 1, int(x.max()) + 1
+    if len(data) != rows * cols or not (np.array_equal(y, np.arange(len(data)) // cols)
+                                        and np.array_equal(x, np.arange(len(data)) % cols)):
+        raise ValueError(f"x, y가 {rows}x{cols} 격자의 행 우선 순서가 아닙니다 (행 수 {len(data)})")
+    return rows, cols
+
+
+def write_time_partitions(output_dir, data, rows, cols, time_column="Datetime", compression="zstd"):
+    """
+    값 열만 시간별 파티션 (output_dir/{time_column}=값/part-0.parquet)으로 저장 (좌표 열 없음).
+    각 시간의 행 수가 격자 크기와 다르거나 x, y가 행 우선 순서가 아니면 오류
+
+    Returns:
+    - 저장한 파일 경로 목록
+    """
+    grid = {"rows": rows, "cols": cols, "order": "row-major"}
+    saved_paths = []
+    for time_value, values in data.groupby(time_column, sort=True):
+        if len(values) != rows * cols:
+            raise ValueError(f"{time_column}={time_value}의 행 수 {len(values)}가 격자 크기 {rows}x{cols}와 다릅니다")
+        if "x" in values.columns and "y" in values.columns:
+            grid_shape_from_xy(values)  # 시간마다 행 우선 격자 순서인지 확인
+        values = values.drop(columns=[time_column, "x", "y", "Latitude", "Longitude"], errors="ignore")
+        grid["channels"] = list(values.columns)
+        table = pa.Table.from_pandas(values, preserve_index=False)
+        table = table.replace_schema_metadata({GRID_METADATA_KEY: json.dumps(grid).encode("utf-8")})
+
+        path = os.path.join(output_dir, f"{time_column}={time_value}", "part-0.parquet")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        pq.write_table(table, tmp_path, compression=compression)
+        os.replace(tmp_path, path)
+        saved_paths.append(path)
+    return saved_paths
+
+
+def parquet_grid_shape(path, batch_size=1 << 20):
+    """
+    x, y 열의 행 그룹 통계(최대값)로 격자 크기 (rows, cols)를 구함 (값을 읽지 않음).
+    통계가 없으면 x, y 열만 배치 단위로 읽어 계산
+    """
+    parquet_file = pq.ParquetFile(path)
+    metadata = parquet_file.metadata
+    names = [metadata.schema.column(i).name for i in range(metadata.num_columns)]
+    maxima = {}
+    for column in ("x", "y"):
+        index = names.index(column)
+        for i in range(metadata.num_row_groups):
+            statistics = metadata.row_group(i).column(index).statistics
+            if statistics is None or not statistics.has_min_max:
+                maxima = None
+                break
+            maxima[column] = max(maxima.get(column, 0), int(statistics.max))
+        if maxima is None:
+            break
+    if maxima is None:
+        maxima = {"x": 0, "y": 0}
+        for batch in parquet_file.iter_batches(batch_size=batch_size, columns=["x", "y"]):
+            maxima["x"] = max(maxima["x"], int(pc.max(batch.column("x")).as_py()))
+            maxima["y"] = max(maxima["y"], int(pc.max(batch.column("y")).as_py()))
+    return maxima["y"] + 1, maxima["x"] + 1
+
+
+def write_time_partitions_batches(output_dir, batches, rows, cols, time_column="Datetime", compression="zstd"):
+    """
+    write_time_partitions의 스트리밍 버전. pyarrow record batch를 받는 대로 시간별 파티션 파일에 이어 쓰므로
+    최대 메모리는 배치 크기로 정해짐 (시간이 섞여 들어와도 파티션별 writer에 나눠 기록).
+    x, y가 있으면 파티션마다 이어지는 행 우선 순서인지 배치마다 확인하고, 끝나면 행 수가 격자 크기인지 확인.
+    파티션은 임시 파일(.tmp)에 쓰고 모든 확인이 끝난 뒤 교체하므로, 확인에 실패하면 잘린 파티션이 남지 않음
+
+    Returns:
+    - 저장한 파일 경로 목록
+    """
+    grid_size = rows * cols
+    writers = {}
+    written = {}
+    completed = False
+    try:
+        for batch in batches:
+            table = pa.Table.from_batches([batch])
+            times = table.column(time_column).to_numpy(zero_copy_only=False)
+            # 같은 시간이 이어지는 구간별로 나눔
+            starts = np.concatenate([[0], np.flatnonzero(times[1:] != times[:-1]) + 1, [len(times)]])
+            for start, end in zip(starts[:-1], starts[1:]):
+                time_value = times[start]
+                part = table.slice(start, end - start)
+                offset = written.get(time_value, 0)
+                if offset + part.num_rows > grid_size:
+                    raise ValueError(f"{time_column}={time_value}의 행 수가 격자 크기 {rows}x{cols}보다 많습니다")
+                if "x" in part.column_names and "y" in part.column_names:
+                    index = np.arange(offset, offset + part.num_rows)
+                    if not (np.array_equal(part.column("x").to_numpy(), index % cols)
+                            and np.array_equal(part.column("y").to_numpy(), index // cols)):
+                        raise ValueError(f"{time_column}={time_value}: x, y가 {rows}x{cols} 격자의 행 우선 순서가 아닙니다")
+                part = part.drop([name for name in (time_column, "x", "y", "Latitude", "Longitude") if name in part.column_names])
+
+                if time_value not in writers:
+                    grid = {"rows": rows, "cols": cols, "order": "row-major", "channels": part.column_names}
+                    path = os.path.join(output_dir, f"{time_column}={time_value}", "part-0.parquet")
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    schema = part.schema.with_metadata({GRID_METADATA_KEY: json.dumps(grid).encode("utf-8")})
+                    writers[time_value] = (path, pq.ParquetWriter(f"{path}.tmp", schema, compression=compression))
+                writers[time_value][1].write_table(part)
+                written[time_value] = offset + part.num_rows
+
+        for time_value, count in written.items():
+            if count != grid_size:
+                raise ValueError(f"{time_column}={time_value}의 행 수 {count}가 격자 크기 {rows}x{cols}와 다릅니다")
+        completed = True
+    finally:
+        for path, writer in writers.values():
+            writer.close()
+            if completed:
+                os.replace(f"{path}.tmp", path)
+            elif os.path.exists(f"{path}.tmp"):
+                os.remove(f"{path}.tmp")
+    return [writers[time_value][0] for time_value in sorted(writers)]
+
+
+def iter_with_coordinates(paths, coordinates_path, columns=None):
+    """
+    값 파일들을 격자 한 장씩 읽어 좌표 파일의 Latitude, Longitude를 붙여 반환.
+    좌표는 한 번만 읽고 격자마다 같은 배열을 붙이므로 전체를 24배로 복제하지 않음.
+    행 정렬은 격자 크기로 확인 (값 파일의 행 수가 격자 크기의 배수가 아니면 오류)
+
+    Parameters:
+    - paths: 값 parquet 파일 경로 목록 (시간별 파티션 또는 시간당 행 그룹 1개인 일별 파일)
+    - coordinates_path: 좌표 파일 경로
+    - columns: 읽을 값 열 (None이면 전체)
+
+    Returns:
+    - (파일 경로, 데이터프레임) 생성기
+    """
+    grid = read_grid_metadata(coordinates_path)
+    grid_size = grid["rows"] * grid["cols"]
+    coordinates = pq.read_table(coordinates_path)
+    latitude = coordinates.column("Latitude").to_numpy()
+    longitude = coordinates.column("Longitude").to_numpy()
+
+    for path in paths:
+        values_grid = read_grid_metadata(path)
+        if (values_grid["rows"], values_grid["cols"]) != (grid["rows"], grid["cols"]):
+            raise ValueError(f"{path}: 격자 크기 {values_grid['rows']}x{values_grid['cols']}가 "
+                             f"좌표 파일 {grid['rows']}x{grid['cols']}와 다릅니다")
+        parquet_file = pq.ParquetFile(path)
+        # 행 그룹을 이어 붙여 격자 한 장씩 자름 (스트리밍으로 쓴 파일은 행 그룹이 격자 경계와 맞지 않을 수 있음)
+        pending = None
+        for i in range(parquet_file.num_row_groups):
+            table = parquet_file.read_row_group(i, columns=columns)
+            pending = table if pending is None else pa.concat_tables([pending, table])
+            while pending.num_rows >= grid_size:
+                data = pending.slice(0, grid_size).to_pandas()
+                data["Latitude"] = latitude
+                data["Longitude"] = longitude
+                yield path, data
+                pending = pending.slice(grid_size)
+        if pending is not None and pending.num_rows:
+            raise ValueError(f"{path}: 행 수가 격자 크기 {grid_size}의 배수가 아닙니다 (남은 행 {pending.num_rows})")
+
+
+def read_with_coordinates(output_dir, columns=None, time_column="Datetime"):
+    """
+    write_time_partitions로 저장한 디렉토리를 좌표와 함께 하나의 데이터프레임으로 읽기 (시간 열 포함)
+    """
+    paths = sorted(glob(os.path.join(output_dir, f"{time_column}=*", "part-0.parquet")))
+    frames = []
+    for path, data in iter_with_coordinates(paths, sidecar_path(output_dir), columns=columns):
+        data.insert(0, time_column, os.path.basename(os.path.dirname(path)).split("=", 1)[1])
+        frames.append(data)
+    if not frames:
+        return pd.DataFrame(columns=[time_column, "Latitude", "Longitude"])
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,188 @@
+from functools import cached_property, lru_cache
+import numpy as np
+from pyproj import Proj, Transformer
+
+# Lambert Conformal Conic (LCC) 투영 설정
+LCC_PARAMS = {
+    "lat_1": 30.0,   # 표준 평행선 1
+    "lat_2": 60.0,   # 표준 평행선 2
+    "lat_0": 38.0,   # 원점 위도
+    "lon_0": 126.0   # 중심 자오선
+}
+
+
+def _lcc_proj(lat_1, lat_2, lat_0, lon_0):
+    return Proj(proj="lcc", lat_1=lat_1, lat_2=lat_2, lat_0=lat_0, lon_0=lon_0, x_0=0, y_0=0, ellps="WGS84")
+
+
+@lru_cache(maxsize=None)
+def get_transformer(lat_1, lat_2, lat_0, lon_0):
+    """
+    LCC -> WGS84 Transformer를 투영 설정별로 한 번만 생성 (프로세스마다 캐싱)
+    """
+    return Transformer.from_proj(_lcc_proj(lat_1, lat_2, lat_0, lon_0), Proj(proj="latlong", datum="WGS84"))
+
+
+@lru_cache(maxsize=None)
+def get_inverse_transformer(lat_1, lat_2, lat_0, lon_0):
+    """
+    WGS84 -> LCC Transformer를 투영 설정별로 한 번만 생성 (프로세스마다 캐싱)
+    """
+    return Transformer.from_proj(Proj(proj="latlong", datum="WGS84"), _lcc_proj(lat_1, lat_2, lat_0, lon_0))
+
+
+class GridSpec:
+    """
+    해상도별 GK2A 격자 정의 (투영, 전체 영상 크기/범위, 좌표 창, 지역 자료 배열 오프셋).
+    픽셀 <-> LCC(m) 변환식과 Transformer, 좌표 배열은 처음 사용할 때 한 번만 계산해 보관함
+
+    Parameters:
+    - resolution: 해상도 (km)
+    - image_width, image_height: 전체 영상 크기 (픽셀)
+    - x_min, x_max, y_min, y_max: 전체 영상 첫/마지막 픽셀 중심의 LCC 좌표 (m)
+    - x_start, x_end, y_start, y_end: 좌표 창 (전체 영상 픽셀, 양 끝 포함)
+    - x_offset, y_offset: 지역(LA) 자료 배열 (0, 0) 픽셀의 전체 영상 위치
+    - projection: LCC 투영 설정
+    """
+
+    def __init__(self, resolution, image_width, image_height, x_min, x_max, y_min, y_max,
+                 x_start, x_end, y_start, y_end, x_offset, y_offset, projection=LCC_PARAMS):
+        self.resolution = resolution
+        self.image_width = image_width
+        self.image_height = image_height
+        self.x_min, self.x_max = x_min, x_max
+        self.y_min, self.y_max = y_min, y_max
+        self.x_start, self.x_end = x_start, x_end
+        self.y_start, self.y_end = y_start, y_end
+        self.x_offset, self.y_offset = x_offset, y_offset
+        self.projection = dict(projection)
+        self._regional_latlon = {}
+
+    def __repr__(self):
+        return f"GridSpec(resolution={self.resolution}, window=x {self.x_start}-{self.x_end}, y {self.y_start}-{self.y_end})"
+
+    @property
+    def params(self):
+        """
+        기존 get_lcc_params_by_resolution 형식의 dict (새 dict를 반환하므로 수정해도 안전)
+        """
+        return {
+            "resolution": self.resolution,
+            "x_start": self.x_start, "x_end": self.x_end,
+            "y_start": self.y_start, "y_end": self.y_end,
+            "image_width": self.image_width, "image_height": self.image_height,
+            "x_min": self.x_min, "x_max": self.x_max,
+            "y_min": self.y_min, "y_max": self.y_max,
+            "x_offset": self.x_offset, "y_offset": self.y_offset,
+        }
+
+    @property
+    def window_shape(self):
+        # (행, 열) = (y, x)
+        return self.y_end - self.y_start + 1, self.x_end - self.x_start + 1
+
+    @cached_property
+    def transformer(self):
+        return get_transformer(**self.projection)
+
+    @cached_property
+    def inverse_transformer(self):
+        return get_inverse_transformer(**self.projection)
+
+    @cached_property
+    def pixel_size(self):
+        # 픽셀 간격 (m) (x, y)
+        return ((self.x_max - self.x_min) / (self.image_width - 1),
+                (self.y_max - self.y_min) / (self.image_height - 1))
+
+    def pixel_to_lcc(self, pixel_x, pixel_y):
+        """
+        전체 영상 픽셀 좌표 -> LCC 좌표(m) (스칼라 또는 배열)
+        """
+        dx, dy = self.pixel_size
+        return self.x_min + np.asarray(pixel_x) * dx, self.y_max - np.asarray(pixel_y) * dy
+
+    def lcc_to_pixel(self, x_m, y_m):
+        """
+        LCC 좌표(m) -> 전체 영상 소수 픽셀 좌표 (정수 값이 픽셀 중심)
+        """
+        dx, dy = self.pixel_size
+        return (np.asarray(x_m) - self.x_min) / dx, (self.y_max - np.asarray(y_m)) / dy
+
+    def pixel_to_latlon(self, pixel_x, pixel_y):
+        """
+        전체 영상 픽셀 좌표 -> (위도, 경도)
+        """
+        lon, lat = self.transformer.transform(*self.pixel_to_lcc(pixel_x, pixel_y))
+        return lat, lon
+
+    def latlon_to_pixel(self, lat, lon):
+        """
+        위경도 -> 전체 영상 소수 픽셀 좌표 (x, y)
+        """
+        x_m, y_m = self.inverse_transformer.transform(np.asarray(lon, dtype=np.float64), np.asarray(lat, dtype=np.float64))
+        return self.lcc_to_pixel(x_m, y_m)
+
+    def contains(self, pixel_x, pixel_y):
+        """
+        전체 영상 픽셀 좌표가 좌표 창 안에 있는지 여부
+        """
+        pixel_x = np.asarray(pixel_x)
+        pixel_y = np.asarray(pixel_y)
+        return ((pixel_x >= self.x_start) & (pixel_x <= self.x_end) &
+                (pixel_y >= self.y_start) & (pixel_y <= self.y_end))
+
+    @cached_property
+    def window_latlon(self):
+        """
+        좌표 창 전체의 (위도, 경도) 2D 배열 (행=y, 열=x, 읽기 전용). 프로세스당 한 번만 계산
+        """
+        pixel_x, pixel_y = np.meshgrid(np.arange(self.x_start, self.x_end + 1), np.arange(self.y_start, self.y_end + 1))
+        latitude, longitude = self.pixel_to_latlon(pixel_x, pixel_y)
+        latitude.flags.writeable = False
+        longitude.flags.writeable = False
+        return latitude, longitude
+
+    def regional_latlon(self, rows, cols):
+        """
+        지역 자료 배열 (rows, cols) 픽셀의 (위도, 경도) 2D 배열 (읽기 전용, 크기별로 한 번만 계산).
+        좌표 창 안이면 window_latlon을 잘라서 사용
+        """
+        key = (rows, cols)
+        if key not in self._regional_latlon:
+            r0 = self.y_offset - self.y_start
+            c0 = self.x_offset - self.x_start
+            window_rows, window_cols = self.window_shape
+            if r0 >= 0 and c0 >= 0 and r0 + rows <= window_rows and c0 + cols <= window_cols:
+                latitude, longitude = (array[r0:r0 + rows, c0:c0 + cols] for array in self.window_latlon)
+            else:
+                pixel_x, pixel_y = np.meshgrid(np.arange(cols) + self.x_offset, np.arange(rows) + self.y_offset)
+                latitude, longitude = self.pixel_to_latlon(pixel_x, pixel_y)
+                latitude.flags.writeable = False
+                longitude.flags.writeable = False
+            self._regional_latlon[key] = (latitude, longitude)
+        return self._regional_latlon[key]
+
+
+# 해상도별 격자 정의 (모든 모듈이 같은 창과 오프셋을 사용)
+# 창은 pre_coordinate.get_lcc_params_by_resolution(위경도 격자 생성)과 같은 값.
+# 이전 coord_calc의 표에는 0.5km y_end=2283, 2km x_end=443 / y_start=410으로 잘못 적혀 있어
+# 지점 추출에서 창 마스크를 쓰면서 2883, 663 / 386으로 맞췄고, 이후 이 표로 옮김
+GRID_SPECS = {
+    0.5: GridSpec(0.5, 3600, 3600, -899750, 899750, -899750, 899750,
+                  x_start=1430, x_end=2665, y_start=1545, y_end=2883, x_offset=1430, y_offset=1773),
+    1.0: GridSpec(1.0, 1800, 1800, -899500, 899500, -899500, 899500,
+                  x_start=715, x_end=1327, y_start=772, y_end=1441, x_offset=715, y_offset=886),
+    2.0: GridSpec(2.0, 900, 900, -899000, 899000, -899000, 899000,
+                  x_start=357, x_end=663, y_start=386, y_end=720, x_offset=357, y_offset=443),
+}
+
+
+def get_grid_spec(resolution):
+    """
+    해상도(0.5, 1.0, 2.0)의 GridSpec
+    """
+    try:
+        return GRID_SPECS[float(resolution)]
+    except (KeyError, TypeError, ValueError):
+        raise ValueError(f"지원하지 않는 해상도입니다: {resolution}") from None
@@ -0,0 +1,149 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from calibration import calibrate_columns, frames_column, stored_columns
+from channel_cube import ChannelCube
+
+# 파일 메타데이터에 격자 정보를 기록하는 키
+GRID_METADATA_KEY = b"inkle.grid"
+
+# 일별 파일에 병합된 시간 목록을 기록하는 메타데이터 키
+DAILY_METADATA_KEY = b"inkle.daily"
+
+# 기본 행 그룹 크기 (지점 추출 시 필요한 행 그룹만 읽을 수 있도록 작게 유지)
+DEFAULT_ROW_GROUP_SIZE = 16384
+
+
+def hourly_partition_path(output_root, hourly_start_time, size_key):
+    """
+    날짜/시간/격자 크기별 파티션 경로 (예: root/date=20250108/hour=00/grid=277x306/part-0.parquet)
+    """
+    return os.path.join(
+        output_root,
+        f"date={hourly_start_time.strftime('%Y%m%d')}",
+        f"hour={hourly_start_time.strftime('%H')}",
+        f"grid={size_key}",
+        "part-0.parquet",
+    )
+
+
+def write_hourly_parquet(path, cube, value_dtype=np.float32, compression="zstd", compression_level=None,
+                         byte_stream_split=True, row_group_size=DEFAULT_ROW_GROUP_SIZE, extra_metadata=None,
+                         value_mode="float"):
+    """
+    같은 격자 크기의 채널들을 x, y 열 없이 행 우선(y, x) 순서로 저장.
+    격자 크기(rows, cols)는 파일 메타데이터에 기록하므로 x, y는 읽을 때 필요하면 다시 만듦
+
+    Parameters:
+    - path: 저장할 parquet 파일 경로
+    - cube: ChannelCube 또는 {채널명: 2D 배열} (모두 같은 크기)
+    - value_dtype: 채널 값 저장 형식 (기본 float32)
+    - compression, compression_level: parquet 압축 코덱과 수준 (zstd, snappy, gzip 등)
+    - byte_stream_split: True면 실수 열과 카운트 열에 BYTE_STREAM_SPLIT 인코딩 적용
+    - row_group_size: 행 그룹 크기 (None이면 pyarrow 기본값)
+    - extra_metadata: 파일 메타데이터에 함께 기록할 dict
+    - value_mode: "float"(실수 값) 또는 "counts"(uint32 카운트 합계 + "{채널}__frames" uint8 유효 프레임 수).
+      counts면 cube.metadata["frames"]((채널, 행, 열) 프레임 수 배열)를 함께 저장하고,
+      cube.metadata["calibration"]의 채널별 보정 계수를 메타데이터에 기록해 읽을 때 보정
+    """
+    if value_mode == "counts":
+        value_dtype = np.uint32
+    elif value_mode != "float":
+        raise ValueError(f"지원하지 않는 저장 형식입니다: {value_mode}")
+    if not isinstance(cube, ChannelCube):
+        cube = ChannelCube.from_channels(cube, dtype=value_dtype)
+    elif cube.data.dtype != np.dtype(value_dtype):
+        cube = ChannelCube(cube.data.astype(value_dtype), cube.channel_names, cube.metadata)
+
+    table = cube.to_arrow_table()
+    if value_mode == "counts":
+        frames = np.asarray(cube.metadata["frames"], dtype=np.uint8).reshape(len(cube.channel_names), -1)
+        for i, name in enumerate(cube.channel_names):
+            table = table.append_column(frames_column(name), pa.array(frames[i]))
+    grid = {"rows": cube.rows, "cols": cube.cols, "order": "row-major", "channels": cube.channel_names}
+    if "resolution" in cube.metadata:
+        grid["resolution"] = cube.metadata["resolution"]
+    if value_mode == "counts":
+        grid.update(value_mode="counts", count_encoding="sum", calibration=cube.metadata.get("calibration", {}))
+    if extra_metadata:
+        grid.update(extra_metadata)
+    table = table.replace_schema_metadata({GRID_METADATA_KEY: json.dumps(grid).encode("utf-8")})
+
+    # 프레임 수 열은 값이 거의 같아 사전 인코딩이 유리하므로 BYTE_STREAM_SPLIT은 채널 열에만 적용
+    use_split = byte_stream_split and (np.issubdtype(np.dtype(value_dtype), np.floating) or value_mode == "counts")
+    split_columns = cube.channel_names if use_split else []
+    dictionary_columns = [name for name in table.column_names if name not in split_columns]
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    pq.write_table(
+        table, tmp_path,
+        compression=compression,
+        compression_level=compression_level,
+        use_dictionary=dictionary_columns,
+        use_byte_stream_split=split_columns,
+        row_group_size=row_group_size,
+    )
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_grid_metadata(path):
+    """
+    파일 메타데이터에 기록된 격자 정보 dict (rows, cols, channels, ...)
+    """
+    metadata = pq.read_schema(path).metadata or {}
+    if GRID_METADATA_KEY not in metadata:
+        raise KeyError(f"격자 메타데이터가 없는 파일입니다: {path}")
+    return json.loads(metadata[GRID_METADATA_KEY])
+
+
+def read_daily_metadata(output_file):
+    """
+    기존 일별 파일에 기록된 {"date", "hours": [...], "sources": {시간: [수정 시각(ns), 크기]}} 정보 (파일이 없으면 None)
+    """
+    if not os.path.exists(output_file):
+        return None
+    metadata = pq.read_schema(output_file).metadata or {}
+    if DAILY_METADATA_KEY not in metadata:
+        return None
+    return json.loads(metadata[DAILY_METADATA_KEY])
+
+
+def source_signature(file_path):
+    """
+    시간별 파일의 [수정 시각(ns), 크기]. 일별 파일 메타데이터에 기록해 다시 저장된 시간을 찾는 데 사용
+    """
+    stat = os.stat(file_path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def grid_xy(rows, cols):
+    """
+    행 우선 순서의 픽셀 x, y 배열 (기존 CSV의 x, y 열과 같은 순서)
+    """
+    x, y = np.meshgrid(np.arange(cols), np.arange(rows))
+    return x.ravel(), y.ravel()
+
+
+def read_hourly_parquet(path, columns=None, with_xy=False, calibration="physical"):
+    """
+    시간별 parquet 파일을 데이터프레임으로 읽기. with_xy=True면 메타데이터의 격자 크기로 x, y 열을 복원.
+    카운트로 저장된 파일은 calibration 단계("counts", "radiance", "physical")로 보정해서 반환
+    (None이면 프레임 수 열을 포함한 저장 값 그대로)
+    """
+    grid = read_grid_metadata(path)
+    if calibration is not None and grid.get("value_mode") == "counts":
+        columns = stored_columns(grid, columns)
+    data = pd.read_parquet(path, columns=columns)
+    if calibration is not None and grid.get("value_mode") == "counts":
+        columns = {name: data[name].to_numpy() for name in data.columns}
+        data = pd.DataFrame(calibrate_columns(columns, grid, calibration), copy=False)
+    if with_xy:
+        x, y = grid_xy(grid["rows"], grid["cols"])
+        data.insert(0, "y", y)
+        data.insert(0, "x", x)
+    return data
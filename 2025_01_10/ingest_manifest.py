@@ -0,0 +1,168 @@
+import hashlib
+import json
+import sqlite3
+from datetime import datetime, timedelta
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS slot_channels (
+    slot_time TEXT NOT NULL,      -- 수집 시각 (YYYYmmddHHMM)
+    channel TEXT NOT NULL,        -- 채널 (VI004, IR105, ...)
+    status TEXT NOT NULL,         -- fetched | failed
+    content_hash TEXT,            -- 응답 본문 sha256
+    error TEXT,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (slot_time, channel)
+);
+CREATE TABLE IF NOT EXISTS hours (
+    hour TEXT PRIMARY KEY,        -- 시간 (YYYYmmddHH)
+    status TEXT NOT NULL,         -- averaged | written | empty
+    frame_count INTEGER,
+    outputs TEXT,                 -- [{"path": ..., "sha256": ...}, ...] json
+    updated_at TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 1  -- 처리 횟수 (재시도 상한 확인용)
+);
+"""
+
+# 저장되지 않았거나 실패한 수집 시각이 남은 시간을 다시 처리하는 최대 횟수 (첫 처리 포함)
+DEFAULT_MAX_ATTEMPTS = 3
+
+
+def sha256_bytes(payload):
+    return hashlib.sha256(payload).hexdigest()
+
+
+def sha256_file(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def slot_key(slot_time):
+    return slot_time.strftime("%Y%m%d%H%M")
+
+
+def hour_key(hour_time):
+    return hour_time.strftime("%Y%m%d%H")
+
+
+def hour_slot_range(hour_time):
+    # 한 시간의 수집 시각 범위 [시작, 끝) (LIKE는 대소문자 무시 비교라 기본 키 인덱스를 쓰지 못함)
+    return hour_key(hour_time) + "00", hour_key(hour_time + timedelta(hours=1)) + "00"
+
+
+class IngestManifest:
+    """
+    수집 진행 상황 기록 (SQLite).
+    시간/수집 시각/채널별로 다운로드, 평균 계산, 저장 결과와 내용 해시를 남겨 재시작 시 완료된 작업을 건너뜀
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+        # attempts 열이 없는 이전 기록 파일은 열을 추가 (기존 시간은 1회 처리한 것으로 봄)
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(hours)")]
+        if "attempts" not in columns:
+            self.connection.execute("ALTER TABLE hours ADD COLUMN attempts INTEGER NOT NULL DEFAULT 1")
+            self.connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+    def record_slot(self, slot_time, channel, payload=None, error=None):
+        """
+        한 채널, 한 수집 시각의 결과 기록 (payload가 있으면 fetched, error가 있으면 failed)
+        """
+        status = "failed" if error is not None else "fetched"
+        content_hash = sha256_bytes(payload) if payload is not None else None
+        self.connection.execute(
+            "INSERT OR REPLACE INTO slot_channels VALUES (?, ?, ?, ?, ?, ?)",
+            (slot_key(slot_time), channel, status, content_hash,
+             None if error is None else str(error), datetime.now().isoformat(timespec="seconds")),
+        )
+
+    def record_hour(self, hour_time, status, frame_count=None, output_paths=()):
+        """
+        시간 단위 처리 결과 기록 후 커밋 (출력 파일은 sha256과 함께 저장, 처리 횟수는 1 증가)
+        """
+        outputs = [{"path": path, "sha256": sha256_file(path)} for path in output_paths]
+        self.connection.execute(
+            "INSERT INTO hours (hour, status, frame_count, outputs, updated_at, attempts) VALUES (?, ?, ?, ?, ?, 1) "
+            "ON CONFLICT(hour) DO UPDATE SET status = excluded.status, frame_count = excluded.frame_count, "
+            "outputs = excluded.outputs, updated_at = excluded.updated_at, attempts = hours.attempts + 1",
+            (hour_key(hour_time), status, frame_count, json.dumps(outputs),
+             datetime.now().isoformat(timespec="seconds")),
+        )
+        self.connection.commit()
+
+    def hour_status(self, hour_time):
+        row = self.connection.execute("SELECT status FROM hours WHERE hour = ?", (hour_key(hour_time),)).fetchone()
+        return row[0] if row else None
+
+    def hour_attempts(self, hour_time):
+        row = self.connection.execute("SELECT attempts FROM hours WHERE hour = ?", (hour_key(hour_time),)).fetchone()
+        return row[0] if row else 0
+
+    def failed_slots(self, hour_time):
+        """
+        해당 시간에서 실패한 (수집 시각, 채널) 목록
+        """
+        return self.connection.execute(
+            "SELECT slot_time, channel FROM slot_channels WHERE status = 'failed' AND slot_time >= ? AND slot_time < ? "
+            "ORDER BY slot_time, channel",
+            hour_slot_range(hour_time),
+        ).fetchall()
+
+    def needs_processing(self, hour_time, retry_failed=True, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        """
+        처리한 적이 없는 시간이면 True.
+        저장이 끝나지 않았거나 (retry_failed=True일 때) 실패한 수집 시각이 남은 시간은 처리 횟수가 max_attempts 미만일 때만 True
+        (자료가 영구히 없는 시간을 매번 다시 받지 않도록, max_attempts=None이면 제한 없음)
+        """
+        row = self.connection.execute("SELECT status, attempts FROM hours WHERE hour = ?", (hour_key(hour_time),)).fetchone()
+        if row is None:
+            return True
+        status, attempts = row
+        if max_attempts is not None and attempts >= max_attempts:
+            return False
+        if status != "written":
+            return True
+        return retry_failed and bool(self.failed_slots(hour_time))
+
+    def report_gaps(self, hour_times):
+        """
+        hour_times 중 저장되지 않았거나 실패한 수집 시각이 있는 시간 목록 (재수집 대상).
+        시간마다 조회하지 않고 전체 범위를 한 번씩 조회함
+
+        Returns:
+        - [{"hour": "YYYYmmddHH", "status": ..., "attempts": 처리 횟수, "failed": [(slot_time, channel), ...]}, ...]
+        """
+        hour_times = list(hour_times)
+        if not hour_times:
+            return []
+        start, end = hour_slot_range(min(hour_times))[0], hour_slot_range(max(hour_times))[1]
+
+        hours = {hour: (status, attempts) for hour, status, attempts in self.connection.execute(
+            "SELECT hour, status, attempts FROM hours WHERE hour >= ? AND hour < ?", (start[:10], end[:10]))}
+        failed = {}
+        for slot_time, channel in self.connection.execute(
+                "SELECT slot_time, channel FROM slot_channels WHERE status = 'failed' AND slot_time >= ? AND slot_time < ? "
+                "ORDER BY slot_time, channel", (start, end)):
+            failed.setdefault(slot_time[:10], []).append((slot_time, channel))
+
+        gaps = []
+        for hour_time in hour_times:
+            key = hour_key(hour_time)
+            status, attempts = hours.get(key, (None, 0))
+            if status != "written" or key in failed:
+                gaps.append({"hour": key, "status": status, "attempts": attempts, "failed": failed.get(key, [])})
+        return gaps
@@ -0,0 +1,167 @@
+import hashlib
+import json
+import os
+import numpy as np
+from scipy import sparse
+from scipy.spatial import cKDTree
+
+from coord_calc import latlon_to_pixels
+from grid_spec import get_grid_spec
+
+
+def regional_latlon(resolution, rows, cols):
+    """
+    지역 배열 (rows, cols) 각 픽셀 중심의 위도, 경도 (행 우선 1D 배열)
+    """
+    lat, lon = get_grid_spec(resolution).regional_latlon(rows, cols)
+    return lat.ravel(), lon.ravel()
+
+
+def _unit_xyz(lat, lon):
+    # 구면 위 단위 벡터 (KD-tree 거리 계산용)
+    lat = np.radians(lat)
+    lon = np.radians(lon)
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+def nearest_weights(resolution, rows, cols, target_lat, target_lon, max_distance_km=None):
+    """
+    지역 배열 픽셀 위경도로 만든 KD-tree에서 목표 격자점마다 가장 가까운 픽셀 하나를 선택.
+    max_distance_km보다 먼 목표점(영역 밖)은 가중치 없음 (기본값: 해상도의 1배)
+    """
+    lat, lon = regional_latlon(resolution, rows, cols)
+    tree = cKDTree(_unit_xyz(lat, lon))
+    distance, index = tree.query(_unit_xyz(target_lat, target_lon))
+
+    max_distance_km = resolution if max_distance_km is None else max_distance_km
+    valid = distance * 6371.0 <= max_distance_km
+    target_index = np.flatnonzero(valid)
+    return sparse.csr_matrix(
+        (np.ones(len(target_index)), (target_index, index[valid])),
+        shape=(len(target_lat), rows * cols),
+    )
+
+
+def bilinear_weights(resolution, rows, cols, target_lat, target_lon):
+    """
+    목표 격자점을 역투영한 소수 픽셀 좌표로 주변 4픽셀의 이중선형 가중치 계산
+    """
+    spec = get_grid_spec(resolution)
+    x, y, _ = latlon_to_pixels(target_lat, target_lon, (resolution,), mode="fractional")[resolution]
+    x = x - spec.x_offset
+    y = y - spec.y_offset
+
+    x0 = np.floor(x)
+    y0 = np.floor(y)
+    wx = x - x0
+    wy = y - y0
+    target_rows, source_cols, weights = [], [], []
+    for dy, w_y in ((0, 1 - wy), (1, wy)):
+        for dx, w_x in ((0, 1 - wx), (1, wx)):
+            px = x0 + dx
+            py = y0 + dy
+            valid = np.isfinite(px) & np.isfinite(py) & (px >= 0) & (px < cols) & (py >= 0) & (py < rows)
+            valid &= (w_x * w_y) > 0
+            target_rows.append(np.flatnonzero(valid))
+            source_cols.append((py[valid] * cols + px[valid]).astype(np.int64))
+            weights.append((w_x * w_y)[valid])
+    return sparse.csr_matrix(
+        (np.concatenate(weights), (np.concatenate(target_rows), np.concatenate(source_cols))),
+        shape=(len(target_lat), rows * cols),
+    )
+
+
+class LatLonRegridder:
+    """
+    LCC 지역 배열 -> 정규 위경도 격자 변환기.
+    가중치를 희소 행렬 (목표 격자점 수 x 지역 픽셀 수)로 한 번만 계산하고, 이후 프레임은 희소 행렬 곱 한 번으로 변환
+
+    Parameters:
+    - weights: scipy.sparse 행렬
+    - target_lats, target_lons: 목표 격자의 위도, 경도 1D 배열
+    - source_shape: 지역 배열 크기 (rows, cols)
+    """
+
+    def __init__(self, weights, target_lats, target_lons, source_shape, metadata=None):
+        self.weights = sparse.csr_matrix(weights)
+        self.target_lats = np.asarray(target_lats)
+        self.target_lons = np.asarray(target_lons)
+        self.source_shape = tuple(source_shape)
+        self.metadata = dict(metadata or {})
+
+    @property
+    def target_shape(self):
+        return len(self.target_lats), len(self.target_lons)
+
+    @classmethod
+    def build(cls, resolution, source_shape, target_lats, target_lons, method="bilinear"):
+        """
+        target_lats x target_lons 정규 격자에 대한 가중치 계산 (method: "nearest" 또는 "bilinear")
+        """
+        lon_grid, lat_grid = np.meshgrid(target_lons, target_lats)
+        rows, cols = source_shape
+        if method == "nearest":
+            weights = nearest_weights(resolution, rows, cols, lat_grid.ravel(), lon_grid.ravel())
+        elif method == "bilinear":
+            weights = bilinear_weights(resolution, rows, cols, lat_grid.ravel(), lon_grid.ravel())
+        else:
+            raise ValueError(f"지원하지 않는 보간 방법입니다: {method}")
+        metadata = {"resolution": resolution, "method": method}
+        return cls(weights, target_lats, target_lons, source_shape, metadata)
+
+    def save(self, path):
+        """
+        가중치는 .npz, 격자 정보는 같은 이름의 .json으로 저장.
+        둘 다 임시 파일에 쓴 뒤 교체하고 .json을 마지막에 기록하므로, .json이 있으면 두 파일 모두 완전함
+        """
+        with open(f"{path}.tmp", "wb") as f:
+            sparse.save_npz(f, self.weights)
+        os.replace(f"{path}.tmp", path)
+        header = dict(self.metadata, source_shape=list(self.source_shape),
+                      target_lats=self.target_lats.tolist(), target_lons=self.target_lons.tolist())
+        header_path = os.path.splitext(path)[0] + ".json"
+        with open(f"{header_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(header, f)
+        os.replace(f"{header_path}.tmp", header_path)
+
+    @classmethod
+    def load(cls, path):
+        with open(os.path.splitext(path)[0] + ".json", encoding="utf-8") as f:
+            header = json.load(f)
+        weights = sparse.load_npz(path)
+        return cls(weights, header.pop("target_lats"), header.pop("target_lons"), header.pop("source_shape"), header)
+
+    def regrid(self, values):
+        """
+        지역 배열 하나 (rows, cols) 또는 여러 채널 (channels, rows, cols)을 목표 격자로 변환.
+        NaN 픽셀은 가중치에서 제외하고 남은 가중치로 다시 정규화
+        """
+        values = np.asarray(values, dtype=np.float64)
+        single = values.ndim == 2
+        flat = values.reshape(1 if single else values.shape[0], -1).T  # (픽셀 수, 채널 수)
+
+        valid = ~np.isnan(flat)
+        total = self.weights @ np.where(valid, flat, 0.0)
+        weight_sum = self.weights @ valid.astype(np.float64)
+        result = np.full(total.shape, np.nan)
+        np.divide(total, weight_sum, out=result, where=weight_sum > 0)
+
+        result = result.T.reshape(-1, *self.target_shape)
+        return result[0] if single else result
+
+
+def get_regridder(cache_dir, resolution, source_shape, target_lats, target_lons, method="bilinear"):
+    """
+    같은 설정의 가중치가 cache_dir에 있으면 불러오고, 없으면 계산 후 저장
+    """
+    key = json.dumps([resolution, list(source_shape), np.round(target_lats, 6).tolist(),
+                      np.round(target_lons, 6).tolist(), method])
+    path = os.path.join(cache_dir, f"regrid_{resolution}_{method}_{hashlib.sha1(key.encode()).hexdigest()[:12]}.npz")
+    # .json은 save에서 마지막에 기록하므로 .json이 있어야 완전히 저장된 가중치
+    if os.path.exists(os.path.splitext(path)[0] + ".json") and os.path.exists(path):
+        return LatLonRegridder.load(path)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    regridder = LatLonRegridder.build(resolution, source_shape, target_lats, target_lons, method)
+    regridder.save(path)
+    return regridder
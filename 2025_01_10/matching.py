@@ -1,53 +1,51 @@
-import pandas as pd
-from tqdm import tqdm
+import pyarrow.parquet as pq
 
-# 파일 경로 매핑 (입력 파일과 해상도별 계산된 파일 연결)
+from coord_store import attach_latlon_parquet
+from spatial_layout import write_spatial_layout
+import stage_metrics
+
+# 해상도별 좌표 저장소 디렉토리 (coord_store.py로 생성)
+store_dir = "F:\\INKLE\\2024_01_10\\coordinate_store"
+
+# 파일 경로 매핑 (입력 파일과 해상도 연결)
 input_files = {
-    "F:\\INKLE\\2024_01_10\\daily_parquets\\daily_parquets\\merged_20250108_277x306.parquet": "F:\\INKLE\\2024_01_10\\precomputed_coordinates_res_2.0.parquet",
-    "F:\\INKLE\\2024_01_10\\daily_parquets\\daily_parquets\\merged_20250108_555x612.parquet": "F:\\INKLE\\2024_01_10\\precomputed_coordinates_res_1.0.parquet",
-    "F:\\INKLE\\2024_01_10\\daily_parquets\\daily_parquets\\merged_20250108_1110x1225.parquet": "F:\\INKLE\\2024_01_10\\precomputed_coordinates_res_0.5.parquet",
+    "F:\\INKLE\\2024_01_10\\daily_parquets\\daily_parquets\\merged_20250108_277x306.parquet": 2.0,
+    "F:\\INKLE\\2024_01_10\\daily_parquets\\daily_parquets\\merged_20250108_555x612.parquet": 1.0,
+    "F:\\INKLE\\2024_01_10\\daily_parquets\\daily_parquets\\merged_20250108_1110x1225.parquet": 0.5,
 }
 
 # 좌표 변환 함수
-def replace_coordinates(input_parquet_path, precomputed_parquet_path, output_parquet_path):
+def replace_coordinates(input_parquet_path, store_dir, resolution, output_parquet_path, batch_size=1 << 20, layout=None):
     """
     기존 parquet 파일에서 x, y 좌표를 미리 계산된 Latitude, Longitude로 대체하는 함수.
+    배치 단위로 읽고 쓰므로 0.5km 일자료도 파일 전체를 메모리에 올리지 않음.
+    layout을 주면 시간마다 픽셀을 공간 곡선 순서로 정렬해 저장 (x, y 유지, spatial_layout.read_bbox로 영역만 읽기)
 
     Parameters:
     - input_parquet_path: 기존 데이터 parquet 파일 경로
-    - precomputed_parquet_path: 미리 계산된 좌표 데이터 parquet 파일 경로
+    - store_dir: 좌표 저장소 디렉토리 (coord_store.py)
+    - resolution: 해상도 (0.5, 1.0, 2.0 중 하나)
     - output_parquet_path: 변환된 데이터를 저장할 parquet 파일 경로
+    - batch_size: 한 번에 읽고 쓰는 행 수 (최대 메모리를 정함)
+    - layout: None(원래 행 순서), "hilbert" 또는 "zorder"
     """
-    # 기존 데이터 읽기
-    data = pd.read_parquet(input_parquet_path)
-
-    # 미리 계산된 좌표 데이터 읽기
-    precomputed_data = pd.read_parquet(precomputed_parquet_path)
-    precomputed_data.set_index(['x', 'y'], inplace=True)  # x, y를 인덱스로 설정
-
-    # tqdm을 사용하여 좌표 변환
-    tqdm.pandas(desc=f"Processing {input_parquet_path}")
-    def map_coordinates(row):
-        key = (row['x'], row['y'])
-        if key in precomputed_data.index:
-            lat, lon = precomputed_data.loc[key, ['Latitude', 'Longitude']]
-            return pd.Series([lat, lon])
+    with stage_metrics.stage("attach_latlon", resolution=resolution, layout=layout) as stage:
+        if layout is None:
+            # 지역 배열 x, y에 오프셋을 더해 좌표 저장소에서 조회하고 x, y 컬럼 삭제 (창 밖의 좌표는 NaN)
+            num_rows = attach_latlon_parquet(input_parquet_path, output_parquet_path, resolution,
+                                             store=store_dir, batch_size=batch_size)
         else:
-            return pd.Series([None, None])  # 변환되지 않은 좌표는 NaN으로 처리
-
-    data[['Latitude', 'Longitude']] = data.progress_apply(map_coordinates, axis=1)
-
-    # 기존 x, y 컬럼 삭제
-    data.drop(columns=['x', 'y'], inplace=True)
-
-    # 변환된 데이터 저장
-    data.to_parquet(output_parquet_path, index=False)
+            write_spatial_layout(input_parquet_path, output_parquet_path, resolution=resolution, store=store_dir,
+                                 curve=layout, batch_size=batch_size)
+            num_rows = pq.read_metadata(output_parquet_path).num_rows
+        stage.add(rows=num_rows, bytes_in=stage_metrics.file_bytes(input_parquet_path),
+                  bytes_out=stage_metrics.file_bytes(output_parquet_path))
     print(f"변환된 데이터가 저장되었습니다: {output_parquet_path}")
 
 if __name__ == "__main__":
-    for input_path, precomputed_path in input_files.items():
+    for input_path, resolution in input_files.items():
         # 출력 파일 경로 설정
         output_path = input_path.replace(".parquet", "_converted.parquet")
 
         # 변환 실행
-        replace_coordinates(input_path, precomputed_path, output_path)
+        replace_coordinates(input_path, store_dir, resolution, output_path)
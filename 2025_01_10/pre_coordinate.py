@@ -1,94 +1,81 @@
+import numpy as np
 import pandas as pd
-from pyproj import Proj, Transformer
 from multiprocessing import Pool, cpu_count
 from tqdm import tqdm
 
-# Lambert Conformal Conic (LCC) 투영 설정
-lcc_params = {
-    "lat_1": 30.0,   # 표준 평행선 1
-    "lat_2": 60.0,   # 표준 평행선 2
-    "lat_0": 38.0,   # 원점 위도
-    "lon_0": 126.0   # 중심 자오선
-}
+from grid_spec import LCC_PARAMS, get_grid_spec, get_transformer
+
+# Lambert Conformal Conic (LCC) 투영 설정 (grid_spec.LCC_PARAMS)
+lcc_params = LCC_PARAMS
+
+# 이 픽셀 수를 넘는 창만 프로세스로 나눔 (그보다 작으면 Pool 생성 비용이 더 큼)
+PARALLEL_MIN_PIXELS = 4_000_000
 
 def get_lcc_params_by_resolution(resolution):
-    if resolution == 0.5:
-        return {
-            "x_start": 1430, "x_end": 2665,
-            "y_start": 1545, "y_end": 2883,
-            "image_width": 3600,
-            "image_height": 3600,
-            "x_min": -899750,
-            "x_max": 899750,
-            "y_min": -899750,
-            "y_max": 899750,
-        }
-    elif resolution == 1.0:
-        return {
-            "x_start": 715, "x_end": 1327,
-            "y_start": 772, "y_end": 1441,
-            "image_width": 1800,
-            "image_height": 1800,
-            "x_min": -899500,
-            "x_max": 899500,
-            "y_min": -899500,
-            "y_max": 899500,
-        }
-    elif resolution == 2.0:
-        return {
-            "x_start": 357, "x_end": 663,
-            "y_start": 386, "y_end": 720,
-            "image_width": 900,
-            "image_height": 900,
-            "x_min": -899000,
-            "x_max": 899000,
-            "y_min": -899000,
-            "y_max": 899000,
-        }
+    """
+    해상도별 격자 창/오프셋 dict (grid_spec.GRID_SPECS에서 가져옴)
+    """
+    return get_grid_spec(resolution).params
 
 def pixel_to_latlon(args):
+    """
+    픽셀 좌표 -> 위경도 변환. pixel_x, pixel_y는 스칼라 또는 NumPy 배열 모두 가능
+    """
     pixel_x, pixel_y, params, lcc_params = args
-    lcc_proj = Proj(
-        proj="lcc",
-        lat_1=lcc_params["lat_1"],  # 표준 평행선 1
-        lat_2=lcc_params["lat_2"],  # 표준 평행선 2
-        lat_0=lcc_params["lat_0"],  # 원점 위도
-        lon_0=lcc_params["lon_0"],  # 중심 자오선
-        x_0=0,
-        y_0=0,
-        ellps="WGS84"  # 타원체
-    )
-    wgs_proj = Proj(proj="latlong", datum="WGS84")
-    transformer = Transformer.from_proj(lcc_proj, wgs_proj)
-    x = params["x_min"] + (pixel_x / (params["image_width"] - 1)) * (params["x_max"] - params["x_min"])
-    y = params["y_max"] - (pixel_y / (params["image_height"] - 1)) * (params["y_max"] - params["y_min"])
-    lon, lat = transformer.transform(x, y)
+    x, y = get_grid_spec(params["resolution"]).pixel_to_lcc(pixel_x, pixel_y)
+    lon, lat = get_transformer(**lcc_params).transform(x, y)
     return pixel_x, pixel_y, lat, lon
 
-def generate_precomputed_coordinates_parallel(resolution, output_file):
+def convert_grid_chunk(args):
+    """
+    x_first..x_last 열 구간 전체를 meshgrid로 만들어 한 번의 transform 호출로 변환
     """
-    병렬 처리를 이용해 미리 계산된 좌표 데이터를 생성
+    x_first, x_last, params, lcc_params = args
+    xs = np.arange(x_first, x_last + 1, dtype=np.int64)
+    ys = np.arange(params["y_start"], params["y_end"] + 1, dtype=np.int64)
+    pixel_x, pixel_y = np.meshgrid(xs, ys, indexing="ij")  # 기존 출력과 같은 x 우선 순서
+    return pixel_to_latlon((pixel_x.ravel(), pixel_y.ravel(), params, lcc_params))
+
+def generate_precomputed_coordinates_parallel(resolution, output_file, processes=None):
+    """
+    해상도별 격자 창 전체를 벡터화해 미리 계산된 좌표 데이터를 생성.
+    창이 PARALLEL_MIN_PIXELS보다 크고 코어가 여러 개일 때만 x 열 구간으로 나눠 병렬 처리
     """
     params = get_lcc_params_by_resolution(resolution)
+    processes = processes or cpu_count()
+
+    width = params["x_end"] - params["x_start"] + 1
+    height = params["y_end"] - params["y_start"] + 1
+    num_chunks = 1
+    if processes > 1 and width * height > PARALLEL_MIN_PIXELS:
+        num_chunks = min(processes, width)
 
-    # 좌표 목록 생성
+    # x 열 구간 나누기
+    bounds = np.linspace(params["x_start"], params["x_end"] + 1, num_chunks + 1).astype(int)
     tasks = [
-        (x, y, params, lcc_params)
-        for x in range(params["x_start"], params["x_end"] + 1)
-        for y in range(params["y_start"], params["y_end"] + 1)
+        (int(bounds[i]), int(bounds[i + 1]) - 1, params, lcc_params)
+        for i in range(num_chunks)
     ]
 
-    # 병렬 처리
-    print(f"병렬 처리 시작 (해상도: {resolution})...")
-    with Pool(cpu_count()) as pool:
-        results = list(tqdm(pool.imap(pixel_to_latlon, tasks), total=len(tasks), desc="좌표 생성 진행"))
+    print(f"좌표 계산 시작 (해상도: {resolution}, {width}x{height}, 구간 {num_chunks}개)...")
+    if num_chunks == 1:
+        results = [convert_grid_chunk(tasks[0])]
+    else:
+        with Pool(num_chunks) as pool:
+            results = list(tqdm(pool.imap(convert_grid_chunk, tasks), total=len(tasks), desc="좌표 생성 진행"))
 
-    # 데이터프레임 생성
-    df = pd.DataFrame(results, columns=["x", "y", "Latitude", "Longitude"])
+    # 데이터프레임 생성 (x, y, Latitude, Longitude 스키마 유지)
+    df = pd.DataFrame({
+        "x": np.concatenate([r[0] for r in results]),
+        "y": np.concatenate([r[1] for r in results]),
+        "Latitude": np.concatenate([r[2] for r in results]),
+        "Longitude": np.concatenate([r[3] for r in results]),
+    })
 
     # Parquet 파일로 저장
     df.to_parquet(output_file, index=False)
     print(f"미리 계산된 좌표 데이터가 저장되었습니다: {output_file}")
+    return df
 
 
 if __name__ == '__main__':
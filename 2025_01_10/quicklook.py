@@ -0,0 +1,307 @@
+import json
+import os
+import struct
+import zlib
+from glob import glob
+import numpy as np
+import pyarrow.parquet as pq
+
+from calibration import calibrate_columns, stored_columns
+from hourly_parquet import read_daily_metadata, read_grid_metadata, source_signature
+from regrid import block_mean
+import stage_metrics
+
+# 색상표 기준점 (0~1 위치, R, G, B). 256단계 LUT로 보간해 한 번의 인덱싱으로 색을 입힘
+COLORMAP_POINTS = {
+    "gray": [(0.0, 0, 0, 0), (1.0, 255, 255, 255)],
+    "gray_r": [(0.0, 255, 255, 255), (1.0, 0, 0, 0)],
+    "viridis": [(0.0, 68, 1, 84), (0.25, 59, 82, 139), (0.5, 33, 145, 140), (0.75, 94, 201, 98), (1.0, 253, 231, 37)],
+    "turbo": [(0.0, 48, 18, 59), (0.2, 65, 142, 250), (0.4, 40, 235, 175), (0.6, 190, 245, 52),
+              (0.8, 251, 138, 36), (1.0, 122, 4, 3)],
+}
+
+# 적외/수증기 채널은 차가운(높은) 구름이 밝게 보이도록 반전 회색 (기상 영상 관례)
+CHANNEL_COLORMAPS = {"SW": "gray_r", "WV": "gray_r", "IR": "gray_r"}
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def colormap_lut(name):
+    """
+    이름의 색상표를 (256, 3) uint8 LUT로 반환
+    """
+    if name not in COLORMAP_POINTS:
+        raise ValueError(f"지원하지 않는 색상표입니다: {name}")
+    points = np.array(COLORMAP_POINTS[name], dtype=np.float64)
+    position = np.linspace(0.0, 1.0, 256)
+    return np.stack([np.interp(position, points[:, 0], points[:, i]) for i in (1, 2, 3)], axis=1).round().astype(np.uint8)
+
+
+def channel_colormap(channel):
+    """
+    채널 이름(예: IR105)에 맞는 기본 색상표
+    """
+    return CHANNEL_COLORMAPS.get(str(channel)[:2], "gray")
+
+
+def stretch_range(values, percentiles=(2, 98)):
+    """
+    NaN을 제외한 백분위 범위 (vmin, vmax). 유효 값이 없으면 (0, 1)
+    """
+    values = np.asarray(values)
+    valid = values[np.isfinite(values)]
+    if valid.size == 0:
+        return 0.0, 1.0
+    # 큰 격자는 표본으로 계산 (결과는 거의 같고 정렬 비용이 작음)
+    if valid.size > 1_000_000:
+        valid = valid[::valid.size // 1_000_000]
+    vmin, vmax = (float(value) for value in np.percentile(valid, percentiles))
+    return vmin, vmax if vmax > vmin else vmin + 1.0
+
+
+def to_rgba(values, vmin=None, vmax=None, cmap="gray"):
+    """
+    2D 값 배열을 색상표로 (rows, cols, 4) uint8 RGBA 배열로 변환 (NaN은 투명)
+
+    Parameters:
+    - values: 2D 배열
+    - vmin, vmax: 색상표 양 끝 값 (None이면 stretch_range)
+    - cmap: 색상표 이름 또는 (256, 3) LUT
+    """
+    values = np.asarray(values, dtype=np.float32)
+    if vmin is None or vmax is None:
+        auto_min, auto_max = stretch_range(values)
+        vmin = auto_min if vmin is None else vmin
+        vmax = auto_max if vmax is None else vmax
+    lut = colormap_lut(cmap) if isinstance(cmap, str) else np.asarray(cmap, dtype=np.uint8)
+
+    valid = np.isfinite(values)
+    scaled = (values - vmin) * (255.0 / max(vmax - vmin, 1e-12))
+    index = np.clip(np.where(valid, scaled, 0), 0, 255).astype(np.uint8)
+    rgba = np.empty(values.shape + (4,), dtype=np.uint8)
+    rgba[..., :3] = lut[index]
+    rgba[..., 3] = np.where(valid, 255, 0)
+    return rgba
+
+
+def _png_chunk(chunk_type, data):
+    return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", zlib.crc32(chunk_type + data) & 0xFFFFFFFF)
+
+
+def encode_png(image, compress_level=6):
+    """
+    uint8 배열을 PNG 바이트로 부호화 (zlib/struct만 사용).
+    (rows, cols)는 회색조, (rows, cols, 3)은 RGB, (rows, cols, 4)는 RGBA
+    """
+    image = np.ascontiguousarray(image, dtype=np.uint8)
+    if image.ndim == 2:
+        image = image[..., np.newaxis]
+    height, width, channels = image.shape
+    color_type = {1: 0, 3: 2, 4: 6}.get(channels)
+    if color_type is None:
+        raise ValueError(f"지원하지 않는 채널 수입니다: {channels}")
+
+    # 각 행 앞에 필터 종류 0(None) 바이트를 붙임
+    raw = np.zeros((height, width * channels + 1), dtype=np.uint8)
+    raw[:, 1:] = image.reshape(height, width * channels)
+    header = struct.pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0)
+    return (PNG_SIGNATURE + _png_chunk(b"IHDR", header)
+            + _png_chunk(b"IDAT", zlib.compress(raw.tobytes(), compress_level)) + _png_chunk(b"IEND", b""))
+
+
+def write_png(path, image, compress_level=6):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(encode_png(image, compress_level))
+    return path
+
+
+def render_quicklook(values, path, vmin=None, vmax=None, cmap=None, channel=None, compress_level=6):
+    """
+    채널 격자 한 장을 PNG로 저장 (matplotlib 없이 LUT 색상표로 바로 변환)
+
+    Parameters:
+    - values: 2D 배열 (행=y, 열=x)
+    - path: 저장할 PNG 경로
+    - vmin, vmax: 색상표 범위 (None이면 2~98 백분위)
+    - cmap: 색상표 이름 (None이면 channel에 맞는 기본값)
+    - channel: 채널 이름 (기본 색상표 선택용)
+    """
+    return write_png(path, to_rgba(values, vmin, vmax, cmap or channel_colormap(channel)), compress_level)
+
+
+def read_channel_grid(path, channel, row_group=None):
+    """
+    parquet 파일의 채널 열을 격자 메타데이터 크기의 2D 배열로 읽기 (카운트 파일은 물리량으로 보정).
+    row_group을 주면 그 행 그룹(일별 파일의 한 시간)만 읽음
+    """
+    grid = read_grid_metadata(path)
+    parquet_file = pq.ParquetFile(path)
+    columns = stored_columns(grid, [channel])
+    if row_group is None:
+        table = parquet_file.read(columns=columns)
+    else:
+        table = parquet_file.read_row_group(row_group, columns=columns)
+    values = calibrate_columns({name: table.column(name).to_numpy() for name in columns}, grid)[channel]
+    return np.asarray(values, dtype=np.float32).reshape(grid["rows"], grid["cols"])
+
+
+def iter_frame_sources(source, channel):
+    """
+    입력의 프레임을 읽지 않고 (프레임 이름, 파일 경로, 행 그룹, 원본 정보)로 시간 순서대로 반환.
+    원본 정보는 그 프레임의 원본이 바뀌었는지 판단하는 값 ([수정 시각(ns), 크기])
+    - 디렉토리: 시간별 파티션 (date=*/hour=*/grid=*/part-0.parquet 또는 Datetime=*/part-0.parquet), 파일별 원본 정보
+    - 일별 병합 파일: 시간당 행 그룹 1개 (메타데이터의 시간 목록과 시간별 원본 정보 사용)
+    - 시간별 파일: 프레임 1개
+    """
+    if os.path.isdir(source):
+        paths = sorted(glob(os.path.join(source, "Datetime=*", "part-0.parquet")))
+        if paths:
+            for path in paths:
+                yield os.path.basename(os.path.dirname(path)).split("=", 1)[1], path, None, source_signature(path)
+            return
+        for path in sorted(glob(os.path.join(source, "date=*", "hour=*", "grid=*", "part-0.parquet"))):
+            if channel not in read_grid_metadata(path).get("channels", []):
+                continue
+            hour_dir = os.path.dirname(os.path.dirname(path))
+            date = os.path.basename(os.path.dirname(hour_dir)).split("=", 1)[1]
+            hour = os.path.basename(hour_dir).split("=", 1)[1]
+            yield f"{date}{hour}", path, None, source_signature(path)
+        return
+
+    # 일별 병합 파일 (ver1_sat_24h_to_1day). 시간이 추가되어도 기존 시간의 원본 정보는 그대로이므로 다시 렌더링하지 않음
+    daily = read_daily_metadata(source)
+    if daily is not None:
+        sources = daily.get("sources", {})
+        for i, hour in enumerate(daily["hours"]):
+            # 시간별 원본 정보가 없는 이전 형식은 일별 파일 자체의 정보 사용
+            yield f"{daily['date']}{hour}", source, i, sources.get(hour) or source_signature(source)
+        return
+    yield os.path.splitext(os.path.basename(source))[0], source, None, source_signature(source)
+
+
+def iter_frames(source, channel):
+    """
+    입력의 (프레임 이름, 2D 배열)을 시간 순서대로 반환 (입력 형식은 iter_frame_sources 참고)
+    """
+    for frame, path, row_group, _ in iter_frame_sources(source, channel):
+        yield frame, read_channel_grid(path, channel, row_group)
+
+
+def pyramid_levels(values, tile_size=256):
+    """
+    원본 격자부터 한 변이 tile_size 이하가 될 때까지 2x2 블록 평균(regrid.block_mean)으로 줄인 배열 목록.
+    각 단계는 바로 앞 단계에서 계산하므로 전체 비용은 원본 한 번 읽는 것의 약 4/3배
+
+    Returns:
+    - [가장 작은 단계, ..., 원본] (인덱스가 줌 단계 z)
+    """
+    levels = [np.asarray(values, dtype=np.float32)]
+    while max(levels[-1].shape) > tile_size:
+        rows, cols = levels[-1].shape
+        levels.append(block_mean(levels[-1], 2, (-(-rows // 2), -(-cols // 2))).astype(np.float32))
+    return levels[::-1]
+
+
+def write_tiles(values, output_dir, tile_size=256, vmin=None, vmax=None, cmap="gray", compress_level=6):
+    """
+    격자 한 장의 타일 피라미드를 output_dir/{z}/{y}_{x}.png로 저장 (가장자리 타일은 투명하게 채움).
+    모든 줌 단계에 같은 vmin, vmax를 사용하므로 확대/축소해도 색이 같음
+
+    Returns:
+    - 단계별 타일 수 목록
+    """
+    if vmin is None or vmax is None:
+        vmin, vmax = stretch_range(values)
+    lut = colormap_lut(cmap) if isinstance(cmap, str) else cmap
+    tile_counts = []
+    for z, level in enumerate(pyramid_levels(values, tile_size)):
+        rows, cols = level.shape
+        tiles_y, tiles_x = -(-rows // tile_size), -(-cols // tile_size)
+        padded = np.full((tiles_y * tile_size, tiles_x * tile_size), np.nan, dtype=np.float32)
+        padded[:rows, :cols] = level
+        rgba = to_rgba(padded, vmin, vmax, lut)
+        for ty in range(tiles_y):
+            for tx in range(tiles_x):
+                tile = rgba[ty * tile_size:(ty + 1) * tile_size, tx * tile_size:(tx + 1) * tile_size]
+                write_png(os.path.join(output_dir, str(z), f"{ty}_{tx}.png"), tile, compress_level)
+        tile_counts.append(tiles_y * tiles_x)
+    return tile_counts
+
+
+def build_tile_pyramids(source, output_dir, channel, tile_size=256, vmin=None, vmax=None, cmap=None,
+                        compress_level=6, force=False):
+    """
+    하루치(또는 입력의 모든) 프레임을 프레임별 타일 피라미드로 저장 (output_dir/{채널}/{프레임}/{z}/{y}_{x}.png).
+    프레임마다 manifest.json에 그 프레임 원본의 수정 시각/크기와 렌더링 설정을 기록하고, 같으면 격자를 읽지 않고 건너뜀
+    (시간이 추가되어도 기존 프레임은 다시 렌더링하지 않음).
+    vmin, vmax를 주지 않으면 처음 렌더링한 프레임의 2~98 백분위를 {채널}/stretch.json에 저장해
+    이후 모든 프레임에 사용 (프레임 간, 실행 간 색 비교 가능)
+
+    Parameters:
+    - source: iter_frame_sources 입력 (시간별 파티션 디렉토리, 일별 병합 파일, 시간별 파일)
+    - output_dir: 타일 최상위 디렉토리
+    - channel: 채널 이름
+    - tile_size: 타일 한 변 픽셀 수
+    - cmap: 색상표 이름 (None이면 채널 기본값)
+    - force: True면 캐시와 저장된 stretch.json을 무시하고 다시 렌더링
+
+    Returns:
+    - {프레임 이름: "rendered" 또는 "cached"}
+    """
+    cmap = cmap or channel_colormap(channel)
+    channel_dir = os.path.join(output_dir, channel)
+    stretch_path = os.path.join(channel_dir, "stretch.json")
+    if vmin is not None and vmax is not None:
+        stretch = [vmin, vmax]
+    else:
+        stretch = None if force else _read_json(stretch_path)
+
+    results = {}
+    for frame, path, row_group, signature in iter_frame_sources(source, channel):
+        frame_dir = os.path.join(channel_dir, frame)
+        manifest_path = os.path.join(frame_dir, "manifest.json")
+        settings = {"source": os.path.abspath(path), "row_group": row_group, "source_signature": signature,
+                    "channel": channel, "tile_size": tile_size, "stretch": stretch, "cmap": cmap}
+        manifest = None if force or stretch is None else _read_json(manifest_path)
+        if manifest is not None and manifest.get("settings") == settings:
+            results[frame] = "cached"
+            continue
+
+        values = read_channel_grid(path, channel, row_group)
+        if stretch is None:
+            stretch = list(stretch_range(values))
+            _write_json(stretch_path, stretch)
+            settings["stretch"] = stretch
+        with stage_metrics.stage("quicklook_tiles", channel=channel, frame=frame) as stage:
+            tile_counts = write_tiles(values, frame_dir, tile_size, stretch[0], stretch[1], cmap, compress_level)
+            stage.add(pixels=values.size, rows=sum(tile_counts))
+        # manifest는 타일을 모두 쓴 뒤 기록 (중간에 중단되면 다음 실행에서 다시 렌더링)
+        _write_json(manifest_path, {"settings": settings, "levels": tile_counts})
+        results[frame] = "rendered"
+    return results
+
+
+def _read_json(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _write_json(path, value):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(value, f, ensure_ascii=False)
+    os.replace(f"{path}.tmp", path)
+
+
+if __name__ == '__main__':
+    # 시간별 파일의 모든 채널 미리보기 PNG 저장
+    parquet_file = r"D:\sat_file\hourly\date=20250108\hour=00\grid=277x306\part-0.parquet"
+    output_dir = r"D:\sat_file\quicklook"
+
+    for channel in read_grid_metadata(parquet_file)["channels"]:
+        path = render_quicklook(read_channel_grid(parquet_file, channel), os.path.join(output_dir, f"{channel}.png"), channel=channel)
+        print(f"미리보기 이미지가 {path}에 저장되었습니다.")
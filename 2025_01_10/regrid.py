@@ -0,0 +1,162 @@
+import numpy as np
+
+from channel_cube import ChannelCube
+from grid_spec import get_grid_spec
+
+# 채널별 공간 해상도 (km)
+CHANNEL_RESOLUTIONS = {
+    "VI006": 0.5,
+    "VI004": 1.0, "VI005": 1.0, "VI008": 1.0,
+    "NR013": 2.0, "NR016": 2.0, "SW038": 2.0, "WV063": 2.0, "WV069": 2.0, "WV073": 2.0,
+    "IR087": 2.0, "IR096": 2.0, "IR105": 2.0, "IR112": 2.0, "IR123": 2.0, "IR133": 2.0,
+}
+
+
+def grid_offset(resolution):
+    """
+    해상도별 지역 배열 (0, 0) 픽셀의 전체 영상 내 위치 (행, 열)
+    """
+    spec = get_grid_spec(resolution)
+    return spec.y_offset, spec.x_offset
+
+
+def block_mean(array, factor, out_shape, origin=(0, 0)):
+    """
+    factor x factor 블록 평균으로 축소 (NaN 제외, 유효 값이 없는 블록은 NaN).
+
+    Parameters:
+    - array: 2D 배열
+    - factor: 축소 배율 (정수)
+    - out_shape: 결과 배열 크기 (행, 열)
+    - origin: 결과 (0, 0) 블록이 시작하는 입력 배열 위치 (음수면 앞쪽을 NaN으로 채움)
+    """
+    out_rows, out_cols = out_shape
+    r0, c0 = origin
+    padded = np.full((out_rows * factor, out_cols * factor), np.nan, dtype=np.float64)
+
+    # 입력 배열과 겹치는 구간만 복사
+    src_r = slice(max(r0, 0), min(r0 + padded.shape[0], array.shape[0]))
+    src_c = slice(max(c0, 0), min(c0 + padded.shape[1], array.shape[1]))
+    if src_r.start < src_r.stop and src_c.start < src_c.stop:
+        padded[src_r.start - r0:src_r.stop - r0, src_c.start - c0:src_c.stop - c0] = array[src_r, src_c]
+
+    blocks = padded.reshape(out_rows, factor, out_cols, factor)
+    valid = ~np.isnan(blocks)
+    sums = np.where(valid, blocks, 0.0).sum(axis=(1, 3))
+    counts = valid.sum(axis=(1, 3))
+    result = np.full(out_shape, np.nan, dtype=np.float64)
+    np.divide(sums, counts, out=result, where=counts > 0)
+    return result
+
+
+def replicate(array, factor, out_shape, origin=(0, 0)):
+    """
+    각 픽셀을 factor x factor로 복제해 확대 (최근접). 입력 범위 밖은 NaN.
+    origin: 결과 (0, 0) 픽셀이 속한 입력 픽셀 위치를 factor배 한 값 (결과 배열 기준 시작 위치)
+    """
+    rows = (np.arange(out_shape[0]) + origin[0]) // factor
+    cols = (np.arange(out_shape[1]) + origin[1]) // factor
+    return _take_2d(array, rows, cols)
+
+
+def bilinear(array, factor, out_shape, origin=(0, 0)):
+    """
+    픽셀 중심 기준 이중선형 보간으로 확대 (NaN인 이웃은 가중치에서 제외)
+    """
+    # 결과 픽셀 중심의 입력 배열 좌표
+    rows = (np.arange(out_shape[0]) + origin[0] + 0.5) / factor - 0.5
+    cols = (np.arange(out_shape[1]) + origin[1] + 0.5) / factor - 0.5
+    r_low = np.floor(rows).astype(np.int64)
+    c_low = np.floor(cols).astype(np.int64)
+    r_weight = (rows - r_low)[:, None]
+    c_weight = (cols - c_low)[None, :]
+
+    total = np.zeros(out_shape, dtype=np.float64)
+    weights = np.zeros(out_shape, dtype=np.float64)
+    for dr, wr in ((0, 1 - r_weight), (1, r_weight)):
+        for dc, wc in ((0, 1 - c_weight), (1, c_weight)):
+            values = _take_2d(array, r_low + dr, c_low + dc)
+            w = np.where(np.isnan(values), 0.0, wr * wc)
+            total += np.where(np.isnan(values), 0.0, values) * w
+            weights += w
+    result = np.full(out_shape, np.nan, dtype=np.float64)
+    np.divide(total, weights, out=result, where=weights > 0)
+    return result
+
+
+def _take_2d(array, rows, cols):
+    # 범위 밖 인덱스는 NaN
+    valid_r = (rows >= 0) & (rows < array.shape[0])
+    valid_c = (cols >= 0) & (cols < array.shape[1])
+    values = array[np.clip(rows, 0, array.shape[0] - 1)[:, None], np.clip(cols, 0, array.shape[1] - 1)[None, :]]
+    values = values.astype(np.float64)
+    values[~(valid_r[:, None] & valid_c[None, :])] = np.nan
+    return values
+
+
+def regrid_array(array, src_resolution, dst_resolution, out_shape, method="bilinear"):
+    """
+    지역 배열을 다른 해상도의 지역 격자로 변환 (두 격자의 오프셋을 반영해 정렬).
+    고해상도 -> 저해상도는 NaN 제외 블록 평균, 반대는 method("nearest" 또는 "bilinear")
+    """
+    src_offset = grid_offset(src_resolution)
+    dst_offset = grid_offset(dst_resolution)
+    if src_resolution == dst_resolution:
+        return block_mean(array, 1, out_shape, origin=(dst_offset[0] - src_offset[0], dst_offset[1] - src_offset[1]))
+
+    if src_resolution < dst_resolution:
+        factor = int(round(dst_resolution / src_resolution))
+        origin = (dst_offset[0] * factor - src_offset[0], dst_offset[1] * factor - src_offset[1])
+        return block_mean(array, factor, out_shape, origin=origin)
+
+    factor = int(round(src_resolution / dst_resolution))
+    origin = (dst_offset[0] - src_offset[0] * factor, dst_offset[1] - src_offset[1] * factor)
+    if method == "nearest":
+        return replicate(array, factor, out_shape, origin=origin)
+    if method == "bilinear":
+        return bilinear(array, factor, out_shape, origin=origin)
+    raise ValueError(f"지원하지 않는 보간 방법입니다: {method}")
+
+
+def cube_resolution(cube):
+    resolutions = {CHANNEL_RESOLUTIONS[name] for name in cube.channel_names}
+    if len(resolutions) != 1:
+        raise ValueError(f"해상도가 다른 채널이 한 큐브에 있습니다: {cube.channel_names}")
+    return resolutions.pop()
+
+
+def regrid_cubes(cubes, target_resolution=2.0, data_types=None, method="bilinear", dtype=np.float32):
+    """
+    해상도별 ChannelCube들을 target_resolution 격자 하나로 모아 단일 ChannelCube로 반환.
+
+    Parameters:
+    - cubes: {size_key: ChannelCube} (HourlyMeanAccumulator.to_cubes 결과)
+    - target_resolution: 목표 해상도 (2.0이면 0.5/1km 채널을 블록 평균, 0.5면 나머지를 확대)
+    - data_types: 결과 채널 순서 (None이면 입력 순서)
+    - method: 확대 시 보간 방법 ("nearest" 또는 "bilinear")
+    """
+    by_resolution = {cube_resolution(cube): cube for cube in cubes.values()}
+    if target_resolution in by_resolution:
+        out_shape = by_resolution[target_resolution].data.shape[1:]
+    else:
+        # 목표 해상도 큐브가 없으면 첫 큐브 범위로 크기 계산
+        resolution, cube = next(iter(by_resolution.items()))
+        src_offset, dst_offset = grid_offset(resolution), grid_offset(target_resolution)
+        scale = resolution / target_resolution
+        out_shape = tuple(
+            int((src_offset[axis] + cube.data.shape[axis + 1]) * scale) - dst_offset[axis] for axis in (0, 1)
+        )
+
+    channels = {}
+    for resolution, cube in by_resolution.items():
+        for name, array in zip(cube.channel_names, cube.data):
+            if resolution == target_resolution:
+                channels[name] = array
+            else:
+                channels[name] = regrid_array(array, resolution, target_resolution, out_shape, method=method)
+
+    names = [name for name in (data_types or channels) if name in channels]
+    regridded = ChannelCube.empty(names, *out_shape, dtype=dtype, metadata={"resolution": target_resolution})
+    for i, name in enumerate(names):
+        regridded.data[i] = channels[name]
+    return regridded
@@ -0,0 +1,290 @@
+import json
+import os
+from functools import lru_cache
+from glob import glob
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from coord_store import grid_latlon
+from grid_sidecar import SIDECAR_NAME, parquet_grid_shape
+from hourly_parquet import DEFAULT_ROW_GROUP_SIZE, GRID_METADATA_KEY, read_grid_metadata
+
+# 공간 정렬 정보와 행 그룹별 위경도 범위를 기록하는 메타데이터 키
+SPATIAL_METADATA_KEY = b"inkle.spatial"
+
+CURVES = ("zorder", "hilbert")
+
+
+def _part1by1(v):
+    # 16비트 값의 비트 사이에 0을 끼워 넣음 (Morton 부호화)
+    v = v & 0xFFFF
+    v = (v | (v << 8)) & 0x00FF00FF
+    v = (v | (v << 4)) & 0x0F0F0F0F
+    v = (v | (v << 2)) & 0x33333333
+    return (v | (v << 1)) & 0x55555555
+
+
+def zorder_key(x, y):
+    """
+    픽셀 (x, y) 배열의 Z-order(Morton) 키 (x, y < 65536)
+    """
+    x = np.asarray(x, dtype=np.int64)
+    y = np.asarray(y, dtype=np.int64)
+    return _part1by1(x) | (_part1by1(y) << 1)
+
+
+def hilbert_key(x, y, order=16):
+    """
+    픽셀 (x, y) 배열의 Hilbert 곡선 거리 (한 변 2**order 격자 기준, 벡터 연산)
+    """
+    x = np.array(x, dtype=np.int64)
+    y = np.array(y, dtype=np.int64)
+    n = 1 << order
+    key = np.zeros(x.shape, dtype=np.int64)
+    s = n >> 1
+    while s > 0:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        key += s * s * ((3 * rx) ^ ry)
+        # 사분면 회전
+        flip = ~ry & rx
+        x[flip] = n - 1 - x[flip]
+        y[flip] = n - 1 - y[flip]
+        swap = ~ry
+        x[swap], y[swap] = y[swap], x[swap]
+        s >>= 1
+    return key
+
+
+@lru_cache(maxsize=None)
+def spatial_order(rows, cols, curve="hilbert"):
+    """
+    (rows, cols) 격자의 행 우선 인덱스를 공간 곡선 순서로 정렬한 배열 (격자 크기별로 한 번만 계산, 읽기 전용)
+    """
+    if curve not in CURVES:
+        raise ValueError(f"지원하지 않는 공간 정렬 방식입니다: {curve}")
+    y, x = np.divmod(np.arange(rows * cols), cols)
+    if curve == "zorder":
+        key = zorder_key(x, y)
+    else:
+        key = hilbert_key(x, y, order=max(1, int(np.ceil(np.log2(max(rows, cols))))))
+    order = np.argsort(key, kind="stable")
+    order.flags.writeable = False
+    return order
+
+
+def default_row_group_size(rows, cols, groups_per_grid=32):
+    """
+    격자 한 장을 약 groups_per_grid개로 나누는 행 그룹 크기. Hilbert/Z-order 블록 경계와 맞도록 4의 거듭제곱으로
+    내리고 1024 ~ DEFAULT_ROW_GROUP_SIZE 범위로 제한 (2km 1024, 1km 4096, 0.5km 16384행)
+    """
+    size = 4 ** int(np.log(max(rows * cols // groups_per_grid, 1)) / np.log(4))
+    return int(min(max(size, 1024), DEFAULT_ROW_GROUP_SIZE))
+
+
+def _iter_source_grids(source, time_column, batch_size):
+    """
+    입력에서 (시간 값, 격자 한 장 분량의 pyarrow 테이블)을 차례로 반환 (행 우선 순서)
+    - 디렉토리: grid_sidecar.write_time_partitions 출력 ({time_column}=값/part-0.parquet)
+    - 파일: 격자 한 장씩 이어진 일별 파일 (시간 열이 없으면 파일 전체를 한 시각으로 봄)
+    """
+    if os.path.isdir(source):
+        for path in sorted(glob(os.path.join(source, f"{time_column}=*", "part-0.parquet"))):
+            yield os.path.basename(os.path.dirname(path)).split("=", 1)[1], pq.read_table(path)
+        return
+
+    rows, cols = _source_shape(source)
+    grid_size = rows * cols
+    pending = []
+    pending_rows = 0
+    for batch in pq.ParquetFile(source).iter_batches(batch_size=batch_size):
+        pending.append(batch)
+        pending_rows += batch.num_rows
+        while pending_rows >= grid_size:
+            table = pa.Table.from_batches(pending)
+            grid, rest = table.slice(0, grid_size), table.slice(grid_size)
+            yield _grid_time(grid, time_column), grid
+            pending, pending_rows = rest.to_batches(), rest.num_rows
+    if pending_rows:
+        raise ValueError(f"{source}: 마지막 {pending_rows}행이 격자 크기 {rows}x{cols}보다 적습니다")
+
+
+def _grid_time(grid, time_column):
+    # 격자 한 장의 시간 값 (격자 안에서 시간이 바뀌면 오류)
+    if time_column not in grid.column_names:
+        return None
+    times = grid.column(time_column).unique()
+    if len(times) != 1:
+        raise ValueError(f"격자 한 장 안에 {time_column} 값이 여러 개입니다: {times.to_pylist()[:3]}")
+    return times[0].as_py()
+
+
+def _source_shape(source):
+    # 격자 크기: 디렉토리는 좌표 파일, 파일은 격자 메타데이터 또는 x, y 열 통계
+    if os.path.isdir(source):
+        grid = read_grid_metadata(os.path.join(source, SIDECAR_NAME))
+        return grid["rows"], grid["cols"]
+    schema = pq.read_schema(source)
+    if schema.metadata and GRID_METADATA_KEY in schema.metadata:
+        grid = read_grid_metadata(source)
+        return grid["rows"], grid["cols"]
+    return parquet_grid_shape(source)
+
+
+def write_spatial_layout(source, output_path, resolution=None, store=None, curve="hilbert",
+                         row_group_size=None, time_column="Datetime",
+                         coordinates_path=None, batch_size=1 << 20, compression="zstd"):
+    """
+    격자 자료를 공간 곡선(Z-order 또는 Hilbert) 순서로 정렬해 Latitude, Longitude와 함께 저장.
+    시간마다 격자 한 장을 곡선 순서로 바꿔 row_group_size 크기의 행 그룹으로 나눠 쓰므로 (행 그룹은 시간을 넘지 않음)
+    각 행 그룹이 좁은 영역을 덮고, 행 그룹별 위경도 최소/최대를 메타데이터에 기록해
+    read_bbox가 필요한 행 그룹만 읽을 수 있음. 시간당 격자 한 장만 메모리에 올림
+
+    Parameters:
+    - source: 시간별 파티션 디렉토리 (좌표 파일 포함) 또는 격자 한 장씩 이어진 parquet 파일
+    - output_path: 출력 parquet 경로 (임시 파일에 쓴 뒤 교체)
+    - resolution: 해상도 (좌표 파일이 없을 때 위경도 계산에 사용)
+    - store: CoordinateStore 또는 좌표 저장소 디렉토리 (None이면 투영 변환으로 계산)
+    - curve: "hilbert" 또는 "zorder"
+    - row_group_size: 행 그룹 크기 (bbox 읽기 단위, None이면 default_row_group_size)
+    - coordinates_path: 파일 입력의 좌표 파일 (예: 일별 병합의 coordinates_{크기}.parquet)
+
+    Returns:
+    - 기록한 행 그룹 수
+    """
+    rows, cols = _source_shape(source)
+    row_group_size = row_group_size or default_row_group_size(rows, cols)
+    if os.path.isdir(source):
+        coordinates_path = os.path.join(source, SIDECAR_NAME)
+    if coordinates_path is not None:
+        coordinates = pq.read_table(coordinates_path)
+        latitude = coordinates.column("Latitude").to_numpy()
+        longitude = coordinates.column("Longitude").to_numpy()
+    elif resolution is not None:
+        latitude, longitude = grid_latlon(resolution, rows, cols, store=store)
+    else:
+        raise ValueError("좌표 파일(coordinates_path)이나 해상도(resolution)가 필요합니다")
+
+    # 곡선 순서의 좌표와 픽셀 위치는 격자마다 같으므로 한 번만 만듦
+    order = spatial_order(rows, cols, curve)
+    y, x = np.divmod(order, cols)
+    fixed = {"x": pa.array(x.astype(np.int16)), "y": pa.array(y.astype(np.int16)),
+             "Latitude": pa.array(latitude[order]), "Longitude": pa.array(longitude[order])}
+    bounds = []
+    for start in range(0, rows * cols, row_group_size):
+        lat = latitude[order[start:start + row_group_size]]
+        lon = longitude[order[start:start + row_group_size]]
+        bounds.append([float(np.nanmin(lat)), float(np.nanmax(lat)), float(np.nanmin(lon)), float(np.nanmax(lon))]
+                      if not np.isnan(lat).all() else None)
+    order_array = pa.array(order)
+
+    tmp_path = f"{output_path}.tmp"
+    writer = None
+    row_groups = []
+    try:
+        try:
+            for time_value, grid in _iter_source_grids(source, time_column, batch_size):
+                if "x" in grid.column_names and "y" in grid.column_names:
+                    # 곡선 순서는 행 우선 격자 인덱스 기준이므로 입력 순서를 확인
+                    index = np.arange(rows * cols)
+                    if not (np.array_equal(grid.column("x").to_numpy(), index % cols)
+                            and np.array_equal(grid.column("y").to_numpy(), index // cols)):
+                        raise ValueError(f"{source}: {time_column}={time_value}의 x, y가 {rows}x{cols} 격자의 행 우선 순서가 아닙니다")
+                values = grid.drop([name for name in (time_column, "x", "y", "Latitude", "Longitude") if name in grid.column_names])
+                values = values.take(order_array)
+                columns = dict(fixed)
+                if time_value is not None:
+                    columns = {time_column: pa.repeat(pa.scalar(time_value), rows * cols), **columns}
+                table = pa.table({**columns, **{name: values.column(name) for name in values.column_names}})
+                if writer is None:
+                    schema = table.schema
+                    # 실수 열(위경도, 채널 값)은 BYTE_STREAM_SPLIT으로 압축률을 높임 (행 그룹이 작아도 사전 인코딩보다 작음)
+                    float_columns = [field.name for field in schema if pa.types.is_floating(field.type)]
+                    writer = pq.ParquetWriter(tmp_path, schema, compression=compression,
+                                              use_dictionary=[field.name for field in schema if field.name not in float_columns],
+                                              use_byte_stream_split=float_columns)
+                for i, start in enumerate(range(0, rows * cols, row_group_size)):
+                    writer.write_table(table.slice(start, row_group_size).cast(schema), row_group_size=row_group_size)
+                    row_groups.append({"time": time_value, "bbox": bounds[i]})
+            if writer is None:
+                raise ValueError(f"{source}: 저장할 격자가 없습니다")
+            spatial = {"curve": curve, "rows": rows, "cols": cols, "row_group_size": row_group_size,
+                       "row_groups": row_groups}
+            grid_metadata = {"rows": rows, "cols": cols, "order": curve}
+            writer.add_key_value_metadata({SPATIAL_METADATA_KEY: json.dumps(spatial).encode("utf-8"),
+                                           GRID_METADATA_KEY: json.dumps(grid_metadata).encode("utf-8")})
+        finally:
+            if writer is not None:
+                writer.close()
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)  # 실패하면 쓰다 만 임시 파일을 남기지 않음
+        raise
+    return len(row_groups)
+
+
+def read_spatial_metadata(path):
+    """
+    write_spatial_layout이 기록한 정렬 정보 (없으면 None)
+    """
+    metadata = pq.read_metadata(path).metadata or {}
+    if SPATIAL_METADATA_KEY not in metadata:
+        return None
+    return json.loads(metadata[SPATIAL_METADATA_KEY])
+
+
+def _row_group_bounds(parquet_file):
+    # 행 그룹별 (위도 최소, 최대, 경도 최소, 최대): 정렬 메타데이터가 없으면 parquet 열 통계 사용
+    metadata = parquet_file.metadata
+    spatial = json.loads(metadata.metadata[SPATIAL_METADATA_KEY]) if SPATIAL_METADATA_KEY in (metadata.metadata or {}) else None
+    if spatial is not None:
+        return [row_group["bbox"] for row_group in spatial["row_groups"]]
+
+    names = [metadata.schema.column(i).name for i in range(metadata.num_columns)]
+    lat_index, lon_index = names.index("Latitude"), names.index("Longitude")
+    bounds = []
+    for i in range(metadata.num_row_groups):
+        lat_stats = metadata.row_group(i).column(lat_index).statistics
+        lon_stats = metadata.row_group(i).column(lon_index).statistics
+        if lat_stats is None or lon_stats is None or not (lat_stats.has_min_max and lon_stats.has_min_max):
+            bounds.append([-90.0, 90.0, -180.0, 180.0])  # 통계가 없으면 항상 읽음
+        else:
+            bounds.append([lat_stats.min, lat_stats.max, lon_stats.min, lon_stats.max])
+    return bounds
+
+
+def bbox_row_groups(path, lat_min, lat_max, lon_min, lon_max):
+    """
+    위경도 범위와 겹치는 행 그룹 번호 목록 (좌표가 모두 NaN인 행 그룹은 제외)
+    """
+    bounds = _row_group_bounds(pq.ParquetFile(path))
+    return [i for i, bound in enumerate(bounds)
+            if bound is not None and bound[0] <= lat_max and bound[1] >= lat_min
+            and bound[2] <= lon_max and bound[3] >= lon_min]
+
+
+def read_bbox(path, lat_min, lat_max, lon_min, lon_max, columns=None):
+    """
+    위경도 범위 안의 행만 읽기. 범위와 겹치는 행 그룹만 읽은 뒤 행 단위로 다시 걸러냄
+
+    Parameters:
+    - path: write_spatial_layout 출력 (또는 Latitude, Longitude 열 통계가 있는 parquet)
+    - lat_min, lat_max, lon_min, lon_max: 위경도 범위 (양 끝 포함)
+    - columns: 읽을 열 (None이면 전체, Latitude, Longitude는 항상 포함)
+
+    Returns:
+    - 데이터프레임
+    """
+    parquet_file = pq.ParquetFile(path)
+    if columns is not None:
+        columns = list(dict.fromkeys(list(columns) + ["Latitude", "Longitude"]))
+    row_groups = bbox_row_groups(path, lat_min, lat_max, lon_min, lon_max)
+    if not row_groups:
+        return parquet_file.schema_arrow.empty_table().select(columns or parquet_file.schema_arrow.names).to_pandas()
+    table = parquet_file.read_row_groups(row_groups, columns=columns)
+    latitude = table.column("Latitude").to_numpy()
+    longitude = table.column("Longitude").to_numpy()
+    inside = (latitude >= lat_min) & (latitude <= lat_max) & (longitude >= lon_min) & (longitude <= lon_max)
+    return table.filter(pa.array(inside)).to_pandas()
@@ -0,0 +1,300 @@
+import atexit
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+
+# 단계별 측정 설정 (환경 변수로도 켤 수 있으며, 하위 프로세스는 환경 변수를 이어받아 같은 설정으로 기록)
+METRICS_ENV = "INKLE_METRICS"                # 출력 파일 경로 (없으면 측정하지 않음)
+METRICS_FORMAT_ENV = "INKLE_METRICS_FORMAT"  # "jsonl"(기본, 단계마다 한 줄) 또는 "prom"(단계별 합계, 텍스트 형식)
+PROFILE_ENV = "INKLE_PROFILE"                # cProfile로 감쌀 단계 이름 (쉼표 구분, "*"는 전체)
+OWNER_ENV = "INKLE_METRICS_OWNER"            # 측정을 켠 프로세스 pid (prom 파일은 이 프로세스만 기본 경로에 기록)
+
+METRIC_FIELDS = ("bytes_in", "bytes_out", "rows", "pixels")
+
+
+def peak_rss_bytes():
+    """
+    현재 프로세스의 최대 메모리 사용량 (바이트). 측정할 수 없으면 None.
+    Linux는 /proc/self/status의 VmHWM을 사용 (reset_peak_rss로 단계마다 초기화 가능,
+    ru_maxrss는 exec 전 부모 프로세스의 값을 이어받아 단계별로 구분되지 않음)
+    """
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        pass
+    try:
+        import psutil  # Windows
+        return psutil.Process().memory_info().peak_wset
+    except (ImportError, AttributeError):
+        return None
+
+
+def reset_peak_rss():
+    """
+    VmHWM을 현재 사용량으로 초기화 (Linux만 가능, 성공 여부 반환)
+    """
+    try:
+        with open("/proc/self/clear_refs", "w", encoding="ascii") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+class _NullStage:
+    """
+    측정이 꺼져 있을 때 사용하는 단계 (모든 호출이 아무 일도 하지 않음)
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def add(self, **values):
+        pass
+
+
+NULL_STAGE = _NullStage()
+
+
+class Stage:
+    """
+    한 단계의 측정 구간. with 블록 동안의 경과/CPU 시간과 최대 메모리를 기록하고,
+    add(bytes_in=..., bytes_out=..., rows=..., pixels=...)로 처리량을 더함
+    """
+
+    def __init__(self, recorder, name, labels):
+        self.recorder = recorder
+        self.name = name
+        self.labels = labels
+        self.values = dict.fromkeys(METRIC_FIELDS, 0)
+        self.profiler = None
+
+    def add(self, **values):
+        for key, value in values.items():
+            self.values[key] = self.values.get(key, 0) + int(value or 0)
+
+    def __enter__(self):
+        # 최대 메모리는 진행 중인 다른 단계가 없을 때만 초기화 (안쪽 단계나 다른 스레드의 단계가
+        # 바깥 단계의 최대값을 지우지 않도록)
+        self.outermost = self.recorder._enter()
+        self.peak_reset = self.outermost and reset_peak_rss()
+        if self.recorder.should_profile(self.name):
+            self.profiler = cProfile.Profile()
+            try:
+                self.profiler.enable()
+            except ValueError:  # 다른 프로파일러가 이미 동작 중
+                self.profiler = None
+        self.start = time.perf_counter()
+        self.cpu_start = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        seconds = time.perf_counter() - self.start
+        cpu_seconds = time.process_time() - self.cpu_start
+        if self.profiler is not None:
+            self.profiler.disable()
+        self.recorder._exit()
+        record = {
+            "stage": self.name,
+            "labels": self.labels,
+            "start": time.time() - seconds,
+            "seconds": round(seconds, 6),
+            "cpu_seconds": round(cpu_seconds, 6),
+            **self.values,
+            # VmHWM을 초기화하지 못했으면 프로세스 시작 이후 최대값
+            "peak_rss_bytes": peak_rss_bytes(),
+            "peak_scope": "stage" if self.peak_reset else "process",
+            "ok": exc_type is None,
+            "pid": os.getpid(),
+        }
+        if self.profiler is not None:
+            record["profile"] = self.recorder.dump_profile(self.profiler, self.name)
+        self.recorder.record(record)
+        if self.outermost:
+            # 프로세스 풀 작업자는 atexit 없이 종료될 수 있으므로 바깥 단계가 끝날 때마다 기록
+            self.recorder.flush()
+        return False
+
+
+class MetricsRecorder:
+    """
+    단계별 측정 기록기.
+
+    Parameters:
+    - path: 출력 파일 경로
+    - fmt: "jsonl"(단계마다 JSON 한 줄 추가) 또는 "prom"(단계별 합계를 Prometheus 텍스트 형식으로 저장)
+    - profile: cProfile로 감쌀 단계 이름 목록 ("*"가 있으면 전체). 결과는 path 옆 {단계}_{pid}_{번호}.prof
+    """
+
+    def __init__(self, path, fmt="jsonl", profile=()):
+        if fmt not in ("jsonl", "prom"):
+            raise ValueError(f"지원하지 않는 측정 출력 형식입니다: {fmt}")
+        self.path = path
+        self.fmt = fmt
+        self.profile = set(profile)
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        self.active = 0
+        self.totals = {}
+        self.profile_count = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def stage(self, name, **labels):
+        return Stage(self, name, labels)
+
+    def _enter(self):
+        with self.lock:
+            self.active += 1
+            return self.active == 1
+
+    def _exit(self):
+        with self.lock:
+            self.active -= 1
+
+    def should_profile(self, name):
+        return name in self.profile or "*" in self.profile
+
+    def dump_profile(self, profiler, name):
+        with self.lock:
+            self.profile_count += 1
+            count = self.profile_count
+        path = os.path.join(os.path.dirname(self.path), f"{name}_{self.pid}_{count}.prof")
+        profiler.dump_stats(path)
+        return path
+
+    def record(self, record):
+        if self.fmt == "jsonl":
+            # 한 줄씩 추가 모드로 기록 (여러 프로세스가 같은 파일에 써도 줄 단위로 섞이지 않음)
+            line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+            with self.lock, open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+            return
+        with self.lock:
+            total = self.totals.setdefault(record["stage"], dict.fromkeys(
+                ("calls", "errors", "seconds", "cpu_seconds") + METRIC_FIELDS, 0))
+            total["calls"] += 1
+            total["errors"] += not record["ok"]
+            for key in ("seconds", "cpu_seconds") + METRIC_FIELDS:
+                total[key] += record[key]
+            if record["peak_rss_bytes"] is not None:
+                total["peak_rss_bytes"] = max(total.get("peak_rss_bytes", 0), record["peak_rss_bytes"])
+
+    def flush(self):
+        """
+        prom 형식이면 지금까지의 합계를 파일에 기록 (임시 파일에 쓴 뒤 교체)
+        """
+        if self.fmt != "prom" or not self.totals:
+            return
+        lines = []
+        with self.lock:
+            for key in ("calls", "errors", "seconds", "cpu_seconds") + METRIC_FIELDS + ("peak_rss_bytes",):
+                metric = f"inkle_stage_{key}" + ("" if key == "peak_rss_bytes" else "_total")
+                lines.append(f"# TYPE {metric} {'gauge' if key == 'peak_rss_bytes' else 'counter'}")
+                for name, total in sorted(self.totals.items()):
+                    if key in total:
+                        lines.append(f'{metric}{{stage="{name}"}} {round(total[key], 6)}')
+        # 하위 프로세스는 같은 파일을 덮어쓰지 않도록 pid를 붙인 파일에 기록
+        path = self.path if self.pid == _settings.get("owner") else f"{os.path.splitext(self.path)[0]}_{self.pid}.prom"
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(f"{path}.tmp", path)
+
+
+_settings = {}
+_recorder = None
+
+
+def configure(path=None, fmt=None, profile=None):
+    """
+    측정을 켜거나 끔 (path=None이면 끔). 설정은 환경 변수에도 기록되어 하위 프로세스가 이어받음
+
+    Parameters:
+    - path: 출력 파일 경로 (jsonl 또는 prom)
+    - fmt: "jsonl" 또는 "prom" (None이면 확장자가 .prom일 때 prom, 그 외 jsonl)
+    - profile: cProfile로 감쌀 단계 이름 목록 또는 쉼표로 구분한 문자열 ("*"는 전체)
+
+    Returns:
+    - MetricsRecorder (끈 경우 None)
+    """
+    global _recorder
+    if get_recorder() is not None:
+        _recorder.flush()
+    if path is None:
+        _recorder = None
+        _settings.clear()
+        for name in (METRICS_ENV, METRICS_FORMAT_ENV, PROFILE_ENV, OWNER_ENV):
+            os.environ.pop(name, None)
+        return None
+
+    if fmt is None:
+        fmt = "prom" if path.endswith(".prom") else "jsonl"
+    if isinstance(profile, str):
+        profile = [name for name in profile.split(",") if name]
+    owner = _settings.get("owner") or int(os.environ.get(OWNER_ENV) or os.getpid())
+    _settings.update(path=path, fmt=fmt, profile=list(profile or ()), owner=owner)
+    os.environ.update({METRICS_ENV: path, METRICS_FORMAT_ENV: fmt, PROFILE_ENV: ",".join(_settings["profile"]),
+                       OWNER_ENV: str(owner)})
+    _recorder = MetricsRecorder(path, fmt, _settings["profile"])
+    return _recorder
+
+
+def get_recorder():
+    """
+    현재 프로세스의 기록기 (측정이 꺼져 있으면 None).
+    fork로 만든 하위 프로세스는 부모의 합계를 이어받지 않도록 새 기록기를 만듦
+    """
+    global _recorder
+    if _recorder is not None and _recorder.pid != os.getpid():
+        _recorder = MetricsRecorder(_settings["path"], _settings["fmt"], _settings["profile"])
+    return _recorder
+
+
+def stage(name, **labels):
+    """
+    with stage("daily_merge", date="20250108") as s: ... s.add(rows=n)
+    측정이 꺼져 있으면 아무 일도 하지 않는 객체를 반환 (추가 비용은 함수 호출 한 번)
+    """
+    recorder = get_recorder()
+    if recorder is None:
+        return NULL_STAGE
+    return recorder.stage(name, **labels)
+
+
+def file_bytes(*paths):
+    """
+    파일 크기 합계 (없는 파일은 0)
+    """
+    total = 0
+    for path in paths:
+        try:
+            total += os.path.getsize(path)
+        except OSError:
+            pass
+    return total
+
+
+@atexit.register
+def _flush_at_exit():
+    if get_recorder() is not None:
+        _recorder.flush()
+
+
+# spawn으로 만든 하위 프로세스나 배치 스크립트는 환경 변수만으로 측정을 켤 수 있음
+if os.environ.get(METRICS_ENV):
+    configure(os.environ[METRICS_ENV], os.environ.get(METRICS_FORMAT_ENV) or None, os.environ.get(PROFILE_ENV, ""))
@@ -0,0 +1,164 @@
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from calibration import calibrate_columns, stored_columns
+from coord_calc import latlon_to_pixel
+from hourly_parquet import hourly_partition_path, read_grid_metadata, read_hourly_parquet
+from grid_spec import get_grid_spec
+
+
+def station_pixel_indices(stations, resolution, rows, cols, neighbourhood=1):
+    """
+    지점 위경도를 지역 배열의 행 우선 1D 인덱스로 한 번만 변환.
+
+    Parameters:
+    - stations: station, lat, lon 열을 가진 데이터프레임
+    - resolution: 자료 해상도 (0.5, 1.0, 2.0 중 하나)
+    - rows, cols: 지역 배열 크기
+    - neighbourhood: N (홀수). 지점 픽셀 중심의 N x N 이웃을 사용
+
+    Returns:
+    - (지점 수, N*N) int64 배열. 배열 밖의 이웃은 -1
+    """
+    spec = get_grid_spec(resolution)
+    # 정수 픽셀 좌표가 픽셀 중심이므로 가장 가까운 픽셀은 반올림 (내림은 원점 쪽으로 최대 1픽셀 밀림)
+    x, y = latlon_to_pixel(stations["lat"].to_numpy(), stations["lon"].to_numpy(), resolution, mode="round")
+    local_x = np.where(x >= 0, x - spec.x_offset, -cols)
+    local_y = np.where(y >= 0, y - spec.y_offset, -rows)
+
+    half = neighbourhood // 2
+    dy, dx = np.meshgrid(np.arange(-half, half + 1), np.arange(-half, half + 1), indexing="ij")
+    neighbour_x = local_x[:, None] + dx.ravel()[None, :]
+    neighbour_y = local_y[:, None] + dy.ravel()[None, :]
+    inside = (neighbour_x >= 0) & (neighbour_x < cols) & (neighbour_y >= 0) & (neighbour_y < rows)
+    return np.where(inside, neighbour_y * cols + neighbour_x, -1)
+
+
+def read_pixels(path, flat_indices, columns=None):
+    """
+    parquet 파일에서 필요한 행이 있는 행 그룹만 읽어 flat_indices 위치의 값을 반환
+    (카운트로 저장된 파일은 읽은 행만 보정)
+
+    Returns:
+    - {채널: flat_indices와 같은 모양의 float64 배열} (인덱스 -1은 NaN)
+    """
+    grid = read_grid_metadata(path)
+    parquet_file = pq.ParquetFile(path)
+    group_rows = [parquet_file.metadata.row_group(i).num_rows for i in range(parquet_file.num_row_groups)]
+    group_starts = np.concatenate([[0], np.cumsum(group_rows)])
+
+    wanted = np.unique(flat_indices[flat_indices >= 0])
+    if wanted.size == 0:
+        names = columns or grid["channels"]
+        return {name: np.full(flat_indices.shape, np.nan) for name in names}
+    groups = np.unique(np.searchsorted(group_starts, wanted, side="right") - 1)
+    table = parquet_file.read_row_groups(groups.tolist(), columns=stored_columns(grid, columns))
+
+    # 읽은 행 그룹 안에서의 위치로 변환
+    offsets = np.concatenate([[0], np.cumsum([group_rows[g] for g in groups])])
+    group_of = np.searchsorted(group_starts, np.maximum(flat_indices, 0), side="right") - 1
+    positions = offsets[np.searchsorted(groups, group_of)] + np.maximum(flat_indices, 0) - group_starts[group_of]
+
+    columns = calibrate_columns({name: table.column(name).to_numpy() for name in table.column_names}, grid)
+    values = {}
+    for name, column in columns.items():
+        column = column.astype(np.float64)
+        values[name] = np.where(flat_indices >= 0, column[np.clip(positions, 0, max(len(column) - 1, 0))], np.nan)
+    return values
+
+
+def extract_station_timeseries(hourly_root, stations, start_time, end_time, resolution, size_key,
+                               channels=None, neighbourhood=1):
+    """
+    시간별 parquet 파티션에서 지점 픽셀만 읽어 지점 x 시간 x 채널 표를 만듦
+
+    Parameters:
+    - hourly_root: 시간별 parquet 파티션 최상위 디렉토리
+    - stations: station, lat, lon 열을 가진 데이터프레임
+    - start_time, end_time: 추출할 시간 범위 (시간 단위, 양 끝 포함)
+    - resolution, size_key: 자료 해상도와 격자 크기 (예: 2.0, "277x306")
+    - channels: 읽을 채널 목록 (None이면 전체)
+    - neighbourhood: N x N 이웃 평균 (1이면 지점 픽셀 값)
+
+    Returns:
+    - station, Datetime, channel, value 열을 가진 데이터프레임
+    """
+    rows, cols = (int(n) for n in size_key.split("x"))
+    flat_indices = station_pixel_indices(stations, resolution, rows, cols, neighbourhood)
+    station_names = stations["station"].to_numpy()
+
+    frames = []
+    hourly_start_time = start_time.replace(minute=0, second=0, microsecond=0)
+    while hourly_start_time <= end_time:
+        path = hourly_partition_path(hourly_root, hourly_start_time, size_key)
+        try:
+            values = read_pixels(path, flat_indices, columns=channels)
+        except FileNotFoundError:
+            values = {}
+        for channel, pixel_values in values.items():
+            # 이웃 평균 (유효 값이 없으면 NaN)
+            valid = ~np.isnan(pixel_values)
+            counts = valid.sum(axis=1)
+            sums = np.where(valid, pixel_values, 0.0).sum(axis=1)
+            means = np.full(len(counts), np.nan)
+            np.divide(sums, counts, out=means, where=counts > 0)
+            frames.append(pd.DataFrame({
+                "station": station_names,
+                "Datetime": hourly_start_time,
+                "channel": channel,
+                "value": means,
+            }))
+        hourly_start_time += timedelta(hours=1)
+
+    if not frames:
+        return pd.DataFrame(columns=["station", "Datetime", "channel", "value"])
+    return pd.concat(frames, ignore_index=True)
+
+
+def nearest_pixel_indices(stations, resolution, rows, cols):
+    """
+    지점마다 픽셀 중심 위경도가 가장 가까운 지역 배열 픽셀의 1D 인덱스 (check_station_pixels용).
+    투영 역변환을 쓰지 않고 grid_spec의 픽셀 중심 좌표에서 직접 찾으므로 station_pixel_indices와 독립적임.
+    가장 가까운 픽셀까지 해상도보다 멀면 배열 밖으로 보고 -1
+    """
+    latitude, longitude = get_grid_spec(resolution).regional_latlon(rows, cols)
+    indices = np.full(len(stations), -1, dtype=np.int64)
+    for i, (lat, lon) in enumerate(zip(stations["lat"].to_numpy(), stations["lon"].to_numpy())):
+        # 지점 주변에서는 경도 차이에 cos(위도)를 곱하면 거리에 비례
+        distance = (latitude - lat) ** 2 + ((longitude - lon) * np.cos(np.radians(lat))) ** 2
+        nearest = int(np.argmin(distance))
+        if np.sqrt(distance.flat[nearest]) * 111.2 <= resolution:
+            indices[i] = nearest
+    return indices
+
+
+def check_station_pixels(path, stations, resolution, channels=None):
+    """
+    read_pixels로 읽은 지점 값과, 같은 파일의 전체 격자를 읽어 가장 가까운 픽셀(nearest_pixel_indices)에서 구한 값을 비교
+
+    Parameters:
+    - path: 시간별 parquet 파일
+    - stations: station, lat, lon 열을 가진 데이터프레임
+    - resolution: 자료 해상도
+    - channels: 비교할 채널 목록 (None이면 전체)
+
+    Returns:
+    - 값이 다른 지점 목록 (station, channel, extracted, full_frame 열, 비어 있으면 일치)
+    """
+    grid = read_grid_metadata(path)
+    rows, cols = grid["rows"], grid["cols"]
+    extracted = read_pixels(path, station_pixel_indices(stations, resolution, rows, cols), columns=channels)
+    full_frame = read_hourly_parquet(path, columns=channels)
+    nearest = nearest_pixel_indices(stations, resolution, rows, cols)
+
+    mismatches = []
+    for channel, values in extracted.items():
+        column = full_frame[channel].to_numpy(dtype=np.float64)
+        expected = np.where(nearest >= 0, column[np.maximum(nearest, 0)], np.nan)
+        same = (values[:, 0] == expected) | (np.isnan(values[:, 0]) & np.isnan(expected))
+        for i in np.flatnonzero(~same):
+            mismatches.append({"station": stations["station"].iloc[i], "channel": channel,
+                               "extracted": values[i, 0], "full_frame": expected[i]})
+    return pd.DataFrame(mismatches, columns=["station", "channel", "extracted", "full_frame"])
@@ -1,53 +1,249 @@
+import json
 import os
-import pandas as pd
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from glob import glob
 
-# 디렉토리 경로 설정 (CSV 파일들이 위치한 폴더)
-input_directory = "D:/sat_file"
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from batch_runner import WorkUnit, estimate_grid_bytes, report_results, run_units
+from calibration import calibrate_columns
+from grid_sidecar import write_coordinate_sidecar
+from hourly_parquet import DAILY_METADATA_KEY, GRID_METADATA_KEY, read_daily_metadata, read_grid_metadata, source_signature
+from regrid import CHANNEL_RESOLUTIONS
+import stage_metrics
+
+# 디렉토리 경로 설정 (시간별 Parquet 파티션 최상위 폴더)
+input_directory = "D:/sat_file/hourly"
 output_directory = "D:/mer"
 
-if not os.path.exists(output_directory):
-    os.makedirs(output_directory)
-
-# CSV 파일 검색
-csv_files = glob(os.path.join(input_directory, "*.csv"))
-
-# 파일 정보 추출 및 그룹화
-grouped_files = {}
-for file_path in csv_files:
-    file_name = os.path.basename(file_path)
-    parts = file_name.split("_")
-    
-    # 날짜, 시간, 배열 크기 추출
-    date = parts[3]
-    time = parts[4]
-    size = parts[5].replace(".csv", "")
-    
-    # 그룹 키 생성 (날짜 + 배열 크기)
-    group_key = f"{date}_{size}"
-    
-    if group_key not in grouped_files:
-        grouped_files[group_key] = []
-    grouped_files[group_key].append((time, file_path))
-
-# 그룹별 파일 병합
-for group_key, files in grouped_files.items():
-    files.sort()  # 시간 순서대로 정렬
-    
-    merged_data = []
-    for time, file_path in files:
-        df = pd.read_csv(file_path)
-        
-        # 시간 컬럼 추가 (yyyymmddhh)
-        hour = time.zfill(2)  # 시간 형식을 두 자리로 맞춤
-        datetime_str = group_key.split("_")[0] + hour
-        df.insert(0, "Datetime", datetime_str)
-        
-        merged_data.append(df)
-    
-    # 병합된 데이터 저장
-    merged_df = pd.concat(merged_data, ignore_index=True)
-    output_file = os.path.join(output_directory, f"merged_{group_key}.csv")
-    merged_df.to_csv(output_file, index=False)
-
-print("모든 파일이 병합되었습니다!")
+
+def find_hourly_files(input_directory):
+    """
+    date=YYYYMMDD/hour=HH/grid=RxC 파티션을 찾아 {"날짜_크기": [(시간, 경로), ...]}로 그룹화
+    """
+    grouped_files = {}
+    pattern = os.path.join(input_directory, "date=*", "hour=*", "grid=*", "part-0.parquet")
+    for file_path in glob(pattern):
+        grid_dir = os.path.dirname(file_path)
+        hour_dir = os.path.dirname(grid_dir)
+        date_dir = os.path.dirname(hour_dir)
+
+        # 날짜, 시간, 배열 크기 추출
+        date = os.path.basename(date_dir).split("=", 1)[1]
+        time = os.path.basename(hour_dir).split("=", 1)[1].zfill(2)
+        size = os.path.basename(grid_dir).split("=", 1)[1]
+
+        # 그룹 키 생성 (날짜 + 배열 크기)
+        group_key = f"{date}_{size}"
+        grouped_files.setdefault(group_key, []).append((time, file_path))
+
+    for files in grouped_files.values():
+        files.sort()  # 시간 순서대로 정렬
+    return grouped_files
+
+
+def read_hourly_table(datetime_str, file_path):
+    """
+    시간별 파일을 읽고 맨 앞에 Datetime(yyyymmddhh) 열을 추가 (카운트로 저장된 파일은 보정 값으로 변환)
+    """
+    table = pq.read_table(file_path)
+    grid = read_grid_metadata(file_path)
+    if grid.get("value_mode") == "counts":
+        columns = {name: table.column(name).to_numpy() for name in table.column_names}
+        table = pa.table(calibrate_columns(columns, grid))
+    datetime_column = pa.array([datetime_str] * table.num_rows, type=pa.string())
+    return table.add_column(0, "Datetime", datetime_column).replace_schema_metadata(None)
+
+
+def _calibrated_schema(file_path):
+    # read_hourly_table 결과의 스키마 (카운트 파일은 프레임 수 열을 뺀 채널별 보정 후 float32)
+    grid = read_grid_metadata(file_path)
+    if grid.get("value_mode") == "counts":
+        return pa.schema([pa.field(name, pa.float32()) for name in grid["channels"]])
+    return pq.read_schema(file_path)
+
+
+def conform_table(table, schema):
+    """
+    병합 스키마에 맞춰 열 순서를 맞추고 없는 채널은 null 열로 채움
+    """
+    columns = []
+    for field in schema:
+        if field.name in table.column_names:
+            columns.append(table.column(field.name).cast(field.type))
+        else:
+            columns.append(pa.nulls(table.num_rows, type=field.type))
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+def iter_prefetched(executor, function, items, prefetch):
+    """
+    items 순서대로 결과를 반환하되 동시에 최대 prefetch개만 읽어 둠 (메모리 제한)
+    """
+    pending = deque()
+    items = iter(items)
+    for item in items:
+        pending.append(executor.submit(function, *item))
+        if len(pending) >= prefetch:
+            break
+    while pending:
+        result = pending.popleft().result()
+        item = next(items, None)
+        if item is not None:
+            pending.append(executor.submit(function, *item))
+        yield result
+
+
+def merge_daily_group(group_key, files, output_file, executor, prefetch=4, compression="zstd"):
+    """
+    하루치 시간별 파일을 일별 파일 하나로 스트리밍 병합 (시간당 행 그룹 1개).
+    이미 병합된 시간 중 시간별 파일이 그대로인 시간은 다시 읽지 않고, 기존 행 그룹은 하나씩 복사하므로
+    하루 전체를 메모리에 올리지 않음. 시간별 파일이 다시 저장된 시간(예: 재시도로 채운 시간)은 새로 병합함
+
+    Returns:
+    - 새로 추가되거나 갱신된 시간 목록
+    """
+    date = group_key.split("_")[0]
+    daily_metadata = read_daily_metadata(output_file)
+    done_hours = daily_metadata["hours"] if daily_metadata else []
+    sources = dict(daily_metadata.get("sources", {})) if daily_metadata else {}
+    output_mtime_ns = os.stat(output_file).st_mtime_ns if daily_metadata else None
+    signatures = {time: source_signature(file_path) for time, file_path in files}
+
+    def is_current(time):
+        if time not in done_hours:
+            return False
+        if time in sources:
+            return sources[time] == signatures[time]
+        # 시간별 원본 정보가 없는 이전 형식의 일별 파일은 일별 파일보다 늦게 저장된 시간만 갱신
+        return signatures[time][0] <= output_mtime_ns
+
+    new_files = [(time, file_path) for time, file_path in files if not is_current(time)]
+    if not new_files:
+        print(f"{group_key}: 새로 추가할 시간이 없습니다.")
+        return []
+
+    # 병합 스키마 (기존 일별 파일 + 새 시간별 파일의 채널 합집합)
+    schemas = [_calibrated_schema(file_path) for _, file_path in new_files]
+    if daily_metadata:
+        schemas.insert(0, pq.read_schema(output_file))
+    fields = [pa.field("Datetime", pa.string())]
+    for schema in schemas:
+        for field in schema:
+            if field.name not in [f.name for f in fields]:
+                fields.append(field)
+
+    grid = read_grid_metadata(new_files[0][1])
+    for key in ("value_mode", "count_encoding", "fill_value", "calibration"):
+        grid.pop(key, None)
+    new_hours = [time for time, _ in new_files]
+    all_hours = sorted(set(done_hours) | set(new_hours))
+    sources.update((time, signatures[time]) for time in new_hours)
+    grid["channels"] = [field.name for field in fields[1:]]
+    schema = pa.schema(fields, metadata={
+        GRID_METADATA_KEY: json.dumps(grid).encode("utf-8"),
+        DAILY_METADATA_KEY: json.dumps({"date": date, "hours": all_hours, "sources": sources}).encode("utf-8"),
+    })
+
+    # 기존 행 그룹(갱신하지 않는 시간)과 새로 읽은 시간을 시간 순서대로 기록
+    existing = pq.ParquetFile(output_file) if daily_metadata else None
+    existing_row_groups = {time: i for i, time in enumerate(done_hours) if time not in new_hours}
+    new_tables = iter_prefetched(executor, read_hourly_table, [(date + time, file_path) for time, file_path in new_files], prefetch)
+
+    tmp_file = f"{output_file}.tmp"
+    with stage_metrics.stage("daily_merge", group=group_key, hours=len(new_files)) as stage:
+        stage.add(bytes_in=stage_metrics.file_bytes(*(file_path for _, file_path in new_files)))
+        with pq.ParquetWriter(tmp_file, schema, compression=compression) as writer:
+            for time in all_hours:
+                if time in existing_row_groups:
+                    table = existing.read_row_group(existing_row_groups[time])
+                else:
+                    table = next(new_tables)
+                writer.write_table(conform_table(table, schema), row_group_size=max(table.num_rows, 1))
+                stage.add(rows=table.num_rows)
+        if existing is not None:
+            existing.close()
+        os.replace(tmp_file, output_file)
+        stage.add(bytes_out=stage_metrics.file_bytes(output_file))
+    print(f"{group_key}: {len(new_files)}개 시간 추가/갱신 -> {output_file}")
+    return new_hours
+
+
+def merge_daily_unit(group_key, files, output_file, max_workers=None, prefetch=4):
+    """
+    날짜/격자 크기 그룹 하나를 병합 (프로세스 풀 작업 단위, 파일 읽기는 프로세스 안의 스레드 풀에서 병렬로)
+    """
+    with ThreadPoolExecutor(max_workers=max_workers or prefetch) as executor:
+        return merge_daily_group(group_key, files, output_file, executor, prefetch=prefetch)
+
+
+def merge_daily_files(input_directory, output_directory, max_workers=None, write_coordinates=True, store=None,
+                      processes=None, memory_limit=None):
+    """
+    시간별 파티션을 날짜/격자 크기별 일별 파일로 병합.
+    write_coordinates=True면 격자 크기별 좌표 파일(coordinates_{크기}.parquet)을 한 번만 저장하고
+    일별 파일에는 값 열만 둠 (읽을 때 grid_sidecar.iter_with_coordinates로 결합)
+
+    Parameters:
+    - max_workers: 그룹마다 파일을 읽는 스레드 수 (processes=1이면 None일 때 CPU 수)
+    - processes: 날짜/격자 크기 그룹을 동시에 처리할 프로세스 수 (None이면 CPU 수, 1이면 현재 프로세스에서 순서대로)
+    - memory_limit: 동시에 처리하는 그룹의 예상 메모리 합계 상한 (바이트, None이면 사용 가능 메모리 기준)
+
+    Returns:
+    - 그룹별 결과 목록 [{"key", "ok", "result"(추가된 시간 목록), "error", "seconds"}, ...]
+    """
+    os.makedirs(output_directory, exist_ok=True)
+    grouped_files = find_hourly_files(input_directory)
+
+    # 좌표 파일은 같은 격자 크기의 그룹이 동시에 쓰지 않도록 먼저 한 번씩 저장
+    if write_coordinates:
+        first_files = {}
+        for group_key, files in sorted(grouped_files.items()):
+            first_files.setdefault(group_key.split("_", 1)[1], files[0][1])
+        for hourly_file in first_files.values():
+            write_daily_coordinates(output_directory, hourly_file, store=store)
+
+    if processes == 1:
+        # 그룹별 파일 병합 (파일 읽기는 스레드 풀에서 병렬로, pyarrow가 GIL을 해제함)
+        results = []
+        with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+            for group_key, files in sorted(grouped_files.items()):
+                output_file = os.path.join(output_directory, f"merged_{group_key}.parquet")
+                try:
+                    hours = merge_daily_group(group_key, files, output_file, executor)
+                    results.append({"key": group_key, "ok": True, "result": hours, "error": None, "seconds": None})
+                except Exception as e:
+                    print(f"{group_key}: 실패 - {e}")
+                    results.append({"key": group_key, "ok": False, "result": None, "error": str(e), "seconds": None})
+        return results
+
+    # 그룹마다 한 프로세스 (0.5km 그룹은 예상 메모리 기준으로 동시 실행 수 제한)
+    units = []
+    for group_key, files in sorted(grouped_files.items()):
+        rows, cols = (int(n) for n in group_key.split("_", 1)[1].split("x"))
+        channels = len(read_grid_metadata(files[0][1]).get("channels") or [None])
+        units.append(WorkUnit(
+            group_key, merge_daily_unit,
+            (group_key, files, os.path.join(output_directory, f"merged_{group_key}.parquet"), max_workers),
+            # 미리 읽는 4시간 + 기록 중인 1시간 + 기존 일별 파일 행 그룹 1개
+            memory_bytes=estimate_grid_bytes(rows, cols, channels, frames=6),
+        ))
+    return run_units(units, max_workers=processes, memory_limit=memory_limit)
+
+
+def write_daily_coordinates(output_directory, hourly_file, store=None):
+    """
+    시간별 파일의 격자 크기와 채널 해상도로 coordinates_{크기}.parquet 저장 (이미 있으면 건너뜀)
+    """
+    grid = read_grid_metadata(hourly_file)
+    resolution = grid.get("resolution", CHANNEL_RESOLUTIONS[grid["channels"][0]])
+    path = os.path.join(output_directory, f"coordinates_{grid['rows']}x{grid['cols']}.parquet")
+    return write_coordinate_sidecar(path, resolution, grid["rows"], grid["cols"], store=store)
+
+
+if __name__ == '__main__':
+    failed = report_results(merge_daily_files(input_directory, output_directory))
+    if not failed:
+        print("모든 파일이 병합되었습니다!")
@@ -1,108 +1,302 @@
+import io
 import requests
 import h5py
-import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-import time
 import os
 
+from calibration import encode_counts, read_calibration
+from channel_cube import ChannelCube
+from gk2a_download import API_BASE_URL, GK2ADownloader
+from granule_cache import GranuleCache
+from hourly_parquet import hourly_partition_path, write_hourly_parquet
+from ingest_manifest import DEFAULT_MAX_ATTEMPTS, IngestManifest
+from regrid import regrid_cubes
+import stage_metrics
+
 # 파일 다운로드 함수                                 
 def download_file(file_url, save_path):
     with open(save_path, 'wb') as f:
         response = requests.get(file_url)
         f.write(response.content)
 
+class HourlyMeanAccumulator:
+    """
+    채널별 합계와 유효 개수 배열만 유지하는 시간 평균 누적기.
+    프레임은 들어오는 즉시 더한 뒤 버리므로 메모리는 프레임 수와 무관하게 채널 수 x 격자 크기로 고정
+    """
+
+    def __init__(self, data_types):
+        self.data_types = list(data_types)
+        self.frame_count = 0  # add_slot 호출 횟수 (수집 시각 수)
+        self.sums = {}
+        self.counts = {}
+        self.calibration = {}  # 채널별 보정 계수 (원본 파일 속성)
+
+    def add(self, data_type, image_data):
+        """
+        한 채널 프레임을 누적 (None은 무시, NaN 픽셀은 개수에서 제외)
+        """
+        if image_data is None:
+            return
+        if data_type in self.sums and self.sums[data_type].shape != image_data.shape:
+            print(f"{data_type} 배열 크기 불일치 {image_data.shape} != {self.sums[data_type].shape}, 프레임 제외")
+            return
+        if data_type not in self.sums:
+            self.sums[data_type] = np.zeros(image_data.shape, dtype=np.float64)
+            self.counts[data_type] = np.zeros(image_data.shape, dtype=np.int32)
+
+        if np.issubdtype(image_data.dtype, np.floating):
+            valid = ~np.isnan(image_data)
+            np.add(self.sums[data_type], image_data, out=self.sums[data_type], where=valid)
+            self.counts[data_type] += valid
+        else:
+            self.sums[data_type] += image_data
+            self.counts[data_type] += 1
+
+    def set_calibration(self, data_type, coefficients):
+        if coefficients:
+            self.calibration[data_type] = coefficients
+
+    def add_slot(self, file_data_per_type):
+        """
+        한 수집 시각의 채널별 프레임 목록(data_types 순서)을 누적
+        """
+        self.frame_count += 1
+        for data_type, image_data in zip(self.data_types, file_data_per_type):
+            self.add(data_type, image_data)
+
+    def mean(self, data_type, out=None):
+        """
+        np.nanmean과 같은 시간 평균 (유효 값이 없는 픽셀은 NaN). 누적된 프레임이 없으면 None.
+        out을 주면 그 배열에 바로 기록
+        """
+        if data_type not in self.sums:
+            return None
+        counts = self.counts[data_type]
+        if out is None:
+            out = np.empty(counts.shape, dtype=np.float64)
+        out.fill(np.nan)
+        np.divide(self.sums[data_type], counts, out=out, where=counts > 0)
+        return out
+
+    def to_cubes(self, data_types, dtype=np.float32, value_mode="float"):
+        """
+        시간 평균을 격자 크기별 ChannelCube로 묶어 반환 ({"277x306": cube, ...}, data_types 순서 유지).
+        value_mode="counts"면 카운트 합계(uint32)를 큐브에, 픽셀별 유효 프레임 수(uint8)를 cube.metadata["frames"]에 담고
+        (calibration.encode_counts, 평균은 읽을 때 나누므로 손실 없음) 채널별 보정 계수를 cube.metadata["calibration"]에 기록
+        """
+        size_grouped_types = {}
+        for data_type in data_types:
+            if data_type not in self.sums:
+                print(f"{data_type}에 대한 유효한 데이터가 없습니다.")
+                continue
+            rows, cols = self.sums[data_type].shape #행,열 개수 세기
+            size_grouped_types.setdefault((rows, cols), []).append(data_type)
+
+        cubes = {}
+        for (rows, cols), types in size_grouped_types.items():
+            if value_mode == "counts":
+                frames = np.empty((len(types), rows, cols), dtype=np.uint8)
+                cube = ChannelCube.empty(types, rows, cols, dtype=np.uint32,
+                                         metadata={"frame_count": self.frame_count, "frames": frames, "calibration": {}})
+                for i, data_type in enumerate(types):
+                    cube.data[i], frames[i] = encode_counts(self.sums[data_type], self.counts[data_type])
+                    cube.metadata["calibration"][data_type] = dict(self.calibration.get(data_type, {}))
+                cubes[cube.size_key] = cube
+                continue
+            cube = ChannelCube.empty(types, rows, cols, dtype=dtype, metadata={"frame_count": self.frame_count})
+            for i, data_type in enumerate(types):
+                self.mean(data_type, out=cube.data[i]) #평균계산 (같은 크기 채널은 큐브에 바로 기록)
+            cubes[cube.size_key] = cube
+        return cubes
+
+
 # 이미지 데이터를 CSV로 저장하는 함수
-def process_image_to_csv(data_list, data_types, csv_save_path):
-    if not data_list:
+def process_image_to_csv(accumulator, data_types, csv_save_path):
+    if accumulator.frame_count == 0:
         print("수집된 데이터가 없습니다.")
         return
 
-    size_grouped_data = {}
-    for data_type_index, data_type in enumerate(data_types):
-        all_data_for_type = []
-        for file_data in data_list:
-            if file_data is not None:
-                image_data = file_data[data_type_index]
-                if image_data is not None:
-                    all_data_for_type.append(image_data)
-
-        if not all_data_for_type:
-            print(f"{data_type}에 대한 유효한 데이터가 없습니다.")
-            continue
+    with stage_metrics.stage("hourly_mean", frames=accumulator.frame_count):
+        cubes = accumulator.to_cubes(data_types)
+    for size_key, cube in cubes.items():
+        csv_save_path_with_size = f"{csv_save_path}_{size_key}.csv"
+        with stage_metrics.stage("hourly_csv", grid=size_key) as stage:
+            cube.to_dataframe(with_xy=True).to_csv(csv_save_path_with_size, index=False)
+            stage.add(rows=cube.rows * cube.cols, pixels=cube.data.size, bytes_out=stage_metrics.file_bytes(csv_save_path_with_size))
+        print(f"CSV 파일이 {csv_save_path_with_size}에 저장되었습니다.")
 
-        rows, cols = all_data_for_type[0].shape #행,열 개수 세기
-        x, y = np.meshgrid(range(0, cols), range(0, rows)) #좌표생성
-        averaged_data = np.nanmean(np.stack(all_data_for_type), axis=0) #평균계산
 
-        flattened_data = pd.DataFrame({
-            'x': x.ravel(),
-            'y': y.ravel(),
-            data_type: averaged_data.ravel()
-        })
+# 이미지 데이터를 날짜/시간/격자 크기별 Parquet로 저장하는 함수 (x, y는 저장하지 않음)
+# target_resolution을 주면 모든 채널을 그 해상도 격자 하나로 맞춰 16채널 파일 하나로 저장
+# value_mode="counts"면 보정 전 카운트 합계와 유효 프레임 수를 저장 (보정은 읽을 때 수행)
+def process_image_to_parquet(accumulator, data_types, output_root, hourly_start_time, target_resolution=None,
+                             regrid_method="bilinear", value_mode="float", **writer_options):
+    if accumulator.frame_count == 0:
+        print("수집된 데이터가 없습니다.")
+        return []
+    if value_mode == "counts" and target_resolution is not None:
+        raise ValueError("카운트 저장은 원래 격자에서만 지원합니다 (target_resolution=None)")
 
-        size_key = f"{rows}x{cols}"
-        if size_key not in size_grouped_data:
-            size_grouped_data[size_key] = flattened_data #같은 크기 없으면 새로운 파일
-        else:
-            size_grouped_data[size_key] = pd.merge(size_grouped_data[size_key], flattened_data, on=['x', 'y'], how='outer') #같은 크기 있으면 기존 파일에 병합합(기존 열 바로 옆에)
+    hour = hourly_start_time.strftime('%Y%m%d%H')
+    with stage_metrics.stage("hourly_mean", hour=hour, frames=accumulator.frame_count):
+        cubes = accumulator.to_cubes(data_types, value_mode=value_mode)
+    if target_resolution is not None and cubes:
+        with stage_metrics.stage("regrid", hour=hour, resolution=target_resolution):
+            cube = regrid_cubes(cubes, target_resolution, data_types=data_types, method=regrid_method)
+        cubes = {cube.size_key: cube}
 
-    for size_key, combined_data in size_grouped_data.items():
-        csv_save_path_with_size = f"{csv_save_path}_{size_key}.csv"
-        combined_data.to_csv(csv_save_path_with_size, index=False)
-        print(f"CSV 파일이 {csv_save_path_with_size}에 저장되었습니다.")
+    saved_paths = []
+    for size_key, cube in cubes.items():
+        parquet_path = hourly_partition_path(output_root, hourly_start_time, size_key)
+        with stage_metrics.stage("hourly_parquet", hour=hour, grid=size_key) as stage:
+            write_hourly_parquet(parquet_path, cube, value_mode=value_mode, **writer_options)
+            stage.add(rows=cube.rows * cube.cols, pixels=cube.data.size, bytes_out=stage_metrics.file_bytes(parquet_path))
+        saved_paths.append(parquet_path)
+        print(f"Parquet 파일이 {parquet_path}에 저장되었습니다.")
+    return saved_paths
 
 
-def main():
+def decode_granule(payload, archive_path=None):
+    """
+    응답 본문(HDF5/NetCDF4 바이트)을 메모리에서 바로 열어 (image_pixel_values 배열, 보정 계수 dict)를 반환.
+    archive_path를 주면 디버그/보관용으로 원본 파일도 저장
+    """
+    if archive_path is not None:
+        with open(archive_path, 'wb') as f:
+            f.write(payload)
+    with h5py.File(io.BytesIO(payload), 'r') as file:
+        return file['image_pixel_values'][:], read_calibration(file)
+
+
+def decode_image_pixel_values(payload, archive_path=None):
+    return decode_granule(payload, archive_path)[0]
+
+
+def iterate_hours(start_date, end_date):
+    """
+    start_date 시각부터 end_date 시각까지 매 시간의 시작 시각
+    """
+    hourly_start_time = start_date
+    while hourly_start_time <= end_date:
+        yield hourly_start_time
+        hourly_start_time += timedelta(hours=1)
+
+
+def iterate_slot_times(start_date, end_date, step=timedelta(minutes=30), hour_filter=None):
+    """
+    start_date 시각부터 end_date 시각까지 각 시간의 수집 시각을 순서대로 생성.
+    hour_filter(시간 시작 시각)가 False인 시간은 건너뜀
+    """
+    for hourly_start_time in iterate_hours(start_date, end_date):
+        if hour_filter is not None and not hour_filter(hourly_start_time):
+            continue
+        searching_date = hourly_start_time
+        while searching_date < hourly_start_time + timedelta(hours=1):
+            yield searching_date.replace(second=0, microsecond=0) #url은 초단위 인정 안함
+            searching_date += step
+
+
+def main(archive_dir=None, output_root="D:/sat_file/hourly", compression="zstd",
+         manifest_path="D:/sat_file/ingest_manifest.sqlite", retry_failed=True, max_attempts=DEFAULT_MAX_ATTEMPTS,
+         start_date=datetime(2024, 7, 12), end_date=None, base_url=API_BASE_URL,
+         cache_dir=None, cache_max_bytes=20 * 1024 ** 3, target_resolution=None,
+         value_mode="float", metrics_path=None, profile_stages=None):
+    """
+    archive_dir: 원본 .nc 파일을 보관할 디렉토리 (None이면 디스크에 쓰지 않고 메모리에서 해독)
+    output_root: 시간별 Parquet 파티션 최상위 디렉토리
+    compression: Parquet 압축 코덱
+    manifest_path: 진행 기록 파일. 저장이 끝난 시간은 건너뛰고 실패한 수집 시각이 있는 시간만 다시 처리
+    retry_failed: False면 저장이 끝난 시간은 실패한 수집 시각이 있어도 다시 처리하지 않음
+    max_attempts: 한 시간을 처리하는 최대 횟수 (자료가 없거나 계속 실패하는 시간은 이후 건너뜀, None이면 제한 없음)
+    start_date, end_date: 수집 범위 (end_date 기본값은 오늘 0시)
+    base_url: API 주소
+    cache_dir, cache_max_bytes: 원본 자료 캐시 디렉토리와 최대 용량 (기본값 None은 캐시 사용 안 함.
+        캐시를 켜면 모든 응답을 디스크에 fsync해 저장하므로 재수집이 잦을 때만 사용)
+    target_resolution: 지정하면 모든 채널을 그 해상도 격자로 맞춰 시간당 16채널 파일 하나로 저장 (예: 2.0)
+    value_mode: "float"(평균 값 float32) 또는 "counts"(카운트 합계 uint32 + 유효 프레임 수 uint8로 손실 없이 저장, 읽을 때 평균 및 보정)
+    metrics_path: 단계별 측정 출력 파일 (.jsonl 또는 .prom, None이면 INKLE_METRICS 환경 변수 설정을 따름)
+    profile_stages: cProfile로 감쌀 단계 이름 목록 (예: ["hourly_mean"], metrics_path와 함께 사용)
+    """
     auth_key = "c4GK7IkiRoWBiuyJIhaFgQ"
     data_types = ["VI004", "VI005", "VI006", "VI008", "NR013", "NR016", "SW038", "WV063", "WV069", "WV073", "IR087", "IR096", "IR105", "IR112", "IR123", "IR133"]
     region = "LA" #지역
-    start_date = datetime(2024, 7, 12)
-    end_date = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-    os.makedirs("D:/sat_file/temp", exist_ok=True)
-
-    searching_date = start_date
-    while searching_date <= end_date:
-        hourly_data_list = []
-        hourly_start_time = searching_date
-        hourly_end_time = searching_date + timedelta(hours=1)
+    if end_date is None:
+        end_date = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    if archive_dir is not None:
+        os.makedirs(archive_dir, exist_ok=True)
+    if metrics_path is not None:
+        stage_metrics.configure(metrics_path, profile=profile_stages)
+
+    manifest = IngestManifest(manifest_path)
+    cache = GranuleCache(cache_dir, max_bytes=cache_max_bytes) if cache_dir is not None else None
+
+    def save_hour(hourly_start_time, accumulator):
+        saved_paths = process_image_to_parquet(accumulator, data_types, output_root, hourly_start_time,
+                                               target_resolution=target_resolution, value_mode=value_mode,
+                                               compression=compression)
+        manifest.record_hour(hourly_start_time, "written" if saved_paths else "empty",
+                             frame_count=accumulator.frame_count, output_paths=saved_paths)
+        print(f"{hourly_start_time.strftime('%Y-%m-%d %H시')} 데이터 평균 계산 및 Parquet 저장 완료")
+
+    def hour_filter(hourly_start_time):
+        return manifest.needs_processing(hourly_start_time, retry_failed=retry_failed, max_attempts=max_attempts)
+
+    slot_times = iterate_slot_times(start_date, end_date, hour_filter=hour_filter)
+
+    # 채널 16개와 다음 시각들을 스레드 풀로 동시에 요청 (고정 sleep 대신 토큰 버킷으로 속도 제한)
+    with manifest, GK2ADownloader(auth_key, region, base_url=base_url, max_workers=8, rate_limit=8.0, cache=cache) as downloader:
+        accumulator = HourlyMeanAccumulator(data_types)
+        hourly_start_time = None
         data_collected_count = 0
+        for searching_time, payloads in downloader.iter_slots(data_types, slot_times, prefetch=2):
+            slot_hour = searching_time.replace(minute=0)
+            if hourly_start_time is not None and slot_hour != hourly_start_time:
+                save_hour(hourly_start_time, accumulator)
+                accumulator = HourlyMeanAccumulator(data_types)
+                data_collected_count = 0
+            hourly_start_time = slot_hour
 
-        while searching_date < hourly_end_time:
             file_data_per_type = []
-            searching_time = searching_date.replace(second=0, microsecond=0) #url은 초단위 인정 안함
-            for data_type in data_types:
-                url = f"https://apihub.kma.go.kr/api/typ05/api/GK2A/LE1B/{data_type}/{region}/data?date={searching_time.strftime('%Y%m%d%H%M')}&authKey={auth_key}"
-                try:
-                    response = requests.get(url, timeout=10)
-                    response.raise_for_status()
-                    ncfile_path = f"D:/sat_file/temp/satellite_data_{searching_time.strftime('%Y%m%d%H%M')}_{data_type}.nc"
-                    with open(ncfile_path, 'wb') as f:
-                        f.write(response.content)
-                    with h5py.File(ncfile_path, 'r') as file:
-                        image_data = file['image_pixel_values'][:]
-                        file_data_per_type.append(image_data)
-                    #os.remove(ncfile_path)
-                except requests.exceptions.RequestException as e:
-                    print(f"{data_type} 다운로드 오류: {e}")
+            for data_type, payload in zip(data_types, payloads):
+                if isinstance(payload, requests.exceptions.RequestException):
+                    print(f"{data_type} 다운로드 오류: {payload}")
+                    manifest.record_slot(searching_time, data_type, error=payload)
                     file_data_per_type.append(None)
-                except OSError as e:
-                    print(f"파일 처리 오류 {e}")
-                    file_data_per_type.append(None)
-                except KeyError as e:
-                    print(f"hdf5 파일 데이터 오류 {e}")
+                    continue
+                archive_path = None
+                if archive_dir is not None:
+                    archive_path = os.path.join(archive_dir, f"satellite_data_{searching_time.strftime('%Y%m%d%H%M')}_{data_type}.nc")
+                try:
+                    with stage_metrics.stage("decode", data_type=data_type, time=searching_time.strftime('%Y%m%d%H%M')) as stage:
+                        image_data, calibration = decode_granule(payload, archive_path)
+                        stage.add(bytes_in=len(payload), pixels=image_data.size)
+                    accumulator.set_calibration(data_type, calibration)
+                    file_data_per_type.append(image_data)
+                    manifest.record_slot(searching_time, data_type, payload=payload)
+                except (OSError, KeyError) as e:
+                    print(f"파일 처리 오류 {e}" if isinstance(e, OSError) else f"hdf5 파일 데이터 오류 {e}")
+                    manifest.record_slot(searching_time, data_type, error=e)
                     file_data_per_type.append(None)
-            
+                    if cache is not None:
+                        # 손상된 자료가 캐시에 남으면 재시도 때마다 같은 자료를 받게 되므로 삭제
+                        cache.invalidate(data_type, region, searching_time)
 
-            hourly_data_list.append(file_data_per_type)
+            accumulator.add_slot(file_data_per_type)  # 누적 후 프레임은 버림
             data_collected_count += 1
-            print(f"{searching_date.strftime('%Y-%m-%d %H:%M:%S')} 데이터 수집 완료 ({data_collected_count}회)")
-            searching_date += timedelta(minutes=30)
-            time.sleep(1)
-        timestamp = hourly_start_time.strftime('%Y%m%d_%H')
-        csv_base_path = f"D:/sat_file/satellite_data_combined_{timestamp}"
-        process_image_to_csv(hourly_data_list, data_types, csv_base_path)
-        print(f"{hourly_start_time.strftime('%Y-%m-%d %H시')} 데이터 평균 계산 및 CSV 저장 완료")
+            print(f"{searching_time.strftime('%Y-%m-%d %H:%M:%S')} 데이터 수집 완료 ({data_collected_count}회)")
+
+        if hourly_start_time is not None:
+            save_hour(hourly_start_time, accumulator)
+
+        # 재수집이 필요한 시간 보고
+        gaps = manifest.report_gaps(iterate_hours(start_date, end_date))
+        for gap in gaps:
+            print(f"{gap['hour']} 미완료 (상태: {gap['status']}, 처리 {gap['attempts']}회, 실패 {len(gap['failed'])}건)")
+        print(f"재수집 대상 시간: {len(gaps)}개")
+        if cache is not None:
+            print(f"원본 자료 캐시: {cache.stats()}")
 
 if __name__ == '__main__':
     main()
@@ -1,5 +1,13 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
 from netCDF4 import Dataset
 import os
+import re
+import sys
+
+# Stage instrumentation lives with the 2025_01_10 modules
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "2025_01_10"))
+import stage_metrics
 
 def extract_image_pixel_values(input_file, output_file):
     """
@@ -32,64 +40,150 @@ def extract_image_pixel_values(input_file, output_file):
     except Exception as e:
         print(f"Error during extraction: {e}")
 
-def merge_nc_files_by_resolution(data_types_list, input_directory, output_directory):
+# Input file names look like IR087_202501080000.nc
+INPUT_FILE_PATTERN = re.compile(r"^(?P<data_type>[A-Z]{2}\d{3})_(?P<timestamp>\d{12})\.nc$")
+
+
+def index_input_directory(input_directory):
     """
-    Merges NetCDF files by resolution into separate files.
+    Lists the input directory once and groups NetCDF files by timestamp.
 
     Parameters:
-        data_types_list (dict): A dictionary mapping resolutions to data type lists.
         input_directory (str): Directory containing input NetCDF files.
-        output_directory (str): Directory to save merged NetCDF files.
+
+    Returns:
+        dict: {timestamp (str, YYYYmmddHHMM): {data_type: file path}}
     """
-    try:
-        for resolution, data_types in data_types_list.items():
-            output_file = os.path.join(output_directory, f"Merged_{resolution.replace('.', '_')}.nc")
+    file_index = {}
+    for file_name in os.listdir(input_directory):
+        match = INPUT_FILE_PATTERN.match(file_name)
+        if match:
+            file_index.setdefault(match["timestamp"], {})[match["data_type"]] = os.path.join(input_directory, file_name)
+    return file_index
 
-            with Dataset(output_file, 'w') as dst:
-                first_file = None
 
-                for data_type in data_types:
-                    # Match file names like IR087_202501080000.nc
-                    input_file = next((
-                        os.path.join(input_directory, f) 
-                        for f in os.listdir(input_directory) 
-                        if f.startswith(data_type) and f.endswith(".nc")
-                    ), None)
-
-                    if not input_file or not os.path.exists(input_file):
-                        print(f"File not found for data type: {data_type}")
-                        continue
+def merge_resolution(resolution, data_types, file_index, output_file, chunk_rows=256, complevel=4):
+    """
+    Writes every timestamp of one resolution group into a single NetCDF file with an
+    unlimited 'time' dimension. Each data type becomes a (time, y, x) variable that is
+    chunked per time step and zlib-compressed, and the data is copied in hyperslabs of
+    chunk_rows rows so memory stays bounded regardless of grid size.
 
-                    with Dataset(input_file, 'r') as src:
-                        if first_file is None:
-                            # Copy dimensions from the first file
-                            for name, dim in src.dimensions.items():
-                                dst.createDimension(name, len(dim) if not dim.isunlimited() else None)
-                            first_file = input_file
-
-                        # Add the variable for this data type
-                        if 'image_pixel_values' in src.variables:
-                            var = src.variables['image_pixel_values']
-                            out_var = dst.createVariable(data_type, var.datatype, var.dimensions)
-                            out_var.setncatts({attr: var.getncattr(attr) for attr in var.ncattrs()})
-                            out_var[:] = var[:]
-                            print(f"Added data type '{data_type}' to {output_file}")
-
-            print(f"Merged file saved for resolution {resolution} at {output_file}")
+    Parameters:
+        resolution (str): Resolution key (e.g. "2").
+        data_types (list): Data types belonging to this resolution.
+        file_index (dict): Output of index_input_directory.
+        output_file (str): Path of the merged NetCDF file.
+        chunk_rows (int): Rows per copied hyperslab and per storage chunk.
+        complevel (int): zlib compression level.
+
+    Returns:
+        tuple: (resolution, number of timestamps written)
+    """
+    timestamps = sorted(ts for ts, files in file_index.items() if any(dt in files for dt in data_types))
+    if not timestamps:
+        print(f"No input files found for resolution {resolution}")
+        return resolution, 0
 
-    except Exception as e:
-        print(f"Error during merging: {e}")
+    with stage_metrics.stage("resolution_merge", resolution=resolution, timestamps=len(timestamps)) as stage:
+        with Dataset(output_file, 'w') as dst:
+            time_var = None
+            out_vars = {}
 
-# Data types mapping by resolution
-data_types_list = {
-    "2": ["NR013", "NR016", "SW038", "WV063", "WV069", "IR087", "IR096", "IR105", "IR112", "IR123", "IR133", "WV073"],
-    "1": ["VI004", "VI005", "VI008"],
-    "0.5": ["VI006"]
-}
+            for time_index, timestamp in enumerate(timestamps):
+                for data_type in data_types:
+                    input_file = file_index[timestamp].get(data_type)
+                    if input_file is None:
+                        print(f"File not found for data type: {data_type} at {timestamp}")
+                        continue
 
-# Directories
-input_directory = "F:/INKLE/2025_01_13/RAW"
-output_directory = "F:/INKLE/2025_01_13"
+                    with Dataset(input_file, 'r') as src:
+                        if 'image_pixel_values' not in src.variables:
+                            print(f"Variable 'image_pixel_values' not found in {input_file}")
+                            continue
+                        var = src.variables['image_pixel_values']
+
+                        if time_var is None:
+                            # Spatial dimensions come from the first file, time is unlimited
+                            dst.createDimension('time', None)
+                            for name in var.dimensions:
+                                dst.createDimension(name, len(src.dimensions[name]))
+                            time_var = dst.createVariable('time', 'f8', ('time',))
+                            time_var.units = "seconds since 1970-01-01 00:00:00"
+                            time_var.calendar = "standard"
+
+                        if data_type not in out_vars:
+                            rows, cols = var.shape
+                            attrs = {attr: var.getncattr(attr) for attr in var.ncattrs()}
+                            fill_value = attrs.pop('_FillValue', None)
+                            out_var = dst.createVariable(
+                                data_type, var.datatype, ('time',) + var.dimensions,
+                                zlib=True, complevel=complevel,
+                                chunksizes=(1, min(chunk_rows, rows), cols),
+                                fill_value=fill_value,
+                            )
+                            out_var.setncatts(attrs)
+                            out_vars[data_type] = out_var
+                        out_var = out_vars[data_type]
+
+                        if var.shape != out_var.shape[1:]:
+                            print(f"Shape mismatch for {data_type} at {timestamp}: {var.shape} != {out_var.shape[1:]}")
+                            continue
+
+                        # Copy in row hyperslabs
+                        for row in range(0, var.shape[0], chunk_rows):
+                            out_var[time_index, row:row + chunk_rows, :] = var[row:row + chunk_rows, :]
+                        stage.add(pixels=var.size, bytes_in=stage_metrics.file_bytes(input_file))
+
+                if time_var is not None:
+                    time_var[time_index] = (datetime.strptime(timestamp, "%Y%m%d%H%M") - datetime(1970, 1, 1)).total_seconds()
+        stage.add(bytes_out=stage_metrics.file_bytes(output_file))
+
+    print(f"Merged file saved for resolution {resolution} at {output_file} ({len(timestamps)} timestamps)")
+    return resolution, len(timestamps)
+
+
+def merge_nc_files_by_resolution(data_types_list, input_directory, output_directory, max_workers=None):
+    """
+    Merges NetCDF files by resolution into separate time-stacked files.
+    The input directory is indexed once, and independent resolutions run in parallel processes.
 
-# Merge files by resolution
-merge_nc_files_by_resolution(data_types_list, input_directory, output_directory)
+    Parameters:
+        data_types_list (dict): A dictionary mapping resolutions to data type lists.
+        input_directory (str): Directory containing input NetCDF files.
+        output_directory (str): Directory to save merged NetCDF files.
+        max_workers (int): Number of worker processes (defaults to one per resolution).
+    """
+    file_index = index_input_directory(input_directory)
+
+    # Each worker records its own "resolution_merge" stage; this one covers the whole fan-out
+    with stage_metrics.stage("merge_nc_files_by_resolution", resolutions=len(data_types_list)), \
+            ProcessPoolExecutor(max_workers=max_workers or len(data_types_list)) as executor:
+        futures = {
+            executor.submit(
+                merge_resolution, resolution, data_types, file_index,
+                os.path.join(output_directory, f"Merged_{resolution.replace('.', '_')}.nc"),
+            ): resolution
+            for resolution, data_types in data_types_list.items()
+        }
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Error during merging resolution {futures[future]}: {e}")
+
+
+if __name__ == "__main__":
+    # Data types mapping by resolution
+    data_types_list = {
+        "2": ["NR013", "NR016", "SW038", "WV063", "WV069", "IR087", "IR096", "IR105", "IR112", "IR123", "IR133", "WV073"],
+        "1": ["VI004", "VI005", "VI008"],
+        "0.5": ["VI006"]
+    }
+
+    # Directories
+    input_directory = "F:/INKLE/2025_01_13/RAW"
+    output_directory = "F:/INKLE/2025_01_13"
+
+    # Merge files by resolution
+    merge_nc_files_by_resolution(data_types_list, input_directory, output_directory)
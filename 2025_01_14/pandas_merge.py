@@ -1,58 +1,90 @@
-import pandas as pd
+import os
+import sys
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# 2025_01_10 모듈 (좌표 파일, 시간별 파티션, 배치 실행)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "2025_01_10"))
+from batch_runner import WorkUnit, report_results, run_units
+from grid_sidecar import parquet_grid_shape, sidecar_path, write_coordinate_sidecar, write_time_partitions_batches
 
 # 파일 템플릿
-input_template = r"F:\INKLE\2025_01_13\merged_20250110_{resolution}.parquet"
-coordinates_template = r"F:\INKLE\2024_01_10\precomputed_coordinates_res_{resolution}.parquet"
-output_template = r"final_combined_with_coordinates_{resolution}.parquet"
+input_template = r"F:\INKLE\2025_01_13\merged_{date}_{resolution}.parquet"
+store_dir = r"F:\INKLE\2024_01_10\coordinate_store"  # 좌표 저장소 (coord_store.py로 생성)
+output_template = r"final_combined_{date}_{resolution}"  # 출력 디렉토리 (_coordinates.parquet + Datetime=*/part-0.parquet)
 
-# 해상도 리스트
+# 날짜, 해상도 리스트
+dates = ["20250110"]
 resolutions = ["0.5", "1.0", "2.0"]
 
-try:
-    for resolution in resolutions:
-        print(f"Processing resolution: {resolution}")
-
-        # 각 해상도에 해당하는 파일 경로 설정
-        input_file = input_template.format(resolution=resolution)
-        coordinates_file = coordinates_template.format(resolution=resolution)
-        output_file = output_template.format(resolution=resolution)
-
-        # 데이터 읽기
-        combined_df = pd.read_parquet(input_file)
-        coordinates_df = pd.read_parquet(coordinates_file)
-
-        # 좌표 데이터에서 Latitude, Longitude 열만 추출
-        coordinates_df = coordinates_df[["Latitude", "Longitude"]]
-
-        # 데이터 길이 일치
-        min_rows = min(len(combined_df), len(coordinates_df))
-        combined_df = combined_df.iloc[:min_rows]
-        coordinates_df = coordinates_df.iloc[:min_rows]
-
-        # 기존 데이터의 x, y를 Latitude, Longitude로 교체
-        combined_df["Latitude"] = coordinates_df["Latitude"]
-        combined_df["Longitude"] = coordinates_df["Longitude"]
-
-        # 기존 x, y 열 제거
-        combined_df = combined_df.drop(columns=["x", "y"], errors="ignore")
-
-        
-       # 데이터 타입 최적화
-        print("  Optimizing data types...")
-        for col in combined_df.columns:
-            if combined_df[col].dtype == "float64":
-                combined_df[col] = combined_df[col].astype("float16")
-            elif combined_df[col].dtype == "int64":
-                combined_df[col] = combined_df[col].astype("int32")
-        
-        # 데이터를 24배 반복
-        print("  Repeating data 24 times...")
-        repeated_combined_df = pd.concat([combined_df] * 24, ignore_index=True)
-
-        # 최종 데이터를 Parquet 파일로 저장
-        print(f"  Saving final data to {output_file}...")
-        repeated_combined_df.to_parquet(output_file, index=False)
-        print(f"  Final combined data saved to {output_file}")
-
-except Exception as e:
-    print(f"Error processing files: {e}")
+
+def combine_resolution(input_file, output_dir, resolution, store_dir=None, batch_size=1 << 20):
+    """
+    일별 파일 하나를 좌표 파일 + 시간별 값 파티션으로 변환 (프로세스 풀 작업 단위).
+    배치 단위로 읽어 시간별 파티션에 바로 이어 쓰므로 최대 메모리는 batch_size로 정해짐
+
+    Returns:
+    - 저장한 파티션 수
+    """
+    print(f"Processing resolution: {resolution} ({input_file})")
+
+    # 격자 크기는 x, y 열 통계로 구하고, 행 정렬은 잘라내지 않고 배치마다 격자 순서로 확인
+    rows, cols = parquet_grid_shape(input_file)
+
+    # 좌표는 격자당 한 번만 float32로 저장 (24배 복제하지 않음, 읽을 때 grid_sidecar.read_with_coordinates로 결합)
+    print("  Writing coordinate sidecar...")
+    write_coordinate_sidecar(sidecar_path(output_dir), float(resolution), rows, cols, store=store_dir)
+
+    # 값은 시간별 파티션으로 저장 (채널 값은 저장된 형식 그대로 유지, float16 변환 없음)
+    print(f"  Saving values to {output_dir}...")
+    saved_paths = write_time_partitions_batches(output_dir, iter_value_batches(input_file, batch_size), rows, cols)
+    print(f"  Final combined data saved to {output_dir} ({len(saved_paths)} partitions)")
+    return len(saved_paths)
+
+
+def iter_value_batches(input_file, batch_size):
+    """
+    일별 파일을 batch_size행씩 읽어 반환 (int64 채널은 int32로, 시간 열이 없으면 파일 이름의 날짜를 추가)
+    """
+    for batch in pq.ParquetFile(input_file).iter_batches(batch_size=batch_size):
+        columns, names = [], []
+        for name, column in zip(batch.schema.names, batch.columns):
+            if column.type == pa.int64() and name not in ("x", "y"):
+                column = column.cast(pa.int32())
+            columns.append(column)
+            names.append(name)
+        if "Datetime" not in names:
+            # 시간 열이 없는 단일 시각 파일은 파일 이름의 날짜를 파티션 이름으로 사용
+            columns.insert(0, pa.array([os.path.basename(input_file).split("_")[1]] * batch.num_rows))
+            names.insert(0, "Datetime")
+        yield pa.RecordBatch.from_arrays(columns, names=names)
+
+
+def estimate_memory(input_file, batch_size=1 << 20, overhead=3.0):
+    """
+    배치 하나를 처리할 때의 예상 메모리 (배치 행 수 x 열 수 x 8바이트 x overhead)
+    """
+    metadata = pq.read_metadata(input_file)
+    return int(min(metadata.num_rows, batch_size) * metadata.num_columns * 8 * overhead)
+
+
+def build_units(dates, resolutions):
+    """
+    (날짜, 해상도)별 작업 목록 (입력 파일이 없는 조합은 건너뜀)
+    """
+    units = []
+    for date in dates:
+        for resolution in resolutions:
+            input_file = input_template.format(date=date, resolution=resolution)
+            if not os.path.exists(input_file):
+                print(f"입력 파일이 없습니다: {input_file}")
+                continue
+            output_dir = output_template.format(date=date, resolution=resolution)
+            units.append(WorkUnit((date, resolution), combine_resolution, (input_file, output_dir, resolution, store_dir),
+                                  memory_bytes=estimate_memory(input_file)))
+    return units
+
+
+if __name__ == "__main__":
+    # 해상도별 실패가 나머지 해상도를 중단시키지 않도록 작업마다 결과를 모아 보고
+    report_results(run_units(build_units(dates, resolutions)))
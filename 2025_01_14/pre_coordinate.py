@@ -1,94 +1,38 @@
+import os
+import sys
+import numpy as np
 import pandas as pd
-from pyproj import Proj, Transformer
-from multiprocessing import Pool, cpu_count
-from tqdm import tqdm
 
-# Lambert Conformal Conic (LCC) 투영 설정
-lcc_params = {
-    "lat_1": 30.0,   # 표준 평행선 1
-    "lat_2": 60.0,   # 표준 평행선 2
-    "lat_0": 38.0,   # 원점 위도
-    "lon_0": 126.0   # 중심 자오선
-}
+# 격자 창/오프셋/투영은 2025_01_10/grid_spec.py 하나에서만 정의 (모든 단계가 같은 창을 사용)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "2025_01_10"))
+from grid_spec import LCC_PARAMS, get_grid_spec
 
-def get_lcc_params_by_resolution(resolution):
-    if resolution == 0.5:
-        return {
-            "x_start": 1430, "x_end": 2665,
-            "y_start": 1545, "y_end": 2883,
-            "image_width": 3600,
-            "image_height": 3600,
-            "x_min": -899750,
-            "x_max": 899750,
-            "y_min": -899750,
-            "y_max": 899750,
-        }
-    elif resolution == 1.0:
-        return {
-            "x_start": 715, "x_end": 1327,
-            "y_start": 772, "y_end": 1441,
-            "image_width": 1800,
-            "image_height": 1800,
-            "x_min": -899500,
-            "x_max": 899500,
-            "y_min": -899500,
-            "y_max": 899500,
-        }
-    elif resolution == 2.0:
-        return {
-            "x_start": 357, "x_end": 663,
-            "y_start": 410, "y_end": 720,
-            "image_width": 900,
-            "image_height": 900,
-            "x_min": -899000,
-            "x_max": 899000,
-            "y_min": -899000,
-            "y_max": 899000,
-        }
+lcc_params = LCC_PARAMS
 
-def pixel_to_latlon(args):
-    pixel_x, pixel_y, params, lcc_params = args
-    lcc_proj = Proj(
-        proj="lcc",
-        lat_1=lcc_params["lat_1"],  # 표준 평행선 1
-        lat_2=lcc_params["lat_2"],  # 표준 평행선 2
-        lat_0=lcc_params["lat_0"],  # 원점 위도
-        lon_0=lcc_params["lon_0"],  # 중심 자오선
-        x_0=0,
-        y_0=0,
-        ellps="WGS84"  # 타원체
-    )
-    wgs_proj = Proj(proj="latlong", datum="WGS84")
-    transformer = Transformer.from_proj(lcc_proj, wgs_proj)
-    x = params["x_min"] + (pixel_x / (params["image_width"] - 1)) * (params["x_max"] - params["x_min"])
-    y = params["y_max"] - (pixel_y / (params["image_height"] - 1)) * (params["y_max"] - params["y_min"])
-    lon, lat = transformer.transform(x, y)
-    return pixel_x, pixel_y, lat, lon
+def get_lcc_params_by_resolution(resolution):
+    return get_grid_spec(resolution).params
 
-def generate_precomputed_coordinates_parallel(resolution, output_file):
+def generate_precomputed_coordinates(resolution, output_file):
     """
-    병렬 처리를 이용해 미리 계산된 좌표 데이터를 생성
+    해상도별 격자 창 전체의 x, y, Latitude, Longitude (x 우선 순서)를 parquet로 저장.
+    위경도 배열은 GridSpec에 한 번만 계산되어 보관됨
     """
-    params = get_lcc_params_by_resolution(resolution)
-
-    # 좌표 목록 생성
-    tasks = [
-        (x, y, params, lcc_params)
-        for x in range(params["x_start"], params["x_end"] + 1)
-        for y in range(params["y_start"], params["y_end"] + 1)
-    ]
-
-    # 병렬 처리
-    print(f"병렬 처리 시작 (해상도: {resolution})...")
-    with Pool(cpu_count()) as pool:
-        results = list(tqdm(pool.imap(pixel_to_latlon, tasks), total=len(tasks), desc="좌표 생성 진행"))
-
-    # 데이터프레임 생성
-    df = pd.DataFrame(results, columns=["x", "y", "Latitude", "Longitude"])
+    spec = get_grid_spec(resolution)
+    latitude, longitude = spec.window_latlon  # (행=y, 열=x)
+    pixel_x, pixel_y = np.meshgrid(np.arange(spec.x_start, spec.x_end + 1), np.arange(spec.y_start, spec.y_end + 1))
+
+    print(f"좌표 계산 시작 (해상도: {resolution}, {spec.window_shape[1]}x{spec.window_shape[0]})...")
+    df = pd.DataFrame({
+        "x": pixel_x.T.ravel(),
+        "y": pixel_y.T.ravel(),
+        "Latitude": latitude.T.ravel(),
+        "Longitude": longitude.T.ravel(),
+    })
 
     # Parquet 파일로 저장
     df.to_parquet(output_file, index=False)
     print(f"미리 계산된 좌표 데이터가 저장되었습니다: {output_file}")
+    return df
 
 
 if __name__ == '__main__':
@@ -98,4 +42,4 @@ if __name__ == '__main__':
 
     for resolution in resolutions:
         output_file = f"{base_output_dir}_res_{resolution}.parquet"
-        generate_precomputed_coordinates_parallel(resolution, output_file)
+        generate_precomputed_coordinates(resolution, output_file)